@@ -0,0 +1,11 @@
+from typing import Optional
+from sqlmodel import SQLModel, Field
+
+
+class ImageHash(SQLModel, table=True):
+	id: Optional[int] = Field(default=None, primary_key=True)
+	phash: str = Field(index=True)  # 256-bit DCT perceptual hash, 64 hex chars
+	institution_id: str | None = Field(default=None, index=True)
+	certificate_id: str = Field(index=True)
+	source: str  # "registered" (canonical image from the institution) | "verified" (successful upload)
+	created_ms: int
@@ -0,0 +1,21 @@
+from typing import Optional
+from sqlmodel import SQLModel, Field
+
+
+class ImportJob(SQLModel, table=True):
+	id: str = Field(primary_key=True)
+	status: str = Field(index=True)  # queued | running | completed | failed | cancelled
+	file_name: str | None = None
+	file_path: str
+	actor: str | None = None
+	created_ms: int
+	updated_ms: int
+	# Lease: a running job whose heartbeat is older than the lease is resumed by another worker
+	heartbeat_ms: int = 0
+	# Data rows (excluding header) fully handled; resume point after a restart
+	rows_committed: int = 0
+	upserted: int = 0
+	failed: int = 0
+	rows_per_second: float = 0.0
+	cancel_requested: bool = False
+	error: Optional[str] = None
@@ -0,0 +1,118 @@
+"""Idempotent schema upgrades for databases created before a model change.
+
+`SQLModel.metadata.create_all` only creates missing tables; it never alters
+an existing one. Indexes and constraints added to existing tables are
+therefore also created here, on every startup (each step is a no-op once
+applied).
+"""
+
+import logging
+import os
+import warnings
+from typing import Any, Dict, Iterable, List, Tuple
+
+from sqlalchemy import exc, inspect, text
+from sqlalchemy.engine import Connection, Engine
+
+
+logger = logging.getLogger(__name__)
+
+# Duplicate (institution_id, certificate_id) rows block the unique index. Deleting all but the
+# newest of each at startup is opt-in; otherwise see POST /admin/registry/merge-duplicates
+REGISTRY_MERGE_DUPLICATES = os.getenv("REGISTRY_MERGE_DUPLICATES", "0") == "1"
+
+UPSERT_KEY = ("institution_id", "certificate_id")
+UPSERT_KEY_INDEX = "uq_certificaterecord_institution_certificate"
+NAME_LOWER_INDEX = "ix_certificaterecord_candidate_name_lower"
+
+
+def _has_unique(conn: Connection, table: str, columns: Iterable[str]) -> bool:
+	wanted = set(columns)
+	insp = inspect(conn)
+	with warnings.catch_warnings():
+		# The lower(candidate_name) index cannot be reflected; irrelevant here
+		warnings.simplefilter("ignore", exc.SAWarning)
+		if any(set(uc["column_names"]) == wanted for uc in insp.get_unique_constraints(table)):
+			return True
+		return any(ix.get("unique") and set(ix["column_names"]) == wanted for ix in insp.get_indexes(table))
+
+
+def registry_upsert_key_ready(engine: Engine) -> bool:
+	"""Whether certificaterecord has the unique (institution_id, certificate_id) key imports upsert on."""
+	with engine.connect() as conn:
+		if not inspect(conn).has_table("certificaterecord"):
+			return False
+		return _has_unique(conn, "certificaterecord", UPSERT_KEY)
+
+
+def _duplicate_keys(conn: Connection) -> List[Tuple[str, str, int]]:
+	return [tuple(r) for r in conn.execute(text(
+		"SELECT institution_id, certificate_id, COUNT(*) FROM certificaterecord "
+		"GROUP BY institution_id, certificate_id HAVING COUNT(*) > 1"
+	)).all()]
+
+
+def _sample(dupes: List[Tuple[str, str, int]]) -> str:
+	return ", ".join(f"{i}/{c} (x{n})" for i, c, n in dupes[:10])
+
+
+def _create_upsert_key(conn: Connection) -> None:
+	conn.execute(text(
+		f"CREATE UNIQUE INDEX IF NOT EXISTS {UPSERT_KEY_INDEX} ON certificaterecord (institution_id, certificate_id)"
+	))
+
+
+def merge_duplicate_records(engine: Engine) -> Dict[str, Any]:
+	"""Keep the newest row (highest id) of each duplicated key, delete the rest and create the unique index."""
+	with engine.begin() as conn:
+		dupes = _duplicate_keys(conn)
+		removed = 0
+		if dupes:
+			removed = conn.execute(text(
+				"DELETE FROM certificaterecord WHERE id NOT IN ("
+				"SELECT MAX(id) FROM certificaterecord GROUP BY institution_id, certificate_id)"
+			)).rowcount or 0
+			logger.warning(
+				"Merged %d duplicated (institution_id, certificate_id) keys of certificaterecord, keeping the "
+				"newest row of each (%d older rows deleted), e.g. %s",
+				len(dupes), removed, _sample(dupes),
+			)
+		_create_upsert_key(conn)
+	return {"duplicate_keys": len(dupes), "rows_deleted": removed, "keys": [(i, c) for i, c, _ in dupes]}
+
+
+def _ensure_upsert_key(engine: Engine) -> None:
+	with engine.begin() as conn:
+		if _has_unique(conn, "certificaterecord", UPSERT_KEY):
+			return
+		dupes = _duplicate_keys(conn)
+		if not dupes:
+			_create_upsert_key(conn)
+			logger.info("Created unique index %s on existing certificaterecord table", UPSERT_KEY_INDEX)
+			return
+	if REGISTRY_MERGE_DUPLICATES:
+		merge_duplicate_records(engine)
+		return
+	logger.error(
+		"certificaterecord has %d duplicated (institution_id, certificate_id) keys, e.g. %s; "
+		"unique index %s not created and registry imports will be refused. Remove the duplicates, "
+		"or merge them (keeping the newest row of each) with POST /admin/registry/merge-duplicates "
+		"or by starting once with REGISTRY_MERGE_DUPLICATES=1.",
+		len(dupes), _sample(dupes), UPSERT_KEY_INDEX,
+	)
+
+
+def ensure_registry_indexes(engine: Engine) -> None:
+	"""Bring an existing certificaterecord table up to the current model's indexes."""
+	try:
+		_ensure_upsert_key(engine)
+	except Exception:
+		logger.exception(
+			"Could not create unique index %s on certificaterecord; registry imports will be refused until it exists",
+			UPSERT_KEY_INDEX,
+		)
+	try:
+		with engine.begin() as conn:
+			conn.execute(text(f"CREATE INDEX IF NOT EXISTS {NAME_LOWER_INDEX} ON certificaterecord (lower(candidate_name))"))
+	except Exception:
+		logger.exception("Could not create index %s; name lookups will scan the table", NAME_LOWER_INDEX)
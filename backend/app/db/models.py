@@ -1,8 +1,13 @@
 from typing import Optional
+from sqlalchemy import Index, UniqueConstraint, func
 from sqlmodel import SQLModel, Field
 
 
 class CertificateRecord(SQLModel, table=True):
+	__table_args__ = (
+		UniqueConstraint("institution_id", "certificate_id", name="uq_certificaterecord_institution_certificate"),
+	)
+
 	id: Optional[int] = Field(default=None, primary_key=True)
 	institution_id: str = Field(index=True)
 	certificate_id: str = Field(index=True)
@@ -12,3 +17,5 @@ class CertificateRecord(SQLModel, table=True):
 	year: int
 
 
+# Case-insensitive name lookups in validation filter on lower(candidate_name)
+Index("ix_certificaterecord_candidate_name_lower", func.lower(CertificateRecord.candidate_name))
@@ -0,0 +1,15 @@
+from sqlmodel import SQLModel, Field
+
+
+class VerificationRollup(SQLModel, table=True):
+	"""Verification counts per UTC day, institution, outcome and score decile.
+
+	Maintained incrementally alongside VerificationLog inserts so dashboards
+	aggregate a few rows per day instead of scanning the log.
+	"""
+
+	day: str = Field(primary_key=True)  # YYYY-MM-DD (UTC)
+	institution_id: str = Field(default="", primary_key=True)  # "" when not given
+	success: bool = Field(primary_key=True)
+	score_bucket: int = Field(primary_key=True)  # 0..9, floor(score * 10) capped at 9
+	count: int = 0
@@ -14,7 +14,13 @@ def init_db() -> None:
 	from . import models  # ensure models are imported
 	from . import logs  # ensure logs table exists
 	from . import audit  # ensure audit table exists
+	from . import jobs  # ensure import job table exists
+	from . import rollups  # ensure stats rollup table exists
+	from . import hashes  # ensure perceptual hash registry exists
 	SQLModel.metadata.create_all(engine)
+	# create_all never alters existing tables; add indexes introduced since they were created
+	from .migrations import ensure_registry_indexes
+	ensure_registry_indexes(engine)
 
 
 def get_session() -> Session:
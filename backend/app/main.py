@@ -1,10 +1,47 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from fastapi.responses import Response
 from fastapi.middleware.cors import CORSMiddleware
 
+from .db.session import init_db
 from .routers.verify import router as verify_router
+from .routers.admin import router as admin_router
+from .routers.institution import router as institution_router
+from .routers.qrgen import router as qrgen_router
+from .services.workers import WORKER_POOL_KIND, shutdown_pool
+from .services.templates import template_store
+from .services.jobs import import_worker
+from .services.log_writer import log_writer
+from .services.stats import backfill_rollups
+from .services.url_validate import close_client
+from .services.registry import REGISTRY_SNAPSHOT, registry
+from .services.metrics import render as render_metrics
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+	init_db()
+	# Before the log writer starts adding to them
+	await asyncio.to_thread(backfill_rollups)
+	await log_writer.start()
+	import_worker.start()
+	if WORKER_POOL_KIND == "thread":
+		# Process workers prepare templates in their initializer; thread workers share ours
+		await asyncio.to_thread(template_store.preload)
+	if REGISTRY_SNAPSHOT:
+		# Built in the background; validation uses the database until it is ready
+		registry.start()
+	yield
+	registry.stop()
+	import_worker.stop()
+	await log_writer.stop()
+	await close_client()
+	shutdown_pool()
 
 
-app = FastAPI(title="Authenticity Validator for Academia", version="0.1.0")
+app = FastAPI(title="Authenticity Validator for Academia", version="0.1.0", lifespan=lifespan)
 
 # CORS - adjust origins in production
 app.add_middleware(
@@ -21,6 +58,16 @@ def health_check():
 	return {"status": "ok"}
 
 
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+	"""Prometheus exposition (stage latency histograms, outcomes, cache hits, pool gauges)."""
+	body, content_type = render_metrics()
+	return Response(content=body, media_type=content_type)
+
+
 app.include_router(verify_router, prefix="/verify", tags=["verification"])
+app.include_router(admin_router)
+app.include_router(institution_router)
+app.include_router(qrgen_router)
 
 
@@ -6,12 +6,19 @@ class VerificationDetails(BaseModel):
 	matched_fields: Dict[str, Any] = Field(default_factory=dict)
 	mismatched_fields: Dict[str, Any] = Field(default_factory=dict)
 	warnings: List[str] = Field(default_factory=list)
+	# Anomaly feature vector ({"features": {...}, "timings_ms": {...}}) for images
+	anomaly: Optional[Dict[str, Any]] = None
+	# OCR mode (layout/full/filename) and preprocessing plan with per-stage timings
+	ocr: Optional[Dict[str, Any]] = None
 
 
 class VerificationResponse(BaseModel):
 	success: bool
 	score: float = Field(ge=0, le=1)
 	message: str
+	# "signed_qr": a validly signed QR payload checked against the registry (no OCR/anomaly analysis);
+	# "full": OCR, QR and anomaly analysis
+	tier: str = "full"
 	details: VerificationDetails
 
 
@@ -1,14 +1,26 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlmodel import Session, select
-import csv
-import io
-import time
+from datetime import date
+from typing import Optional
 
-from ..security.auth import create_access_token, get_password_hash, verify_password, require_role
-from ..db.session import get_session
-from ..db.models import CertificateRecord
-from ..db.logs import VerificationLog
+from ..security.auth import create_access_token, get_password_hash, verify_password, require_role, token_cache
+from ..db.migrations import merge_duplicate_records
+from ..db.session import engine, get_session
+from ..services.result_cache import result_cache
+from ..services.log_writer import log_writer
+from ..services.workers import pool_stats
+from ..services.issuance import issuance_stats
+from ..services.registry import registry
+from ..services.url_validate import url_cache
+from ..services.qr import qr_cache
+from ..services.qr_images import qr_image_cache
+from ..services.keystore import keystore
+from ..services.signature import sig_cache
+from ..services.importer import IMPORT_BATCH_SIZE, ImportSchemaError, import_csv, require_upsert_key
+from ..services.jobs import cancel_import_job, job_status, submit_import_job
+from ..services.stats import rebuild_rollups, verification_stats
+from ..db.jobs import ImportJob
 
 
 router = APIRouter(prefix="/admin", tags=["admin"])
@@ -29,37 +41,103 @@ def admin_login(form_data: OAuth2PasswordRequestForm = Depends()):
 @router.post("/bulk-upload")
 def bulk_upload(
 	file: UploadFile = File(...),
+	batch_size: int = Query(IMPORT_BATCH_SIZE, ge=1, le=100_000),
+	user=Depends(require_role("admin")),
+):
+	"""Upsert registry rows from a CSV, parsed incrementally and committed in batches."""
+	try:
+		result = import_csv(file.file, batch_size=batch_size)
+	except ImportSchemaError as e:
+		raise HTTPException(status_code=409, detail=str(e))
+	return {"inserted": result.get("upserted", 0), **result}
+
+
+@router.post("/import-jobs", status_code=202)
+def create_import_job(file: UploadFile = File(...), user=Depends(require_role("admin"))):
+	"""Spool a registry CSV to disk and import it in the background; poll the returned job id."""
+	try:
+		require_upsert_key()
+	except ImportSchemaError as e:
+		raise HTTPException(status_code=409, detail=str(e))
+	job = submit_import_job(file.file, file.filename, user.get("sub"))
+	return job_status(job)
+
+
+@router.get("/import-jobs")
+def list_import_jobs(
+	limit: int = Query(20, ge=1, le=200),
 	session: Session = Depends(get_session),
 	user=Depends(require_role("admin")),
 ):
-	content = file.file.read().decode("utf-8", errors="ignore")
-	reader = csv.DictReader(io.StringIO(content))
-	count = 0
-	for row in reader:
-		record = CertificateRecord(
-			institution_id=row.get("institution_id", "").strip(),
-			certificate_id=row.get("certificate_id", "").strip(),
-			candidate_name=row.get("candidate_name", "").strip(),
-			roll_number=row.get("roll_number", "").strip(),
-			course=row.get("course", "").strip(),
-			year=int(row.get("year", 0) or 0),
-		)
-		session.add(record)
-		count += 1
-	
-	session.commit()
-	return {"inserted": count}
+	jobs = session.exec(select(ImportJob).order_by(ImportJob.created_ms.desc()).limit(limit)).all()
+	return [job_status(j) for j in jobs]
+
+
+@router.get("/import-jobs/{job_id}")
+def get_import_job(job_id: str, session: Session = Depends(get_session), user=Depends(require_role("admin"))):
+	job = session.get(ImportJob, job_id)
+	if not job:
+		raise HTTPException(status_code=404, detail="not found")
+	return job_status(job)
+
+
+@router.post("/import-jobs/{job_id}/cancel")
+def cancel_job(job_id: str, user=Depends(require_role("admin"))):
+	job = cancel_import_job(job_id)
+	if not job:
+		raise HTTPException(status_code=404, detail="not found")
+	return job_status(job)
+
+
+@router.post("/registry/merge-duplicates")
+def merge_registry_duplicates(user=Depends(require_role("admin"))):
+	"""Delete all but the newest row of each duplicated (institution_id, certificate_id) and add the unique index imports need."""
+	result = merge_duplicate_records(engine)
+	result_cache.invalidate_records(result.pop("keys"))
+	return result
 
 
 @router.get("/stats")
-def stats(session: Session = Depends(get_session), user=Depends(require_role("admin"))):
-	total_certs = session.exec(select(CertificateRecord)).all()
-	logs = session.exec(select(VerificationLog)).all()
-	success = len([l for l in logs if l.success])
-	failure = len(logs) - success
+def stats(
+	from_date: Optional[date] = None,
+	to_date: Optional[date] = None,
+	institution_id: Optional[str] = None,
+	session: Session = Depends(get_session),
+	user=Depends(require_role("admin")),
+):
+	return verification_stats(session, from_date=from_date, to_date=to_date, institution_id=institution_id)
+
+
+@router.post("/stats/rebuild")
+def rebuild_stats(session: Session = Depends(get_session), user=Depends(require_role("admin"))):
+	"""Recompute the stats rollups from the full verification log (one-off backfill)."""
+	return {"logs": rebuild_rollups(session)}
+
+
+@router.get("/cache-stats")
+def cache_stats(user=Depends(require_role("admin"))):
 	return {
-		"certificates": len(total_certs),
-		"verifications": {"total": len(logs), "success": success, "failure": failure},
+		"result_cache": result_cache.stats(),
+		"qr_url_cache": url_cache.stats(),
+		"qr_cache": qr_cache.stats(),
+		"qr_image_cache": qr_image_cache.stats(),
+		"auth_token_cache": token_cache.stats(),
+		"qr_sig_cache": sig_cache.stats(),
 	}
 
 
+@router.get("/runtime-stats")
+def runtime_stats(user=Depends(require_role("admin"))):
+	return {
+		"worker_pool": pool_stats(),
+		"log_writer": log_writer.stats(),
+		"issuance": issuance_stats(),
+		"registry": registry.stats(),
+		"result_cache": result_cache.stats(),
+		"qr_url_cache": url_cache.stats(),
+		"qr_cache": qr_cache.stats(),
+		"qr_image_cache": qr_image_cache.stats(),
+		"auth_token_cache": token_cache.stats(),
+		"qr_sig_cache": sig_cache.stats(),
+		"keystore": keystore.stats(),
+	}
@@ -1,11 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
 from sqlmodel import Session, select
+import asyncio
 import time
 
 from ..db.session import get_session
 from ..db.models import CertificateRecord
 from ..db.audit import AuditLog
 from ..security.auth import require_role
+from ..services.result_cache import result_cache
+from ..services.anomaly import document_phash
+from ..services.document import DocumentContext
+from ..services.phash_index import phash_registry
+from ..services.registry import registry
+from ..services.workers import run_in_pool
 
 
 router = APIRouter(prefix="/institutions", tags=["institutions"])
@@ -48,6 +55,8 @@ def upsert_record(
 		)
 	)
 	session.commit()
+	result_cache.invalidate_records([(institution_id, record.certificate_id)])
+	registry.apply([existing or record])
 	return {"status": "ok", "action": action}
 
 
@@ -69,3 +78,16 @@ def get_record(
 	return rec
 
 
+@router.post("/{institution_id}/records/{certificate_id}/image")
+async def register_certificate_image(
+	institution_id: str,
+	certificate_id: str,
+	file: UploadFile = File(...),
+	user=Depends(require_role("admin")),
+):
+	"""Register the canonical image of an issued certificate for near-duplicate detection."""
+	phash = await run_in_pool(document_phash, await DocumentContext.from_upload(file))
+	if not phash:
+		raise HTTPException(status_code=400, detail="Could not decode image")
+	added = await asyncio.to_thread(phash_registry.remember, phash, institution_id, certificate_id, "registered")
+	return {"status": "ok", "phash": phash, "added": added}
@@ -1,26 +1,61 @@
-from fastapi import APIRouter
-from fastapi.responses import StreamingResponse
-import qrcode
-from io import BytesIO
+from typing import Optional
 
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import Response, StreamingResponse
 
-router = APIRouter(prefix="/qr", tags=["qr"])
-
-
-@router.get("/certificate/{institution_id}/{certificate_id}")
-def qr_for_certificate(institution_id: str, certificate_id: str):
-	url = f"http://localhost:8000/v/{certificate_id}"
-	img = qrcode.make({
-		"certificate_id": certificate_id,
-		"institution_id": institution_id,
-		"url": url,
-	})
-	buf = BytesIO()
-	img.save(buf, format="PNG")
-	buf.seek(0)
-	return StreamingResponse(buf, media_type="image/png")
-
+from ..security.auth import require_role
+from ..services.issuance import has_cohort, iter_issuance_zip
+from ..services.qr_images import (
+	QR_IMAGE_MAX_AGE_SECONDS,
+	certificate_payload,
+	etag_matches,
+	payload_etag,
+	payload_text,
+	qr_image_cache,
+)
 
 
+router = APIRouter(prefix="/qr", tags=["qr"])
 
 
+@router.get("/certificate/{institution_id}/{certificate_id}")
+def qr_for_certificate(institution_id: str, certificate_id: str, if_none_match: str | None = Header(default=None)):
+	text = payload_text(certificate_payload(institution_id, certificate_id))
+	etag = payload_etag(text)
+	headers = {"ETag": etag, "Cache-Control": f"public, max-age={QR_IMAGE_MAX_AGE_SECONDS}"}
+	# Scanners and pages embedding the image revalidate; answer without rendering
+	if etag_matches(if_none_match, etag):
+		return Response(status_code=304, headers=headers)
+	return Response(content=qr_image_cache.get(text, etag), media_type="image/png", headers=headers)
+
+
+def _zip_response(institution_id: str, year: int | None, course: str | None, signed: bool, filename: str) -> StreamingResponse:
+	if not has_cohort(institution_id, year, course):
+		raise HTTPException(status_code=404, detail="no matching certificates")
+	return StreamingResponse(
+		iter_issuance_zip(institution_id, year, course, signed),
+		media_type="application/zip",
+		headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+	)
+
+
+@router.get("/institutions/{institution_id}/archive")
+def qr_archive(institution_id: str, user=Depends(require_role("admin"))):
+	"""Zip of the QR image served for every certificate of an institution, streamed as it is generated."""
+	return _zip_response(institution_id, None, None, False, f"qr-{institution_id}.zip")
+
+
+@router.post("/institutions/{institution_id}/issue")
+def issue_cohort(
+	institution_id: str,
+	year: Optional[int] = None,
+	course: Optional[str] = None,
+	user=Depends(require_role("admin")),
+):
+	"""Signed QR codes for a cohort (optionally one year and/or course), rendered on the worker pool.
+
+	Streams a zip of <certificate_id>.png files (ids with characters unsafe in
+	file names get a hash suffix); its last member, _issuance.json, reports the
+	count and throughput of the run.
+	"""
+	return _zip_response(institution_id, year, course, True, f"issue-{institution_id}.zip")
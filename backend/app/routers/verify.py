@@ -1,67 +1,170 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException, Request
-from fastapi import Depends
-from typing import Optional
+from fastapi.responses import StreamingResponse
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import zipfile
 
-from ..services.ocr import extract_text_fields
-from ..services.qr import decode_qr_from_file
-from ..services.validation import validate_certificate_data
+from ..services.qr import cached_scan, remember_scan
+from ..services.validation import validate_certificate_data, validate_many
 from ..models.schemas import VerificationResponse, VerificationDetails
-from sqlmodel import Session
-from ..db.session import get_session
 from ..db.logs import VerificationLog
 import time
 from ..services.signature import verify_embedded_signature
 from ..services.url_validate import validate_qr_url
-from ..services.anomaly import analyze_anomalies
+from ..services.document import DocumentContext
+from ..services.extraction import extract_document, signed_claims
+from ..services.workers import WORKER_QUEUE_LIMIT, run_in_pool
+from ..services.result_cache import result_cache
+from ..services.log_writer import log_writer
+from ..services.phash_index import duplicate_warnings, phash_registry
+from ..services.metrics import IN_FLIGHT, VERIFICATION_ERRORS, VERIFICATIONS, observe, observe_ocr, timed, timed_await
 
 
 router = APIRouter()
 
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "1000"))
+BATCH_MAX_FILE_BYTES = int(os.getenv("BATCH_MAX_FILE_BYTES", str(25 * 1024 * 1024)))
+# Documents of one batch in flight at once; each uses one pool slot, leave room for single uploads
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "0")) or max(1, WORKER_QUEUE_LIMIT // 2)
+# Validly signed QR payloads are checked against the registry without OCR or anomaly analysis
+SIGNED_QR_FAST_PATH = os.getenv("SIGNED_QR_FAST_PATH", "1") == "1"
 
-@router.post("/upload", response_model=VerificationResponse)
-async def upload_and_verify(
-	file: UploadFile = File(...),
-	institution_id: Optional[str] = None,
-	session: Session = Depends(get_session),
-	request: Request = None,
-):
-	if not file.filename:
-		raise HTTPException(status_code=400, detail="No file provided")
 
-	# Extract via OCR
-	ocr_fields = await extract_text_fields(file)
+async def _extract(doc: DocumentContext, institution_id: str | None, signed_tier: bool = False) -> Dict[str, Any]:
+	"""OCR fields/stats, QR payload, anomaly warnings/features and pHash for a document (cached by content hash).
+
+	With `signed_tier`, a QR carrying a valid signature short-circuits the rest
+	(no OCR or anomaly analysis) and {"signed": _signed_fields(...)} is returned.
+	"""
+	# Identical uploads reuse the extracted fields, QR payload and anomaly results
+	cache_key = result_cache.key(await asyncio.to_thread(lambda: doc.content_hash), institution_id)
+	cached = result_cache.get(cache_key)
+	if cached:
+		signed = await _signed_fields(cached["qr_data"]) if signed_tier else None
+		return {"signed": signed} if signed else cached
+
+	# A repeated upload's QR is cached; if it is validly signed nothing needs decoding
+	qr = cached_scan(doc)
+	if qr is not None and signed_tier:
+		signed = await _signed_fields(qr["primary"])
+		if signed:
+			return {"signed": signed}
+
+	# One pool task per document: the upload is decoded once, in the worker running every stage
+	result = await run_in_pool(extract_document, doc, institution_id, qr, signed_tier)
+	if qr is None:
+		qr = result["qr"]
+		remember_scan(doc, qr)
+		observe("qr_decode", qr["elapsed_ms"] / 1000)
+	if result["signed"]:
+		signed = await _signed_fields(qr["primary"])
+		if signed:
+			return {"signed": signed}
+		# The worker accepted the signature but this process does not (e.g. a key just rotated)
+		result = await run_in_pool(extract_document, doc, institution_id, qr, False)
+	ocr, anomaly, template = result["ocr"], result["anomaly"], result["template"]
+	observe_ocr(ocr)
+	if "total" in anomaly["timings_ms"]:
+		observe("anomaly", anomaly["timings_ms"]["total"] / 1000)
+	qr_data = qr["primary"]
+	ocr_fields = ocr["fields"]
+	extraction = {
+		"ocr_fields": ocr_fields,
+		"ocr": {"mode": ocr["mode"], "preprocess": ocr["preprocess"]},
+		"qr_data": qr_data,
+		# Every code found on the document, and the detection pass that found them
+		"qr": {"codes": qr["codes"], "stage": qr["stage"], "elapsed_ms": qr["elapsed_ms"]},
+		"anomaly_warnings": [*anomaly["warnings"], *(template["warnings"] if template else [])],
+		"phash": anomaly["phash"],
+		"anomaly": {"features": anomaly["features"], "timings_ms": anomaly["timings_ms"], "templates": template},
+		"elapsed_seconds": result["elapsed_seconds"],
+	}
+	extracted_id = (qr_data.get("certificate_id") if isinstance(qr_data, dict) else None) or ocr_fields.get("certificate_id")
+	result_cache.put(
+		cache_key,
+		extraction,
+		institution_id=institution_id,
+		certificate_id=str(extracted_id) if extracted_id else None,
+	)
+	return extraction
+
+
+async def _duplicate_checks(extraction: Dict[str, Any], merged: Dict, validation: Dict[str, Any], institution_id: str | None) -> List[str]:
+	"""Flag near-duplicate images of other institutions' certificates; remember images of valid certificates."""
+	phash = extraction.get("phash")
+	if not phash:
+		return []
+	certificate_id = merged.get("certificate_id")
+	inst = institution_id or merged.get("institution_id")
+	warnings = await asyncio.to_thread(duplicate_warnings, phash, certificate_id, str(inst) if inst else None)
+	if validation["is_valid"] and certificate_id:
+		await asyncio.to_thread(phash_registry.remember, phash, str(inst) if inst else None, str(certificate_id), "verified")
+	return warnings
+
 
-	# Try QR
-	qr_data = await decode_qr_from_file(file)
+async def _signed_fields(qr_data: Any) -> Dict[str, Any] | None:
+	"""Fields and warnings from a decoded QR payload if it carries a valid signature, else None."""
+	if not isinstance(qr_data, dict) or not qr_data.get("sig"):
+		return None
+	with timed("signature_check"):
+		merged = signed_claims(qr_data)
+	if merged is None:
+		return None
+	return {"merged": merged, "warnings": await _qr_checks(qr_data, fetch=False)}
 
+
+async def _qr_checks(qr_data: Any, fetch: bool = True) -> List[str]:
+	"""Signature and URL warnings for a decoded QR payload."""
+	warnings: List[str] = []
+	if not qr_data or not isinstance(qr_data, dict):
+		return warnings
+
+	# Signature check if QR carries 'sig'
+	if qr_data.get("sig"):
+		with timed("signature_check"):
+			sig_info = verify_embedded_signature(qr_data)
+		if sig_info.get("checked") and not sig_info.get("valid", False):
+			warnings.append("Signature invalid or unverifiable")
+
+	# If QR contains a URL, validate it
+	qr_url = qr_data.get("url") or qr_data.get("verify_url")
+	if qr_url:
+		ok, info = await timed_await("url_validation", validate_qr_url(qr_url, fetch=fetch))
+		if not ok:
+			warnings.append(f"QR URL validation failed: {info}")
+	return warnings
+
+
+def _merge(ocr_fields: Dict, qr_data: Any) -> Dict:
 	# Prefer QR data if present, else OCR
 	merged = {**ocr_fields}
 	if qr_data:
 		merged.update(qr_data)
+	return merged
 
-	# Signature check if QR carries 'sig'
-	sig_info = {"checked": False}
-	if qr_data and isinstance(qr_data, dict) and qr_data.get("sig"):
-		sig_info = verify_embedded_signature(qr_data, secret_or_public_key="dev-secret-change-me")
 
-	# If QR contains a URL, validate it
-	url_warning = None
-	if qr_data and isinstance(qr_data, dict):
-		qr_url = qr_data.get("url") or qr_data.get("verify_url")
-		if qr_url:
-			ok, info = await validate_qr_url(qr_url)
-			if not ok:
-				url_warning = f"QR URL validation failed: {info}"
-
-	# Validate (DB)
-	validation = await validate_certificate_data(merged, institution_id=institution_id)
-
-	# Log verification
-	try:
-		log = VerificationLog(
+async def _finish(
+	validation: Dict[str, Any],
+	merged: Dict,
+	warnings: List[str],
+	file_name: str | None,
+	institution_id: str | None,
+	source_ip: str | None,
+	anomaly: Dict[str, Any] | None = None,
+	ocr: Dict[str, Any] | None = None,
+	tier: str = "full",
+) -> VerificationResponse:
+	# Log verification (buffered; written in batches off the request path)
+	await log_writer.submit(
+		VerificationLog(
 			timestamp_ms=int(time.time() * 1000),
-			source_ip=request.client.host if request and request.client else None,
-			file_name=file.filename,
+			source_ip=source_ip,
+			file_name=file_name,
 			success=validation["is_valid"],
 			score=float(validation["confidence"]),
 			certificate_id=merged.get("certificate_id"),
@@ -69,30 +172,217 @@ async def upload_and_verify(
 			institution_id=institution_id,
 			message=validation.get("message"),
 		)
-		session.add(log)
-		session.commit()
-	except Exception:
-		pass
-
-	# Anomaly analysis (image-level)
-	file_bytes = await file.read()
-	await file.seek(0)
-	anomaly_warnings = await analyze_anomalies(file_bytes, file.filename)
+	)
 
+	VERIFICATIONS.labels(tier, "valid" if validation["is_valid"] else "invalid").inc()
 	return VerificationResponse(
 		success=validation["is_valid"],
 		score=validation["confidence"],
 		message=validation["message"],
+		tier=tier,
 		details=VerificationDetails(
 			matched_fields=validation.get("matched_fields", {}),
 			mismatched_fields=validation.get("mismatched_fields", {}),
-			warnings=[
-				*validation.get("warnings", []),
-				*([] if sig_info.get("valid", False) or not sig_info.get("checked") else ["Signature invalid or unverifiable"]),
-				*([] if not url_warning else [url_warning]),
-				*anomaly_warnings,
-			],
+			warnings=[*validation.get("warnings", []), *warnings],
+			anomaly=anomaly,
+			ocr=ocr,
 		),
 	)
 
 
+def _error_reason(exc: BaseException) -> str:
+	if isinstance(exc, HTTPException):
+		return "busy" if exc.status_code == 503 else f"http_{exc.status_code}"
+	return "exception"
+
+
+@contextmanager
+def _tracked() -> Iterator[None]:
+	"""Count a verification request as in flight; record why it failed, if it does."""
+	with IN_FLIGHT.track_inprogress():
+		try:
+			yield
+		except Exception as e:
+			VERIFICATION_ERRORS.labels(_error_reason(e)).inc()
+			raise
+
+
+@router.post("/upload", response_model=VerificationResponse)
+async def upload_and_verify(
+	file: UploadFile = File(...),
+	institution_id: Optional[str] = None,
+	full: bool = False,
+	request: Request = None,
+):
+	"""Verify one certificate.
+
+	A QR with a valid signature is checked against the registry directly
+	(tier "signed_qr"); otherwise, or with full=true, OCR, QR and anomaly
+	analysis run first (tier "full").
+	"""
+	if not file.filename:
+		raise HTTPException(status_code=400, detail="No file provided")
+
+	with _tracked():
+		with timed("upload_read"):
+			doc = await DocumentContext.from_upload(file)
+		source_ip = request.client.host if request and request.client else None
+		extraction = await _extract(doc, institution_id, signed_tier=SIGNED_QR_FAST_PATH and not full)
+		signed = extraction.get("signed")
+		if signed:
+			with timed("db_lookup"):
+				validation = await validate_certificate_data(signed["merged"], institution_id=institution_id)
+			return await _finish(validation, signed["merged"], signed["warnings"], file.filename, institution_id, source_ip, tier="signed_qr")
+
+		merged = _merge(extraction["ocr_fields"], extraction["qr_data"])
+		qr_warnings = await _qr_checks(extraction["qr_data"])
+
+		# Validate (DB)
+		with timed("db_lookup"):
+			validation = await validate_certificate_data(merged, institution_id=institution_id)
+		duplicate = await _duplicate_checks(extraction, merged, validation, institution_id)
+
+		return await _finish(
+			validation,
+			merged,
+			[*qr_warnings, *extraction["anomaly_warnings"], *duplicate],
+			file.filename,
+			institution_id,
+			source_ip,
+			extraction.get("anomaly"),
+			extraction.get("ocr"),
+		)
+
+
+def _spool_batch(files: List[UploadFile]) -> Tuple[List[Any], List[Tuple[str, Any, str | None]]]:
+	"""Copy the uploads to temp files we own (they outlive the request body) and list documents.
+
+	Returns (open temp files, [(name, opener, zip member or None)]). Zip archives
+	are expanded into their members without extracting them to memory.
+	"""
+	spooled: List[Any] = []
+	entries: List[Tuple[str, Any, str | None]] = []
+	try:
+		for f in files:
+			tmp = tempfile.TemporaryFile()
+			spooled.append(tmp)
+			shutil.copyfileobj(f.file, tmp, length=1024 * 1024)
+			tmp.seek(0)
+			if (f.filename or "").lower().endswith(".zip") or f.content_type in ("application/zip", "application/x-zip-compressed"):
+				try:
+					archive = zipfile.ZipFile(tmp)
+				except zipfile.BadZipFile:
+					raise HTTPException(status_code=400, detail=f"Invalid zip archive: {f.filename}")
+				spooled.append(archive)
+				for info in archive.infolist():
+					name = info.filename
+					if info.is_dir() or name.startswith("__MACOSX/") or name.rsplit("/", 1)[-1].startswith("."):
+						continue
+					if info.file_size > BATCH_MAX_FILE_BYTES:
+						raise HTTPException(status_code=413, detail=f"Zip member too large: {name}")
+					entries.append((name, archive, name))
+			else:
+				entries.append((f.filename or f"file-{len(entries)}", tmp, None))
+			if len(entries) > BATCH_MAX_FILES:
+				raise HTTPException(status_code=413, detail=f"Too many files (max {BATCH_MAX_FILES})")
+	except BaseException:
+		# A rejected member (400/413) or a failed copy: nothing will read the files spooled so far
+		for fh in reversed(spooled):
+			fh.close()
+		raise
+	return spooled, entries
+
+
+def _read_entry(source: Any, member: str | None) -> bytes:
+	if member is not None:
+		with source.open(member) as fh:
+			return fh.read(BATCH_MAX_FILE_BYTES + 1)
+	source.seek(0)
+	return source.read(BATCH_MAX_FILE_BYTES + 1)
+
+
+@router.post("/batch")
+async def batch_verify(
+	files: List[UploadFile] = File(...),
+	institution_id: Optional[str] = None,
+	full: bool = False,
+	request: Request = None,
+):
+	"""Verify many certificates (multipart files and/or zip archives) in one request.
+
+	Documents fan out across the worker pool; registry lookups for documents that
+	finish together are resolved with one query. Results stream back as NDJSON,
+	one line per document in completion order. Tiers as for /upload.
+	"""
+	spooled, entries = await asyncio.to_thread(_spool_batch, files)
+	if not entries:
+		for fh in spooled:
+			fh.close()
+		raise HTTPException(status_code=400, detail="No files provided")
+	source_ip = request.client.host if request and request.client else None
+	# Zip members share one archive handle; serialize reads from it
+	read_lock = asyncio.Lock()
+
+	async def extract_one(index: int, name: str, source: Any, member: str | None) -> Dict[str, Any]:
+		async with read_lock:
+			with timed("upload_read"):
+				data = await asyncio.to_thread(_read_entry, source, member)
+		if len(data) > BATCH_MAX_FILE_BYTES:
+			raise ValueError("file too large")
+		extraction = await _extract(DocumentContext(data, name), institution_id, signed_tier=SIGNED_QR_FAST_PATH and not full)
+		signed = extraction.get("signed")
+		if signed:
+			return {"index": index, "file_name": name, **signed, "extraction": {}, "tier": "signed_qr"}
+		merged = _merge(extraction["ocr_fields"], extraction["qr_data"])
+		warnings = [*(await _qr_checks(extraction["qr_data"])), *extraction["anomaly_warnings"]]
+		return {"index": index, "file_name": name, "merged": merged, "warnings": warnings, "extraction": extraction, "tier": "full"}
+
+	async def results() -> AsyncIterator[str]:
+		pending: Dict[asyncio.Task, Tuple[int, str]] = {}
+		queue = list(enumerate(entries))
+		queue.reverse()
+		IN_FLIGHT.inc()
+		try:
+			while queue or pending:
+				while queue and len(pending) < BATCH_CONCURRENCY:
+					index, (name, source, member) = queue.pop()
+					pending[asyncio.create_task(extract_one(index, name, source, member))] = (index, name)
+				done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+				ok: List[Dict[str, Any]] = []
+				for task in done:
+					index, name = pending.pop(task)
+					exc = task.exception()
+					if exc is None:
+						ok.append(task.result())
+					else:
+						VERIFICATION_ERRORS.labels(_error_reason(exc)).inc()
+						detail = exc.detail if isinstance(exc, HTTPException) else str(exc)
+						yield json.dumps({"index": index, "file_name": name, "error": detail}) + "\n"
+				if not ok:
+					continue
+				# Everything that finished together shares one registry query
+				with timed("db_lookup"):
+					validations = await validate_many([item["merged"] for item in ok], institution_id)
+				for item, validation in zip(ok, validations):
+					duplicate = await _duplicate_checks(item["extraction"], item["merged"], validation, institution_id)
+					extraction = item["extraction"]
+					response = await _finish(
+						validation,
+						item["merged"],
+						[*item["warnings"], *duplicate],
+						item["file_name"],
+						institution_id,
+						source_ip,
+						extraction.get("anomaly"),
+						extraction.get("ocr"),
+						item["tier"],
+					)
+					yield json.dumps({"index": item["index"], "file_name": item["file_name"], "result": response.model_dump()}) + "\n"
+		finally:
+			IN_FLIGHT.dec()
+			for task in pending:
+				task.cancel()
+			for fh in reversed(spooled):
+				fh.close()
+
+	return StreamingResponse(results(), media_type="application/x-ndjson")
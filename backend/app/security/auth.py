@@ -6,10 +6,18 @@ from passlib.context import CryptContext
 from fastapi import Depends, HTTPException
 from fastapi.security import OAuth2PasswordBearer
 
+from ..services.signature import cache_ttl, token_digest
+from ..services.ttl_cache import TTLCache
+
 
 SECRET_KEY = os.getenv("SECRET_KEY", "change-me-in-env")
 ALGORITHM = os.getenv("JWT_ALG", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "480"))
+# Decoded access tokens by token hash, dropped at their 'exp' (admin clients reuse one token for many calls)
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "10000"))
+AUTH_TOKEN_CACHE_TTL_SECONDS = float(os.getenv("AUTH_TOKEN_CACHE_TTL_SECONDS", "300"))
+
+token_cache = TTLCache(maxsize=AUTH_TOKEN_CACHE_SIZE, ttl=AUTH_TOKEN_CACHE_TTL_SECONDS, name="auth_token")
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/admin/login")
@@ -31,13 +39,21 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
 
 
 def get_current_user(token: str = Depends(oauth2_scheme)) -> dict:
+	digest = token_digest(token)
+	payload = token_cache.get(digest)
+	if payload is not None:
+		return dict(payload)
 	try:
 		payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
 		if not payload.get("sub"):
 			raise HTTPException(status_code=401, detail="Invalid token")
-		return payload
 	except JWTError:
 		raise HTTPException(status_code=401, detail="Invalid token")
+	# Only valid tokens are cached: garbage tokens cannot evict them
+	ttl = cache_ttl(payload, token_cache.ttl)
+	if ttl > 0:
+		token_cache.set(digest, payload, ttl)
+	return dict(payload)
 
 
 def require_role(required_role: str):
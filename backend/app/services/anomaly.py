@@ -1,108 +1,192 @@
 from __future__ import annotations
 
-from io import BytesIO
-from typing import List, Tuple
-import math
+import os
+import time
+from typing import Any, Dict, List, Tuple
 import cv2
 import numpy as np
-from PIL import Image
 
+from .document import DocumentContext
+from .phash_index import hash_to_hex, pack_bits
 
-def _first_image_from_bytes(data: bytes, filename: str | None) -> Image.Image | None:
-	try:
-		if (filename or "").lower().endswith(".pdf"):
-			# PDF disabled in local mode
-			return None
-		else:
-			return Image.open(BytesIO(data)).convert("RGB")
-	except Exception:
-		return None
 
+# Rows per strip for the single-pass feature scan (bounds temporary buffers on 20-50 MP scans)
+ANOMALY_STRIP_ROWS = int(os.getenv("ANOMALY_STRIP_ROWS", "256"))
+# Pixels recompressed for ELA; larger images are sampled with a grid of full-resolution tiles
+ANOMALY_ELA_MAX_PIXELS = int(os.getenv("ANOMALY_ELA_MAX_PIXELS", str(4_000_000)))
+ELA_TILE = 512
+ELA_QUALITY = 90
 
-def _phash(img: Image.Image, hash_size: int = 16) -> np.ndarray:
+
+def _phash(gray: np.ndarray, hash_size: int = 16) -> np.ndarray:
 	# Perceptual hash via DCT
-	img = img.convert("L").resize((hash_size * 4, hash_size * 4), Image.BICUBIC)
-	arr = np.asarray(img, dtype=np.float32)
+	small = cv2.resize(gray, (hash_size * 4, hash_size * 4), interpolation=cv2.INTER_CUBIC)
+	arr = small.astype(np.float32)
 	dct = cv2.dct(arr)
 	dct_low = dct[:hash_size, :hash_size]
 	median = np.median(dct_low)
 	return (dct_low > median).astype(np.uint8)
 
 
-def _hamming(a: np.ndarray, b: np.ndarray) -> int:
-	return int(np.count_nonzero(a.flatten() != b.flatten()))
-
-
-def _template_match_scores(img: Image.Image, templates: List[Image.Image]) -> List[float]:
-	scores: List[float] = []
-	img_gray = cv2.cvtColor(np.array(img), cv2.COLOR_RGB2GRAY)
-	for t in templates:
-		t_gray = cv2.cvtColor(np.array(t), cv2.COLOR_RGB2GRAY)
-		th, tw = t_gray.shape[:2]
-		if img_gray.shape[0] < th or img_gray.shape[1] < tw:
-			scores.append(0.0)
-			continue
-		res = cv2.matchTemplate(img_gray, t_gray, cv2.TM_CCOEFF_NORMED)
-		_, max_val, _, _ = cv2.minMaxLoc(res)
-		scores.append(float(max_val))
-	return scores
+def _otsu_from_hist(hist: np.ndarray) -> Tuple[int, float]:
+	"""Otsu threshold of a 256-bin histogram and the fraction of pixels at or below it (ink)."""
+	total = float(hist.sum())
+	if total == 0:
+		return 0, 0.0
+	p = hist / total
+	omega = np.cumsum(p)
+	mu = np.cumsum(p * np.arange(256))
+	with np.errstate(divide="ignore", invalid="ignore"):
+		sigma_b = (mu[-1] * omega - mu) ** 2 / (omega * (1.0 - omega))
+	t = int(np.argmax(np.nan_to_num(sigma_b)))
+	return t, float(omega[t])
 
 
-async def analyze_anomalies(file_bytes: bytes, filename: str | None) -> List[str]:
-	"""Return anomaly warnings using pHash comparison and simple template matching.
+def _scan_strips(gray: np.ndarray, timings: Dict[str, float]) -> Dict[str, Any]:
+	"""Blur, blockiness and per-quadrant histograms in one pass over horizontal strips.
 
-	In this scaffold, we don't have canonical templates or a registry of known pHashes.
-	So we compute a self-consistency check: if image is excessively compressed/noisy or
-	if template matching against provided samples is low (no samples by default),
-	we add soft warnings.
+	Each strip reuses the same Laplacian/diff buffers, so temporaries stay at
+	ANOMALY_STRIP_ROWS rows regardless of the scan size. Strips carry one row of
+	context on each side, which makes the Laplacian identical to a full-image one.
+	"""
+	h, w = gray.shape
+	half_h, half_w = h // 2, w // 2
+	# 3x3 Laplacian of uint8 fits in int16 exactly (|value| <= 1020)
+	lap_buf = np.empty((ANOMALY_STRIP_ROWS + 2, w), dtype=np.int16)
+	diff_buf = np.empty((ANOMALY_STRIP_ROWS, max(w - 1, 1)), dtype=np.uint8)
+	hists = np.zeros((4, 256), dtype=np.float64)
+	lap_sum = lap_sq = diff_sum = 0.0
+	t_blur = t_block = t_layout = 0.0
+	# Strip boundaries never straddle h // 2, so every strip belongs to two quadrants
+	bounds = [(y, min(y + ANOMALY_STRIP_ROWS, stop)) for start, stop in ((0, half_h), (half_h, h)) for y in range(start, stop, ANOMALY_STRIP_ROWS)]
+	for y0, y1 in bounds:
+		rows = y1 - y0
+		t0 = time.perf_counter()
+		c0, c1 = max(y0 - 1, 0), min(y1 + 1, h)
+		lap = lap_buf[: c1 - c0]
+		cv2.Laplacian(gray[c0:c1], cv2.CV_16S, dst=lap)
+		mean, std = cv2.meanStdDev(lap[y0 - c0 : y0 - c0 + rows])
+		n = rows * w
+		lap_sum += float(mean[0, 0]) * n
+		lap_sq += (float(std[0, 0]) ** 2 + float(mean[0, 0]) ** 2) * n
+		t1 = time.perf_counter()
+		strip = gray[y0:y1]
+		if w > 1:
+			diff = diff_buf[:rows]
+			cv2.absdiff(strip[:, 1:], strip[:, :-1], dst=diff)
+			diff_sum += cv2.sumElems(diff)[0]
+		t2 = time.perf_counter()
+		q = 0 if y0 < half_h else 2
+		if half_w:
+			hists[q] += cv2.calcHist([strip[:, :half_w]], [0], None, [256], [0, 256]).ravel()
+		hists[q + 1] += cv2.calcHist([strip[:, half_w:]], [0], None, [256], [0, 256]).ravel()
+		t3 = time.perf_counter()
+		t_blur += t1 - t0
+		t_block += t2 - t1
+		t_layout += t3 - t2
+
+	count = float(h * w)
+	blur = lap_sq / count - (lap_sum / count) ** 2
+	t0 = time.perf_counter()
+	otsu = [_otsu_from_hist(hist) for hist in hists]
+	timings["blur"] = t_blur * 1000
+	timings["blockiness"] = t_block * 1000
+	timings["layout"] = (t_layout + time.perf_counter() - t0) * 1000
+	return {
+		"blur_variance": float(blur),
+		"blockiness": float(diff_sum / max(h * (w - 1), 1)),
+		"quadrant_otsu": [t for t, _ in otsu],
+		"quadrant_ink_ratio": [ink for _, ink in otsu],
+	}
+
+
+def _ela_tiles(h: int, w: int) -> List[Tuple[int, int, int, int]]:
+	"""(y, x, th, tw) regions for ELA: the whole image, or a grid of tiles spread over it."""
+	if h * w <= ANOMALY_ELA_MAX_PIXELS:
+		return [(0, 0, h, w)]
+	per_side = max(1, int((ANOMALY_ELA_MAX_PIXELS / (ELA_TILE * ELA_TILE)) ** 0.5))
+	th, tw = min(ELA_TILE, h), min(ELA_TILE, w)
+	# Offsets on the 16px MCU grid keep each tile's JPEG blocks aligned with the original's
+	ys = sorted({int(y) // 16 * 16 for y in np.linspace(0, h - th, per_side)})
+	xs = sorted({int(x) // 16 * 16 for x in np.linspace(0, w - tw, per_side)})
+	return [(y, x, th, tw) for y in ys for x in xs]
+
+
+def _ela(rgb: np.ndarray) -> Dict[str, Any]:
+	"""Recompress (tiles of) the image as JPEG and measure the mean absolute difference."""
+	h, w = rgb.shape[:2]
+	total = pixels = 0.0
+	worst = 0.0
+	tiles = _ela_tiles(h, w)
+	for y, x, th, tw in tiles:
+		# OpenCV encodes BGR; the reversed view is made contiguous per tile only
+		tile = np.ascontiguousarray(rgb[y : y + th, x : x + tw, ::-1])
+		ok, buf = cv2.imencode(".jpg", tile, [cv2.IMWRITE_JPEG_QUALITY, ELA_QUALITY])
+		if not ok:
+			continue
+		recompressed = cv2.imdecode(buf, cv2.IMREAD_COLOR)
+		cv2.absdiff(tile, recompressed, dst=recompressed)
+		score = float(np.mean(cv2.mean(recompressed)[:3]))
+		worst = max(worst, score)
+		total += score * th * tw
+		pixels += th * tw
+	return {"ela_mean": total / pixels if pixels else 0.0, "ela_max_tile": worst, "ela_tiles": len(tiles)}
+
+
+def analyze_document_anomalies(doc: DocumentContext) -> Dict[str, Any]:
+	"""Return anomaly warnings, the image's perceptual hash and the feature vector behind them.
+
+	All features come from the document's shared grayscale/RGB buffers:
+	blur (Laplacian variance), blockiness, per-quadrant Otsu thresholds and ink
+	ratios are gathered in a single strip-wise pass, and ELA recompresses at
+	most ANOMALY_ELA_MAX_PIXELS of full-resolution tiles. `features` holds the
+	raw values and `timings_ms` the cost of each feature. The pHash (hex) is
+	compared against the registry of known certificate images by the caller
+	(see phash_index).
 	"""
 	warnings: List[str] = []
-	img = _first_image_from_bytes(file_bytes, filename)
-	if img is None:
-		return warnings
+	gray = doc.gray
+	if gray is None:
+		# PDF or undecodable upload
+		return {"warnings": warnings, "phash": None, "features": {}, "timings_ms": {}}
+
+	started = time.perf_counter()
+	timings: Dict[str, float] = {}
+	h, w = gray.shape
+	features: Dict[str, Any] = {"width": int(w), "height": int(h), **_scan_strips(gray, timings)}
 
 	# Compression/noise heuristic: variance of Laplacian for blur detection
-	gray = cv2.cvtColor(np.array(img), cv2.COLOR_RGB2GRAY)
-	blur_metric = cv2.Laplacian(gray, cv2.CV_64F).var()
-	if blur_metric < 20:
+	if features["blur_variance"] < 20:
 		warnings.append("Low detail/blur detected; possible scan or tampering")
 
 	# Blockiness (compression artifacts)
-	blockiness = float(np.mean(np.abs(np.diff(gray.astype(np.int16), axis=1))))
-	if blockiness < 1.2:
+	if features["blockiness"] < 1.2:
 		warnings.append("Strong compression artifacts; image quality may affect OCR/validation")
 
-	# pHash exists (no comparison yet). Could be used to compare with authoritative hash later.
-	_ = _phash(img)
-
-	# Template matching placeholder (no templates bundled)
-	# If templates provided in future, use _template_match_scores to validate seals/logos.
-
 	# Simple layout validation: text density by quadrants
-	h, w = gray.shape
-	quadrants = [
-		gray[0:h//2, 0:w//2],
-		gray[0:h//2, w//2:w],
-		gray[h//2:h, 0:w//2],
-		gray[h//2:h, w//2:w],
-	]
-	binarized = [cv2.threshold(q, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1] for q in quadrants]
-	ink_ratio = [float(1.0 - (np.mean(b) / 255.0)) for b in binarized]
+	ink_ratio = features["quadrant_ink_ratio"]
 	if max(ink_ratio) > 0.65 and min(ink_ratio) < 0.05:
 		warnings.append("Unusual text layout distribution; verify template positioning")
 
+	# pHash for near-duplicate lookup against registered/verified certificate images
+	t0 = time.perf_counter()
+	phash = hash_to_hex(pack_bits(_phash(gray)))
+	timings["phash"] = (time.perf_counter() - t0) * 1000
+
 	# ELA (Error Level Analysis) style heuristic: recompress as JPEG and diff
+	t0 = time.perf_counter()
 	try:
-		buf = BytesIO()
-		img.save(buf, format="JPEG", quality=90)
-		recompressed = Image.open(BytesIO(buf.getvalue())).convert("RGB")
-		diff = cv2.absdiff(np.array(img), np.array(recompressed))
-		ela_score = float(np.mean(diff))
-		if ela_score > 10.0:
+		features.update(_ela(doc.rgb))
+		if features["ela_mean"] > 10.0:
 			warnings.append("ELA indicates potential local edits or heavy recompression")
 	except Exception:
 		pass
+	timings["ela"] = (time.perf_counter() - t0) * 1000
+	timings["total"] = (time.perf_counter() - started) * 1000
 
-	return warnings
+	return {"warnings": warnings, "phash": phash, "features": features, "timings_ms": {k: round(v, 3) for k, v in timings.items()}}
 
 
+def document_phash(doc: DocumentContext) -> str | None:
+	gray = doc.gray
+	return None if gray is None else hash_to_hex(pack_bits(_phash(gray)))
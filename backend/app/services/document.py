@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import hashlib
+from io import BytesIO
+import cv2
+import numpy as np
+from fastapi import UploadFile
+from PIL import Image
+
+from . import pdf
+
+
+class DocumentContext:
+	"""Per-request view of an upload shared by the OCR, QR and anomaly stages.
+
+	Holds the raw bytes, a single decoded RGB ndarray and a lazily computed
+	grayscale view, so the upload is read and decoded exactly once. For PDFs
+	the image is page 1 rasterized (see pdf.py); other pages and the text
+	layer are read from the bytes on demand. Pickles without the decoded
+	arrays (tens of MB for a scan); every stage of a document runs in one pool
+	task (see extraction.py), which decodes it there.
+	"""
+
+	def __init__(self, data: bytes, filename: str | None = None):
+		self.data = data
+		self.filename = filename
+		self._rgb: np.ndarray | None = None
+		self._gray: np.ndarray | None = None
+		self._decoded = False
+		self._sha256: str | None = None
+
+	def __getstate__(self) -> dict:
+		state = dict(self.__dict__)
+		state.update(_rgb=None, _gray=None, _decoded=False)
+		return state
+
+	@classmethod
+	async def from_upload(cls, file: UploadFile) -> "DocumentContext":
+		return cls(await file.read(), file.filename)
+
+	@property
+	def is_pdf(self) -> bool:
+		return self.data[:5] == b"%PDF-" or (self.filename or "").lower().endswith(".pdf")
+
+	@property
+	def content_hash(self) -> str:
+		if self._sha256 is None:
+			self._sha256 = hashlib.sha256(self.data).hexdigest()
+		return self._sha256
+
+	@property
+	def rgb(self) -> np.ndarray | None:
+		if not self._decoded:
+			self._decoded = True
+			self._rgb = _render_pdf(self.data) if self.is_pdf else _decode_rgb(self.data)
+		return self._rgb
+
+	@property
+	def gray(self) -> np.ndarray | None:
+		rgb = self.rgb
+		if self._gray is None and rgb is not None:
+			self._gray = cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)
+		return self._gray
+
+	def pil(self) -> Image.Image | None:
+		rgb = self.rgb
+		return None if rgb is None else Image.fromarray(rgb)
+
+
+def _decode_rgb(data: bytes) -> np.ndarray | None:
+	try:
+		arr = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+		if arr is not None:
+			return cv2.cvtColor(arr, cv2.COLOR_BGR2RGB, dst=arr)
+		# Formats OpenCV can't read (GIF, some TIFF variants); Pillow decodes those
+		return np.asarray(Image.open(BytesIO(data)).convert("RGB"))
+	except Exception:
+		return None
+
+
+def _render_pdf(data: bytes) -> np.ndarray | None:
+	try:
+		return pdf.first_page_rgb(data)
+	except Exception:
+		return None
+
+
+def shrink(img: np.ndarray, size: tuple[int, int]) -> np.ndarray:
+	"""Downscale to `size` (width, height) by repeated 2x INTER_AREA halving, then one final resize.
+
+	OpenCV's INTER_AREA is only fast for an exact 2x factor; other factors
+	are ~10x slower on large scans. The remaining (< 2x) step is bilinear.
+	"""
+	w, h = size
+	while img.shape[1] >= 2 * w and img.shape[0] >= 2 * h:
+		img = cv2.resize(img, (img.shape[1] // 2, img.shape[0] // 2), interpolation=cv2.INTER_AREA)
+	if (img.shape[1], img.shape[0]) == (w, h):
+		return img
+	return cv2.resize(img, (w, h), interpolation=cv2.INTER_LINEAR)
+
+
+def decode_document(doc: DocumentContext) -> DocumentContext:
+	"""Decode (and grayscale) the document once."""
+	_ = doc.gray
+	return doc
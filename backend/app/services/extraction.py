@@ -0,0 +1,62 @@
+import time
+from typing import Any, Dict
+
+from .anomaly import analyze_document_anomalies
+from .document import DocumentContext
+from .ocr import ocr_document
+from .qr import scan_document_qr
+from .signature import verify_embedded_signature
+from .templates import match_document_templates, template_store
+
+
+def signed_claims(qr_data: Any) -> Dict[str, Any] | None:
+	"""A QR payload's fields if it carries a valid signature, else None.
+
+	The signed claims are authoritative; unsigned fields next to them must not
+	contradict them.
+	"""
+	if not isinstance(qr_data, dict) or not qr_data.get("sig"):
+		return None
+	sig_info = verify_embedded_signature(qr_data)
+	if not sig_info.get("valid"):
+		return None
+	claims = sig_info["payload"]
+	if any(k in qr_data and str(qr_data[k]) != str(v) for k, v in claims.items()):
+		return None
+	return {**{k: v for k, v in qr_data.items() if k != "sig"}, **claims}
+
+
+def extract_document(
+	doc: DocumentContext,
+	institution_id: str | None,
+	qr: Dict[str, Any] | None = None,
+	signed_tier: bool = False,
+) -> Dict[str, Any]:
+	"""QR, OCR, anomaly and template results for one upload; runs on the worker pool.
+
+	Every stage runs in this one task, so the upload is decoded exactly once, in
+	the process that uses it; the decoded arrays never cross the pool boundary.
+	`qr` is a scan the caller already has cached. With `signed_tier`, a QR
+	carrying a valid signature returns before OCR ({"signed": True}).
+	"""
+	started = time.perf_counter()
+	if qr is None:
+		qr = scan_document_qr(doc)
+	if signed_tier and signed_claims(qr["primary"]) is not None:
+		return {"qr": qr, "signed": True}
+	ocr = ocr_document(doc, institution_id)
+	anomaly = analyze_document_anomalies(doc)
+	qr_data = qr["primary"]
+	# Seal/logo/anchor matching needs the institution, which the QR payload may supply
+	template_inst = institution_id or (qr_data.get("institution_id") if isinstance(qr_data, dict) else None)
+	template = None
+	if template_store.has(str(template_inst) if template_inst else None):
+		template = match_document_templates(doc, str(template_inst))
+	return {
+		"qr": qr,
+		"signed": False,
+		"ocr": ocr,
+		"anomaly": anomaly,
+		"template": template,
+		"elapsed_seconds": time.perf_counter() - started,
+	}
@@ -0,0 +1,178 @@
+import csv
+import io
+import os
+import time
+from typing import Any, BinaryIO, Dict, Iterator, List
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from ..db.migrations import registry_upsert_key_ready
+from ..db.models import CertificateRecord
+from ..db.session import engine
+from .registry import registry
+from .result_cache import result_cache
+
+
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "5000"))
+# Rejected rows reported back verbatim (the count is always exact)
+IMPORT_MAX_REJECTED_SAMPLES = int(os.getenv("IMPORT_MAX_REJECTED_SAMPLES", "100"))
+
+RECORD_COLUMNS = ("institution_id", "certificate_id", "candidate_name", "roll_number", "course", "year")
+UPDATE_COLUMNS = ("candidate_name", "roll_number", "course", "year")
+
+_upsert_key_checked = False
+
+
+class ImportSchemaError(RuntimeError):
+	"""The registry table lacks the unique key imports upsert on."""
+
+
+def require_upsert_key() -> None:
+	"""Raise ImportSchemaError unless certificaterecord has its unique (institution_id, certificate_id) index."""
+	global _upsert_key_checked
+	if _upsert_key_checked:
+		return
+	if not registry_upsert_key_ready(engine):
+		raise ImportSchemaError(
+			"certificaterecord has no unique (institution_id, certificate_id) index, which imports upsert on. "
+			"It is created at startup unless duplicated keys block it (see the startup log): remove the duplicates, "
+			"or merge them (keeping the newest row of each) with POST /admin/registry/merge-duplicates."
+		)
+	# Indexes are only added at startup, so one successful check holds for the process
+	_upsert_key_checked = True
+
+
+def parse_row(row: Dict[str, Any]) -> Dict[str, Any]:
+	"""Normalize one CSV row into CertificateRecord columns; raises ValueError if unusable."""
+	record = {k: (row.get(k) or "").strip() for k in RECORD_COLUMNS if k != "year"}
+	for k in ("institution_id", "certificate_id", "candidate_name"):
+		if not record[k]:
+			raise ValueError(f"missing {k}")
+	year = (row.get("year") or "").strip()
+	try:
+		record["year"] = int(year or 0)
+	except ValueError:
+		raise ValueError(f"invalid year {year!r}")
+	return record
+
+
+def _upsert_executemany(conn: Connection, rows: List[Dict[str, Any]]) -> None:
+	if conn.dialect.name == "postgresql":
+		from sqlalchemy.dialects.postgresql import insert
+	else:
+		from sqlalchemy.dialects.sqlite import insert
+	stmt = insert(CertificateRecord.__table__)
+	stmt = stmt.on_conflict_do_update(
+		index_elements=["institution_id", "certificate_id"],
+		set_={c: stmt.excluded[c] for c in UPDATE_COLUMNS},
+	)
+	conn.execute(stmt, rows)
+
+
+def _upsert_copy(conn: Connection, rows: List[Dict[str, Any]]) -> None:
+	# PostgreSQL: COPY into a session-local staging table, then merge with one INSERT .. ON CONFLICT
+	cols = ", ".join(RECORD_COLUMNS)
+	conn.exec_driver_sql(
+		"CREATE TEMP TABLE IF NOT EXISTS certificaterecord_import ("
+		"institution_id text, certificate_id text, candidate_name text, roll_number text, course text, year integer"
+		") ON COMMIT DELETE ROWS"
+	)
+	with conn.connection.driver_connection.cursor() as cur:
+		with cur.copy(f"COPY certificaterecord_import ({cols}) FROM STDIN") as copy:
+			for r in rows:
+				copy.write_row([r[c] for c in RECORD_COLUMNS])
+	updates = ", ".join(f"{c} = EXCLUDED.{c}" for c in UPDATE_COLUMNS)
+	conn.execute(text(
+		f"INSERT INTO certificaterecord ({cols}) SELECT {cols} FROM certificaterecord_import "
+		f"ON CONFLICT (institution_id, certificate_id) DO UPDATE SET {updates}"
+	))
+
+
+def upsert_batch(rows: List[Dict[str, Any]]) -> None:
+	"""Insert-or-update a batch keyed on (institution_id, certificate_id) in one transaction."""
+	require_upsert_key()
+	with engine.begin() as conn:
+		if conn.dialect.name == "postgresql" and conn.dialect.driver == "psycopg":
+			_upsert_copy(conn, rows)
+		else:
+			_upsert_executemany(conn, rows)
+	result_cache.invalidate_records((r["institution_id"], r["certificate_id"]) for r in rows)
+	registry.apply(rows)
+
+
+def iter_csv_import(
+	stream: BinaryIO,
+	batch_size: int = IMPORT_BATCH_SIZE,
+	start_row: int = 0,
+) -> Iterator[Dict[str, Any]]:
+	"""Stream a certificate CSV into the registry, yielding progress after each committed batch.
+
+	The file is decoded and parsed incrementally, so memory is bounded by
+	`batch_size` regardless of file size. Rows before `start_row` (data rows,
+	excluding the header) are skipped, which lets an interrupted import resume
+	from its last committed batch. Raises ImportSchemaError before reading
+	anything if the registry table cannot be upserted into.
+	"""
+	require_upsert_key()
+	text_stream = io.TextIOWrapper(stream, encoding="utf-8", errors="ignore", newline="")
+	reader = csv.DictReader(text_stream)
+	progress: Dict[str, Any] = {
+		"rows_read": start_row,
+		"upserted": 0,
+		"rejected": 0,
+		"batches": 0,
+		"elapsed_seconds": 0.0,
+		"rows_per_second": 0.0,
+		"rejected_samples": [],
+	}
+	started = time.perf_counter()
+	# Keyed on the unique constraint so a batch never touches the same row twice
+	batch: Dict[tuple, Dict[str, Any]] = {}
+
+	def stamp() -> Dict[str, Any]:
+		elapsed = time.perf_counter() - started
+		progress["elapsed_seconds"] = round(elapsed, 3)
+		progress["rows_per_second"] = round((progress["rows_read"] - start_row) / elapsed, 1) if elapsed else 0.0
+		return dict(progress)
+
+	def flush() -> Dict[str, Any]:
+		upsert_batch(list(batch.values()))
+		progress["upserted"] += len(batch)
+		progress["batches"] += 1
+		batch.clear()
+		return stamp()
+
+	reported = -1
+	try:
+		for line_no, row in enumerate(reader, start=1):
+			if line_no <= start_row:
+				continue
+			progress["rows_read"] = line_no
+			try:
+				record = parse_row(row)
+			except ValueError as e:
+				progress["rejected"] += 1
+				if len(progress["rejected_samples"]) < IMPORT_MAX_REJECTED_SAMPLES:
+					# +1 for the header line
+					progress["rejected_samples"].append({"line": line_no + 1, "error": str(e)})
+				continue
+			batch[(record["institution_id"], record["certificate_id"])] = record
+			if len(batch) >= batch_size:
+				yield flush()
+				reported = progress["rows_read"]
+		if batch:
+			yield flush()
+		elif reported != progress["rows_read"]:
+			# Trailing rejected rows (or an empty file) still need a final report
+			yield stamp()
+	finally:
+		# Leave the caller's binary stream open
+		text_stream.detach()
+
+
+def import_csv(stream: BinaryIO, batch_size: int = IMPORT_BATCH_SIZE) -> Dict[str, Any]:
+	progress: Dict[str, Any] = {}
+	for progress in iter_csv_import(stream, batch_size=batch_size):
+		pass
+	return progress
@@ -0,0 +1,154 @@
+"""Bulk QR generation for issuance runs (a cohort of an institution at once).
+
+Records are read in keyset pages, split into chunks and rendered on the
+worker pool (processes by default), with a bounded number of chunks in
+flight. The zip is streamed member by member, so neither the records nor the
+archive are ever held whole. The last member, `_issuance.json`, reports the
+run's throughput.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, Iterator, List, Tuple
+
+from sqlmodel import Session, select
+
+from ..db.models import CertificateRecord
+from ..db.session import engine
+from .qr_images import archive_name, certificate_payload, payload_text, qr_image_cache
+from .signature import sign_payload
+from .workers import WORKER_POOL_SIZE, iter_in_pool
+from .zip_stream import iter_zip
+
+
+# Certificates rendered per pool task (amortizes pickling and scheduling)
+ISSUANCE_CHUNK_SIZE = int(os.getenv("ISSUANCE_CHUNK_SIZE", "250"))
+_PAGE_SIZE = 5000
+SUMMARY_NAME = "_issuance.json"
+
+# (id, certificate_id, candidate_name, roll_number, course, year)
+Row = Tuple[int, str, str, str, str, int]
+
+_stats_lock = threading.Lock()
+_last_run: Dict[str, Any] = {}
+_runs = 0
+
+
+def signed_payload(institution_id: str, row: Row) -> Dict[str, Any]:
+	"""Certificate payload plus a JWT ('sig') over the fields a verifier cross-checks."""
+	_, certificate_id, candidate_name, roll_number, course, year = row
+	payload = certificate_payload(institution_id, certificate_id)
+	payload["sig"] = sign_payload({
+		"certificate_id": certificate_id,
+		"institution_id": institution_id,
+		"candidate_name": candidate_name,
+		"roll_number": roll_number,
+		"course": course,
+		"year": year,
+	}, institution_id)
+	return payload
+
+
+def render_chunk(institution_id: str, rows: List[Row], signed: bool) -> Tuple[List[Tuple[str, bytes]], Dict[str, int]]:
+	"""(archive member name, PNG) per row and the image cache sources; runs in a pool worker.
+
+	Cache hits are counted by the caller: a worker process's counters never reach /admin.
+	"""
+	out = []
+	sources: Counter = Counter()
+	for row in rows:
+		payload = signed_payload(institution_id, row) if signed else certificate_payload(institution_id, row[1])
+		# keep=False: a whole cohort would only evict the images being served
+		png, source = qr_image_cache.lookup(payload_text(payload), keep=False)
+		sources[source] += 1
+		out.append((archive_name(row[1]), png))
+	return out, dict(sources)
+
+
+def _cohort_filter(institution_id: str, year: int | None, course: str | None) -> List[Any]:
+	clauses = [CertificateRecord.institution_id == institution_id]
+	if year is not None:
+		clauses.append(CertificateRecord.year == year)
+	if course:
+		clauses.append(CertificateRecord.course == course)
+	return clauses
+
+
+def has_cohort(institution_id: str, year: int | None = None, course: str | None = None) -> bool:
+	with Session(engine) as session:
+		return session.exec(select(CertificateRecord.id).where(*_cohort_filter(institution_id, year, course)).limit(1)).first() is not None
+
+
+def iter_cohort(institution_id: str, year: int | None = None, course: str | None = None) -> Iterator[List[Row]]:
+	"""Chunks of ISSUANCE_CHUNK_SIZE cohort rows in id order, read a page at a time."""
+	clauses = _cohort_filter(institution_id, year, course)
+	last_id = 0
+	while True:
+		with Session(engine) as session:
+			rows = session.exec(
+				select(
+					CertificateRecord.id,
+					CertificateRecord.certificate_id,
+					CertificateRecord.candidate_name,
+					CertificateRecord.roll_number,
+					CertificateRecord.course,
+					CertificateRecord.year,
+				)
+				.where(*clauses, CertificateRecord.id > last_id)
+				.order_by(CertificateRecord.id)
+				.limit(_PAGE_SIZE)
+			).all()
+		if not rows:
+			return
+		rows = [tuple(r) for r in rows]
+		for i in range(0, len(rows), ISSUANCE_CHUNK_SIZE):
+			yield rows[i : i + ISSUANCE_CHUNK_SIZE]
+		last_id = rows[-1][0]
+
+
+def iter_issuance_zip(institution_id: str, year: int | None = None, course: str | None = None, signed: bool = True) -> Iterator[bytes]:
+	"""Zip stream of the cohort's QR PNGs, ending with the run summary."""
+	summary: Dict[str, Any] = {
+		"institution_id": institution_id,
+		"filter": {"year": year, "course": course},
+		"signed": signed,
+		"workers": WORKER_POOL_SIZE,
+		"chunk_size": ISSUANCE_CHUNK_SIZE,
+	}
+
+	def members() -> Iterator[Tuple[str, bytes]]:
+		started = time.perf_counter()
+		count = 0
+		tasks = ((institution_id, rows, signed) for rows in iter_cohort(institution_id, year, course))
+		for rendered, sources in iter_in_pool(render_chunk, tasks):
+			for source, n in sources.items():
+				qr_image_cache.count(source, n)
+			count += len(rendered)
+			yield from rendered
+		elapsed = time.perf_counter() - started
+		summary.update(
+			certificates=count,
+			elapsed_seconds=round(elapsed, 3),
+			per_second=round(count / elapsed, 1) if elapsed else None,
+			finished_at_ms=int(time.time() * 1000),
+		)
+		_record(summary)
+		yield SUMMARY_NAME, json.dumps(summary, indent=2).encode()
+
+	return iter_zip(members())
+
+
+def _record(summary: Dict[str, Any]) -> None:
+	global _runs
+	with _stats_lock:
+		_runs += 1
+		_last_run.clear()
+		_last_run.update(summary)
+
+
+def issuance_stats() -> Dict[str, Any]:
+	with _stats_lock:
+		return {"runs": _runs, "last_run": dict(_last_run) or None}
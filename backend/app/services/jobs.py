@@ -0,0 +1,252 @@
+import os
+import shutil
+import threading
+import time
+import uuid
+from typing import Any, BinaryIO, Callable, Dict
+
+from sqlalchemy import and_, or_, update
+from sqlmodel import Session, select
+
+from ..db.jobs import ImportJob
+from ..db.session import engine
+from .importer import IMPORT_BATCH_SIZE, iter_csv_import
+
+
+IMPORT_SPOOL_DIR = os.getenv("IMPORT_SPOOL_DIR", "./import_spool")
+IMPORT_JOB_POLL_SECONDS = float(os.getenv("IMPORT_JOB_POLL_SECONDS", "5"))
+IMPORT_JOB_LEASE_SECONDS = int(os.getenv("IMPORT_JOB_LEASE_SECONDS", "60"))
+
+FINAL_STATUSES = {"completed", "failed", "cancelled"}
+
+
+def _now_ms() -> int:
+	return int(time.time() * 1000)
+
+
+def submit_import_job(stream: BinaryIO, file_name: str | None, actor: str | None) -> ImportJob:
+	"""Spool the upload to local disk and queue it for the background worker."""
+	os.makedirs(IMPORT_SPOOL_DIR, exist_ok=True)
+	job_id = uuid.uuid4().hex
+	path = os.path.join(IMPORT_SPOOL_DIR, f"{job_id}.csv")
+	with open(path, "wb") as out:
+		shutil.copyfileobj(stream, out, length=1024 * 1024)
+	now = _now_ms()
+	job = ImportJob(id=job_id, status="queued", file_name=file_name, file_path=path, actor=actor, created_ms=now, updated_ms=now)
+	with Session(engine) as session:
+		session.add(job)
+		session.commit()
+		session.refresh(job)
+	import_worker.wake()
+	return job
+
+
+def cancel_import_job(job_id: str) -> ImportJob | None:
+	with Session(engine) as session:
+		job = session.get(ImportJob, job_id)
+		if job is None:
+			return None
+		if job.status == "queued":
+			job.status = "cancelled"
+			_remove_spool(job.file_path)
+		elif job.status == "running":
+			# The worker stops after its current batch commits
+			job.cancel_requested = True
+		job.updated_ms = _now_ms()
+		session.add(job)
+		session.commit()
+		session.refresh(job)
+		return job
+
+
+def _remove_spool(path: str) -> None:
+	try:
+		os.remove(path)
+	except OSError:
+		pass
+
+
+def _claim_next_job() -> ImportJob | None:
+	"""Atomically take the oldest queued job, or a running one whose lease expired (crashed worker)."""
+	now = _now_ms()
+	stale = now - IMPORT_JOB_LEASE_SECONDS * 1000
+	with Session(engine) as session:
+		candidates = session.exec(
+			select(ImportJob)
+			.where(or_(ImportJob.status == "queued", and_(ImportJob.status == "running", ImportJob.heartbeat_ms < stale)))
+			.order_by(ImportJob.created_ms)
+			.limit(5)
+		).all()
+		for job in candidates:
+			claimed = session.exec(
+				update(ImportJob)
+				.where(ImportJob.id == job.id, ImportJob.status == job.status, ImportJob.heartbeat_ms == job.heartbeat_ms)
+				.values(status="running", heartbeat_ms=now, updated_ms=now)
+			)
+			session.commit()
+			if claimed.rowcount == 1:
+				return session.get(ImportJob, job.id)
+	return None
+
+
+class _LeaseLost(Exception):
+	pass
+
+
+class _Lease:
+	"""A worker's claim on a running job, renewed from a timer thread while batches run.
+
+	Every write is conditional on heartbeat_ms still holding the value this
+	worker last wrote: a job whose lease expired and was claimed by another
+	worker matches no row, and this worker stops touching it.
+	"""
+
+	def __init__(self, job: ImportJob):
+		self.job_id = job.id
+		self.heartbeat_ms = job.heartbeat_ms
+		self.lost = False
+		self._lock = threading.Lock()
+		self._stop = threading.Event()
+		self._thread: threading.Thread | None = None
+
+	def renew(self, **values: Any) -> None:
+		"""Write heartbeat (and `values`) if the job is still ours, else raise _LeaseLost."""
+		with self._lock:
+			if self.lost:
+				raise _LeaseLost(self.job_id)
+			now = max(_now_ms(), self.heartbeat_ms + 1)
+			with Session(engine) as session:
+				result = session.exec(
+					update(ImportJob)
+					.where(ImportJob.id == self.job_id, ImportJob.heartbeat_ms == self.heartbeat_ms)
+					.values(heartbeat_ms=now, updated_ms=now, **values)
+				)
+				session.commit()
+			if result.rowcount != 1:
+				self.lost = True
+				raise _LeaseLost(self.job_id)
+			self.heartbeat_ms = now
+
+	def _beat(self) -> None:
+		while not self._stop.wait(IMPORT_JOB_LEASE_SECONDS / 3):
+			try:
+				self.renew()
+			except _LeaseLost:
+				return
+			except Exception:
+				# Transient database error: retry on the next beat, well within the lease
+				pass
+
+	def __enter__(self) -> "_Lease":
+		self._thread = threading.Thread(target=self._beat, name=f"import-lease-{self.job_id}", daemon=True)
+		self._thread.start()
+		return self
+
+	def __exit__(self, *exc: Any) -> None:
+		self._stop.set()
+		self._thread.join()
+
+
+def _checkpoint(lease: _Lease, **values: Any) -> bool:
+	"""Persist progress and renew the lease; returns True if cancellation was requested."""
+	lease.renew(**values)
+	with Session(engine) as session:
+		job = session.get(ImportJob, lease.job_id)
+		return bool(job and job.cancel_requested)
+
+
+def run_import_job(job: ImportJob, should_stop: Callable[[], bool] = lambda: False) -> None:
+	"""Import a claimed job from its checkpoint, committing progress after every batch."""
+	base_upserted, base_failed = job.upserted, job.failed
+	final_status = "completed"
+	with _Lease(job) as lease:
+		try:
+			with open(job.file_path, "rb") as f:
+				for progress in iter_csv_import(f, batch_size=IMPORT_BATCH_SIZE, start_row=job.rows_committed):
+					cancelled = _checkpoint(
+						lease,
+						rows_committed=progress["rows_read"],
+						upserted=base_upserted + progress["upserted"],
+						failed=base_failed + progress["rejected"],
+						rows_per_second=progress["rows_per_second"],
+					)
+					if cancelled:
+						final_status = "cancelled"
+						break
+					if should_stop():
+						# Shutting down: hand the job back so the next start resumes it right away
+						_checkpoint(lease, status="queued")
+						return
+			_checkpoint(lease, status=final_status)
+		except _LeaseLost:
+			# Another worker took the job over (this one stalled past the lease) and owns its spool file;
+			# the batch committed here is an idempotent upsert it repeats
+			return
+		except Exception as e:
+			try:
+				_checkpoint(lease, status="failed", error=str(e)[:500])
+			except _LeaseLost:
+				return
+	_remove_spool(job.file_path)
+
+
+class ImportWorker:
+	"""Single background thread that drains the import job table.
+
+	No external broker: jobs live in the database and spooled files on local
+	disk, so a restarted process picks up unfinished jobs from their last
+	committed batch once their lease expires.
+	"""
+
+	def __init__(self) -> None:
+		self._wake = threading.Event()
+		self._stop = threading.Event()
+		self._thread: threading.Thread | None = None
+
+	def start(self) -> None:
+		if self._thread is None:
+			self._stop.clear()
+			self._thread = threading.Thread(target=self._run, name="import-worker", daemon=True)
+			self._thread.start()
+
+	def stop(self, timeout: float = 10.0) -> None:
+		self._stop.set()
+		self._wake.set()
+		if self._thread is not None:
+			self._thread.join(timeout)
+			self._thread = None
+
+	def wake(self) -> None:
+		self._wake.set()
+
+	def _run(self) -> None:
+		while not self._stop.is_set():
+			job = None
+			try:
+				job = _claim_next_job()
+			except Exception:
+				pass
+			if job is None:
+				self._wake.wait(IMPORT_JOB_POLL_SECONDS)
+				self._wake.clear()
+				continue
+			run_import_job(job, should_stop=self._stop.is_set)
+
+
+import_worker = ImportWorker()
+
+
+def job_status(job: ImportJob) -> Dict[str, Any]:
+	return {
+		"job_id": job.id,
+		"status": job.status,
+		"file_name": job.file_name,
+		"created_ms": job.created_ms,
+		"updated_ms": job.updated_ms,
+		"processed": job.rows_committed,
+		"upserted": job.upserted,
+		"failed": job.failed,
+		"rows_per_second": job.rows_per_second,
+		"cancel_requested": job.cancel_requested,
+		"error": job.error,
+	}
@@ -0,0 +1,165 @@
+"""QR signing keys, read from a local keystore directory and kept parsed.
+
+Layout of QR_KEYSTORE_DIR (file stem = institution_id, `default` for
+institutions without their own key):
+
+	<institution_id>.key   HS256 shared secret (file contents, stripped)
+	<institution_id>.pem   RSA key for RS256: a private key signs and verifies,
+	                       a public key only verifies
+
+Keys are parsed once into python-jose key objects and reloaded when the
+directory changes (checked at most every QR_KEYSTORE_REFRESH_SECONDS). Each
+key is pinned to its own algorithm, so a token cannot pick HS256 with an RSA
+public key as the secret.
+
+If no key applies when a certificate is signed, a random `default.key` is
+written to the keystore (created exclusively, so worker processes agree on
+one). QR_SIGNING_KEY, when set, is used as the HS256 default instead.
+"""
+
+import os
+import secrets
+import threading
+import time
+from typing import Any, Dict, NamedTuple, Optional
+
+from jose import jwk
+from jose.constants import ALGORITHMS
+
+
+QR_KEYSTORE_DIR = os.getenv("QR_KEYSTORE_DIR", "./keys")
+QR_KEYSTORE_REFRESH_SECONDS = float(os.getenv("QR_KEYSTORE_REFRESH_SECONDS", "30"))
+# Optional HS256 default secret (deployments that already distribute one)
+QR_SIGNING_KEY = os.getenv("QR_SIGNING_KEY")
+DEFAULT_KEY = "default"
+
+
+class KeyEntry(NamedTuple):
+	name: str
+	algorithm: str
+	# Parsed jose keys; signer is None for public-only RSA keys
+	signer: Any
+	verifier: Any
+	# Distinguishes reloaded key material in verification cache keys
+	version: str
+
+
+def _hmac_entry(name: str, secret: str, version: str) -> KeyEntry:
+	key = jwk.construct(secret, ALGORITHMS.HS256)
+	return KeyEntry(name, ALGORITHMS.HS256, key, key, version)
+
+
+def _read_entry(path: str, name: str) -> Optional[KeyEntry]:
+	with open(path, "r", encoding="utf-8") as f:
+		text = f.read().strip()
+	if not text:
+		return None
+	version = f"{name}:{os.stat(path).st_mtime_ns}"
+	if path.endswith(".key"):
+		return _hmac_entry(name, text, version)
+	key = jwk.construct(text, ALGORITHMS.RS256)
+	if "PRIVATE KEY" in text:
+		return KeyEntry(name, ALGORITHMS.RS256, key, key.public_key(), version)
+	return KeyEntry(name, ALGORITHMS.RS256, None, key, version)
+
+
+class Keystore:
+	def __init__(self, directory: str = QR_KEYSTORE_DIR, fallback_secret: Optional[str] = QR_SIGNING_KEY):
+		self.directory = directory
+		self.fallback_secret = fallback_secret
+		self._lock = threading.Lock()
+		self._keys: Dict[str, KeyEntry] = {}
+		self._dir_mtime: Optional[int] = None
+		self._checked = 0.0
+		self.loads = 0
+		self.errors: Dict[str, str] = {}
+
+	def _dir_stamp(self) -> Optional[int]:
+		try:
+			return os.stat(self.directory).st_mtime_ns
+		except OSError:
+			return None
+
+	def _load(self) -> None:
+		keys: Dict[str, KeyEntry] = {}
+		errors: Dict[str, str] = {}
+		if self.fallback_secret:
+			keys[DEFAULT_KEY] = _hmac_entry(DEFAULT_KEY, self.fallback_secret, "env")
+		try:
+			names = sorted(os.listdir(self.directory))
+		except OSError:
+			names = []
+		for file_name in names:
+			stem, ext = os.path.splitext(file_name)
+			if ext not in (".key", ".pem"):
+				continue
+			try:
+				entry = _read_entry(os.path.join(self.directory, file_name), stem)
+			except Exception as e:
+				errors[file_name] = str(e)
+				continue
+			# The environment secret wins over a generated default.key
+			if entry and not (stem == DEFAULT_KEY and self.fallback_secret):
+				keys[stem] = entry
+		self._keys, self.errors = keys, errors
+		self.loads += 1
+
+	def _current(self) -> Dict[str, KeyEntry]:
+		now = time.monotonic()
+		if now - self._checked < QR_KEYSTORE_REFRESH_SECONDS and self.loads:
+			return self._keys
+		with self._lock:
+			if now - self._checked >= QR_KEYSTORE_REFRESH_SECONDS or not self.loads:
+				stamp = self._dir_stamp()
+				if stamp != self._dir_mtime or not self.loads:
+					self._load()
+					self._dir_mtime = stamp
+				self._checked = now
+		return self._keys
+
+	def reload(self) -> None:
+		with self._lock:
+			self._load()
+			self._dir_mtime = self._dir_stamp()
+			self._checked = time.monotonic()
+
+	def verification_key(self, institution_id: Optional[str]) -> Optional[KeyEntry]:
+		keys = self._current()
+		return (institution_id and keys.get(str(institution_id))) or keys.get(DEFAULT_KEY)
+
+	def signing_key(self, institution_id: Optional[str]) -> KeyEntry:
+		entry = self.verification_key(institution_id)
+		if entry is None:
+			entry = self._create_default()
+		if entry.signer is None:
+			raise LookupError(f"keystore has only a public key for '{entry.name}'")
+		return entry
+
+	def _create_default(self) -> KeyEntry:
+		os.makedirs(self.directory, exist_ok=True)
+		path = os.path.join(self.directory, f"{DEFAULT_KEY}.key")
+		tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+		fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+		with os.fdopen(fd, "w") as f:
+			f.write(secrets.token_urlsafe(48))
+		try:
+			# link() refuses to replace: the first worker's key wins and is never seen half-written
+			os.link(tmp, path)
+		except FileExistsError:
+			pass
+		finally:
+			os.unlink(tmp)
+		self.reload()
+		return self._keys[DEFAULT_KEY]
+
+	def stats(self) -> Dict[str, Any]:
+		keys = self._current()
+		return {
+			"directory": self.directory,
+			"keys": {name: entry.algorithm + ("" if entry.signer else " (verify only)") for name, entry in sorted(keys.items())},
+			"loads": self.loads,
+			"errors": dict(self.errors),
+		}
+
+
+keystore = Keystore()
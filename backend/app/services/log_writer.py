@@ -0,0 +1,134 @@
+import asyncio
+import os
+import time
+from typing import Any, Dict, List
+
+from sqlmodel import Session
+
+from ..db.logs import VerificationLog
+from ..db.session import engine
+from .metrics import LOG_DROPS, timed
+from .stats import record_verifications, rollup_lock
+
+
+LOG_BATCH_SIZE = int(os.getenv("LOG_BATCH_SIZE", "500"))
+LOG_FLUSH_INTERVAL_SECONDS = float(os.getenv("LOG_FLUSH_INTERVAL_SECONDS", "1.0"))
+LOG_QUEUE_MAXSIZE = int(os.getenv("LOG_QUEUE_MAXSIZE", "10000"))
+# Back-pressure: how long a request waits for queue space before its log entry is dropped.
+# Longer than a batch commit, so a full queue only drops entries when the database is stuck
+LOG_ENQUEUE_TIMEOUT_SECONDS = float(os.getenv("LOG_ENQUEUE_TIMEOUT_SECONDS", "1.0"))
+
+
+class VerificationLogWriter:
+	"""Buffers VerificationLog entries and writes them in batches on a background task.
+
+	A batch is flushed when it reaches `batch_size` entries or `interval` seconds
+	after its first entry, whichever comes first, so each commit (and fsync) is
+	shared by many verifications. Entries that cannot be queued or written are
+	counted in `dropped` (and verification_log_dropped_total) rather than
+	silently discarded.
+	"""
+
+	def __init__(self, batch_size: int, interval: float, maxsize: int, enqueue_timeout: float):
+		self.batch_size = batch_size
+		self.interval = interval
+		self.maxsize = maxsize
+		self.enqueue_timeout = enqueue_timeout
+		self._queue: asyncio.Queue | None = None
+		self._task: asyncio.Task | None = None
+		# Set on every put: the batch loop waits on it and takes items with get_nowait
+		self._wake: asyncio.Event | None = None
+		self.written = 0
+		self.dropped = 0
+		self.batches = 0
+		self.failed_batches = 0
+		self.last_error: str | None = None
+
+	async def start(self) -> None:
+		if self._task is None:
+			self._queue = asyncio.Queue(maxsize=self.maxsize)
+			self._wake = asyncio.Event()
+			self._task = asyncio.create_task(self._run(), name="verification-log-writer")
+
+	async def stop(self) -> None:
+		"""Flush everything still queued, then stop the background task."""
+		if self._task is None:
+			return
+		# Sentinel: the writer drains entries queued ahead of it, then exits
+		await self._queue.put(None)
+		self._wake.set()
+		await self._task
+		self._task = None
+		self._queue = None
+		self._wake = None
+
+	async def submit(self, log: VerificationLog) -> bool:
+		if self._queue is None:
+			# Writer not running (e.g. scripts/tests without the app lifespan): write through
+			await asyncio.to_thread(self._write_batch, [log])
+			return True
+		try:
+			await asyncio.wait_for(self._queue.put(log), timeout=self.enqueue_timeout)
+		except asyncio.TimeoutError:
+			self.dropped += 1
+			LOG_DROPS.labels("queue_full").inc()
+			return False
+		self._wake.set()
+		return True
+
+	def stats(self) -> Dict[str, Any]:
+		return {
+			"queued": self._queue.qsize() if self._queue is not None else 0,
+			"written": self.written,
+			"dropped": self.dropped,
+			"batches": self.batches,
+			"failed_batches": self.failed_batches,
+			"last_error": self.last_error,
+		}
+
+	async def _run(self) -> None:
+		stopping = False
+		while not stopping:
+			first = await self._queue.get()
+			if first is None:
+				break
+			batch = [first]
+			deadline = time.monotonic() + self.interval
+			while len(batch) < self.batch_size:
+				# Never cancel a pending queue.get() (wait_for can lose the item it already took on
+				# timeout); wait for a put instead, then take what is there without blocking
+				try:
+					item = self._queue.get_nowait()
+				except asyncio.QueueEmpty:
+					remaining = deadline - time.monotonic()
+					if remaining <= 0:
+						break
+					self._wake.clear()
+					try:
+						await asyncio.wait_for(self._wake.wait(), timeout=remaining)
+					except asyncio.TimeoutError:
+						break
+					continue
+				if item is None:
+					stopping = True
+					break
+				batch.append(item)
+			await asyncio.to_thread(self._write_batch, batch)
+
+	def _write_batch(self, batch: List[VerificationLog]) -> None:
+		try:
+			# One observation per batch: the commit is the request's deferred log cost
+			with timed("log_write"), rollup_lock, Session(engine) as session:
+				session.add_all(batch)
+				record_verifications(session, batch)
+				session.commit()
+			self.written += len(batch)
+			self.batches += 1
+		except Exception as e:
+			self.dropped += len(batch)
+			LOG_DROPS.labels("write_failed").inc(len(batch))
+			self.failed_batches += 1
+			self.last_error = str(e)[:500]
+
+
+log_writer = VerificationLogWriter(LOG_BATCH_SIZE, LOG_FLUSH_INTERVAL_SECONDS, LOG_QUEUE_MAXSIZE, LOG_ENQUEUE_TIMEOUT_SECONDS)
@@ -1,52 +1,342 @@
-from io import BytesIO
-from typing import Dict
-from fastapi import UploadFile
-from PIL import Image, ImageFilter
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Sequence, Tuple
 import pytesseract
 import cv2
 import numpy as np
+import itertools
+import os
+import queue
 import re
+import shlex
+import threading
+import time
 
+from . import pdf
+from .document import DocumentContext, shrink
+from .templates import layout_offset, template_store
+from .workers import WORKER_POOL_KIND, WORKER_POOL_SIZE
 
-def _preprocess_image_for_ocr(img: Image.Image) -> Image.Image:
-	# convert to grayscale, denoise, threshold
-	arr = np.array(img.convert("RGB"))
-	gray = cv2.cvtColor(arr, cv2.COLOR_RGB2GRAY)
-	gray = cv2.bilateralFilter(gray, 9, 75, 75)
-	thr = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 31, 10)
-	return Image.fromarray(thr)
+try:
+	import tesserocr
+except ImportError:  # optional: libtesseract bindings
+	tesserocr = None
 
 
-def _extract_text_from_image(img: Image.Image) -> str:
-	proc = _preprocess_image_for_ocr(img)
-	config = "--oem 3 --psm 6"
-	return pytesseract.image_to_string(proc, config=config)
+# "auto" uses in-process tesserocr engines when available, else the pytesseract subprocess path
+OCR_BACKEND = os.getenv("OCR_BACKEND", "auto")
+# Long-lived engines per process; process workers run one task at a time, thread workers share the pool
+OCR_ENGINE_POOL_SIZE = int(os.getenv("OCR_ENGINE_POOL_SIZE", "0")) or (WORKER_POOL_SIZE if WORKER_POOL_KIND == "thread" else 1)
+OCR_LANG = os.getenv("OCR_LANG", "eng")
+# tessdata directory for tesserocr (the tesseract CLI reads TESSDATA_PREFIX itself)
+OCR_TESSDATA_PATH = os.getenv("OCR_TESSDATA_PATH") or os.getenv("TESSDATA_PREFIX")
 
 
-def _pdf_to_images(_: bytes) -> list[Image.Image]:
-	# Disabled without PyMuPDF; return empty list
-	return []
+# Tesseract settings for region OCR; a layout profile's field entry may override psm/whitelist
+FIELD_OCR_DEFAULTS: Dict[str, Dict[str, Any]] = {
+	"candidate_name": {"psm": 7, "whitelist": "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz .'-"},
+	"roll_number": {"psm": 7, "whitelist": "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789-/"},
+	"certificate_id": {"psm": 7, "whitelist": "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789-"},
+	"course": {"psm": 7},
+}
+# Field boxes are grown by this fraction of the page on each side before cropping
+OCR_ROI_PADDING = float(os.getenv("OCR_ROI_PADDING", "0.005"))
+# Pages are resampled so the median glyph is about this many pixels tall (tesseract's sweet spot)
+OCR_TARGET_TEXT_HEIGHT = float(os.getenv("OCR_TARGET_TEXT_HEIGHT", "30"))
+OCR_MAX_UPSCALE = float(os.getenv("OCR_MAX_UPSCALE", "2.0"))
+# Estimated noise sigma: below SKIP no denoising, below BILATERAL a 3x3 Gaussian, else bilateral
+OCR_NOISE_SKIP = float(os.getenv("OCR_NOISE_SKIP", "2.0"))
+OCR_NOISE_BILATERAL = float(os.getenv("OCR_NOISE_BILATERAL", "8.0"))
+# Longest side of the thumbnail used to estimate text height
+_ANALYSIS_SIDE = 1024
+# Median glyph height of ~11 pt body text, in inches (for the effective-DPI estimate)
+_GLYPH_INCHES = 0.6 * 11 / 72
+_NOISE_KERNEL = np.array([[1, -2, 1], [-2, 4, -2], [1, -2, 1]], dtype=np.float32)
 
 
-async def extract_text_fields(file: UploadFile) -> Dict[str, str]:
-	"""OCR for images/PDF with naive parsing of fields.
+def _resize(gray: np.ndarray, scale: float) -> np.ndarray:
+	h, w = gray.shape
+	size = (max(1, int(round(w * scale))), max(1, int(round(h * scale))))
+	if scale >= 1:
+		return cv2.resize(gray, size, interpolation=cv2.INTER_CUBIC)
+	return shrink(gray, size)
+
+
+def _noise_sigma(gray: np.ndarray) -> float:
+	"""Immerkaer's fast noise estimate (sigma of additive Gaussian noise)."""
+	if min(gray.shape) < 3:
+		return 0.0
+	conv = cv2.filter2D(gray.astype(np.float32), -1, _NOISE_KERNEL, borderType=cv2.BORDER_REPLICATE)
+	return float(np.sqrt(np.pi / 2) * np.abs(conv[1:-1, 1:-1]).mean() / 6)
+
+
+def plan_preprocessing(gray: np.ndarray) -> Dict[str, Any]:
+	"""Decide resampling and denoising for a page from cheap measurements.
 
-	Falls back to filename heuristics if OCR fails.
+	Text height comes from connected components of an Otsu-binarized
+	thumbnail; noise from the Immerkaer estimate at the target resolution.
+	Already-binary pages (fax, digital PDFs) skip denoising and adaptive
+	thresholding altogether. The plan is reused for every crop of the page.
 	"""
-	content = await file.read()
-	await file.seek(0)
+	t0 = time.perf_counter()
+	h, w = gray.shape
+	factor = 1
+	while max(h, w) // (factor * 2) >= _ANALYSIS_SIDE:
+		factor *= 2
+	small = shrink(gray, (w // factor, h // factor)) if factor > 1 else gray
+	hist = cv2.calcHist([small], [0], None, [256], [0, 256]).ravel()
+	binary = float(hist[:8].sum() + hist[-8:].sum()) / small.size > 0.98
+
+	ink = cv2.threshold(small, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)[1]
+	_, _, comp, _ = cv2.connectedComponentsWithStats(ink, connectivity=8)
+	heights, widths, areas = comp[1:, cv2.CC_STAT_HEIGHT], comp[1:, cv2.CC_STAT_WIDTH], comp[1:, cv2.CC_STAT_AREA]
+	# Glyph-sized blobs only: no specks, rules, borders or photos
+	glyphs = (heights >= 2) & (areas >= 3) & (heights < small.shape[0] / 10) & (widths < small.shape[1] / 5)
+	text_height = float(np.median(heights[glyphs])) * factor if glyphs.any() else None
+
+	scale = 1.0
+	if text_height:
+		scale = min(OCR_TARGET_TEXT_HEIGHT / text_height, OCR_MAX_UPSCALE)
+		if 0.85 <= scale <= 1.15:
+			scale = 1.0
+	t1 = time.perf_counter()
+	noise = 0.0
+	if not binary:
+		# Measure noise where it will be filtered: a central patch at the target resolution
+		half = int(256 / scale) + 2
+		patch = gray[max(0, h // 2 - half) : h // 2 + half, max(0, w // 2 - half) : w // 2 + half]
+		noise = _noise_sigma(patch if scale == 1.0 else _resize(patch, scale))
+	if binary or noise < OCR_NOISE_SKIP:
+		denoise = "none"
+	elif noise < OCR_NOISE_BILATERAL:
+		denoise = "gaussian"
+	else:
+		denoise = "bilateral"
+	return {
+		"input": [int(w), int(h)],
+		"text_height": round(text_height, 1) if text_height else None,
+		"effective_dpi": int(text_height / _GLYPH_INCHES) if text_height else None,
+		"scale": round(scale, 4),
+		"binary": binary,
+		"noise_sigma": round(noise, 2),
+		"denoise": denoise,
+		"timings_ms": {"analyze": round((t1 - t0) * 1000, 3), "noise": round((time.perf_counter() - t1) * 1000, 3)},
+	}
+
+
+def _preprocess_image_for_ocr(gray: np.ndarray, plan: Dict[str, Any] | None = None) -> np.ndarray:
+	"""Resample, denoise and threshold per `plan` (computed from `gray` when not given).
+
+	Stage timings are added to plan["timings_ms"]. The input (the document's
+	shared grayscale view or a crop of it) is never modified.
+	"""
+	if plan is None:
+		plan = plan_preprocessing(gray)
+	timings = plan.setdefault("timings_ms", {})
+
+	def lap(stage: str, since: float) -> float:
+		now = time.perf_counter()
+		timings[stage] = round(timings.get(stage, 0.0) + (now - since) * 1000, 3)
+		return now
+
+	t = time.perf_counter()
+	img = gray if plan["scale"] == 1.0 else _resize(gray, plan["scale"])
+	t = lap("resample", t)
+	if plan["binary"]:
+		# Early exit: already black-and-white, resampling only blurred the edges
+		out = cv2.threshold(img, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
+		lap("threshold", t)
+		return out
+	if plan["denoise"] == "bilateral":
+		den = cv2.bilateralFilter(img, 9, 75, 75)
+	elif plan["denoise"] == "gaussian":
+		den = cv2.GaussianBlur(img, (3, 3), 0)
+	else:
+		den = img
+	t = lap("denoise", t)
+	# Threshold in place unless that would write into the caller's image
+	out = cv2.adaptiveThreshold(den, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 31, 10, dst=None if den is gray else den)
+	lap("threshold", t)
+	return out
+
+
+def _tesseract_config(psm: int = 6, whitelist: str | None = None) -> str:
+	config = f"--oem 3 --psm {int(psm)}"
+	if whitelist:
+		config += " -c " + shlex.quote(f"tessedit_char_whitelist={whitelist}")
+	return config
+
+
+class PytesseractBackend:
+	"""Runs the tesseract CLI per call (temp file, process start and model load each time)."""
+
+	name = "pytesseract"
+
+	def image_to_string(self, image: np.ndarray, psm: int = 6, whitelist: str | None = None) -> str:
+		return pytesseract.image_to_string(image, lang=OCR_LANG, config=_tesseract_config(psm, whitelist))
+
+	def stats(self) -> Dict[str, Any]:
+		return {"backend": self.name}
+
+
+class TesserocrBackend:
+	"""Pool of long-lived libtesseract engines fed in-memory 8-bit grayscale buffers.
+
+	Engines are created on demand up to `size` and reused; the language model
+	is loaded once per engine instead of once per page.
+	"""
+
+	name = "tesserocr"
+
+	def __init__(self, size: int = OCR_ENGINE_POOL_SIZE) -> None:
+		self.size = max(1, size)
+		self._idle: "queue.LifoQueue[Any]" = queue.LifoQueue()
+		self._lock = threading.Lock()
+		self._created = 0
+		self._calls = 0
+		# Create the first engine now so a missing tessdata/language fails at startup, not per page
+		with self._lock:
+			self._idle.put(self._new_engine())
+
+	def _new_engine(self) -> Any:
+		"""Create an engine and count it; the caller holds self._lock, so `size` is never exceeded."""
+		kwargs: Dict[str, Any] = {"lang": OCR_LANG, "oem": tesserocr.OEM.DEFAULT}
+		if OCR_TESSDATA_PATH:
+			kwargs["path"] = OCR_TESSDATA_PATH
+		engine = tesserocr.PyTessBaseAPI(**kwargs)
+		self._created += 1
+		return engine
+
+	@contextmanager
+	def _engine(self) -> Iterator[Any]:
+		try:
+			engine = self._idle.get_nowait()
+		except queue.Empty:
+			with self._lock:
+				engine = self._new_engine() if self._created < self.size else None
+			if engine is None:
+				engine = self._idle.get()
+		try:
+			yield engine
+		finally:
+			engine.Clear()
+			self._idle.put(engine)
+
+	def image_to_string(self, image: np.ndarray, psm: int = 6, whitelist: str | None = None) -> str:
+		image = np.ascontiguousarray(image, dtype=np.uint8)
+		h, w = image.shape[:2]
+		with self._engine() as engine:
+			engine.SetPageSegMode(psm)
+			# Variables persist on the engine; reset the whitelist on every call
+			engine.SetVariable("tessedit_char_whitelist", whitelist or "")
+			engine.SetImageBytes(image.tobytes(), w, h, 1, w)
+			with self._lock:
+				self._calls += 1
+			return engine.GetUTF8Text()
+
+	def stats(self) -> Dict[str, Any]:
+		return {"backend": self.name, "engines": self._created, "idle": self._idle.qsize(), "size": self.size, "calls": self._calls}
+
+
+_backend: Any = None
+_backend_lock = threading.Lock()
+
+
+def create_backend(kind: str = OCR_BACKEND, size: int | None = None) -> Any:
+	"""Build an OCR backend ("tesserocr", "pytesseract" or "auto"); `size` overrides the engine pool size."""
+	if kind in ("auto", "tesserocr"):
+		try:
+			if tesserocr is None:
+				raise RuntimeError("tesserocr is not installed")
+			return TesserocrBackend(size or OCR_ENGINE_POOL_SIZE)
+		except Exception:
+			if kind == "tesserocr":
+				raise
+	return PytesseractBackend()
 
-	text = ""
-	try:
-		if (file.filename or "").lower().endswith(".pdf"):
-			# PDF support disabled; rely on filename heuristics
-			text = ""
-		else:
-			img = Image.open(BytesIO(content))
-			text = _extract_text_from_image(img)
-	except Exception:
-		text = ""
 
+def get_backend() -> Any:
+	"""The process-wide OCR backend (created on first use, or by the worker initializer)."""
+	global _backend
+	if _backend is None:
+		with _backend_lock:
+			if _backend is None:
+				_backend = create_backend()
+	return _backend
+
+
+def _recognize(proc: np.ndarray, plan: Dict[str, Any] | None, psm: int = 6, whitelist: str | None = None) -> str:
+	"""Run the OCR engine, adding its time to plan["timings_ms"]["tesseract"]."""
+	t = time.perf_counter()
+	text = get_backend().image_to_string(proc, psm=psm, whitelist=whitelist)
+	if plan is not None:
+		timings = plan.setdefault("timings_ms", {})
+		timings["tesseract"] = round(timings.get("tesseract", 0.0) + (time.perf_counter() - t) * 1000, 3)
+	return text
+
+
+def _extract_text_from_image(gray: np.ndarray, plan: Dict[str, Any] | None = None) -> str:
+	proc = _preprocess_image_for_ocr(gray, plan)
+	return _recognize(proc, plan)
+
+
+def _ocr_region(
+	gray: np.ndarray, box: Sequence[float], offset: Tuple[float, float], settings: Dict[str, Any], plan: Dict[str, Any] | None = None
+) -> str:
+	"""OCR one field box (page fractions, shifted by the layout offset) of the page."""
+	h, w = gray.shape
+	dx, dy = offset
+	pad = OCR_ROI_PADDING
+	x0, x1 = int(max(0.0, box[0] + dx - pad) * w), int(min(1.0, box[2] + dx + pad) * w)
+	y0, y1 = int(max(0.0, box[1] + dy - pad) * h), int(min(1.0, box[3] + dy + pad) * h)
+	if x1 <= x0 or y1 <= y0:
+		return ""
+	proc = _preprocess_image_for_ocr(gray[y0:y1, x0:x1], plan)
+	return _recognize(proc, plan, psm=settings.get("psm", 7), whitelist=settings.get("whitelist"))
+
+
+def _clean_value(text: str) -> str:
+	# First non-empty line; drop a "Label:" prefix if the box caught it
+	for line in text.splitlines():
+		line = line.strip()
+		if line:
+			return line.split(":", 1)[-1].strip()[:128]
+	return ""
+
+
+def _extract_layout_fields(gray: np.ndarray, institution_id: str | None, plan: Dict[str, Any] | None = None) -> Tuple[Dict[str, str], bool]:
+	"""Region OCR on the institution's field boxes.
+
+	Returns (fields, complete). `complete` is False when there is no layout
+	profile, the page could not be aligned to it, or a field came back empty;
+	the caller then falls back to full-page OCR for the missing fields.
+	"""
+	entry = template_store.get(institution_id)
+	boxes = entry.layout.get("fields") if entry is not None else None
+	if not boxes:
+		return {}, False
+	offset = layout_offset(gray, entry)
+	if offset is None:
+		return {}, False
+	fields: Dict[str, str] = {}
+	for key, spec in boxes.items():
+		settings = {**FIELD_OCR_DEFAULTS.get(key, {"psm": 7}), **spec}
+		value = _clean_value(_ocr_region(gray, spec["box"], offset, settings, plan))
+		if value:
+			fields[key] = value
+	return fields, len(fields) == len(boxes)
+
+
+_FIELD_LABELS = {
+	"candidate_name": ["name", "candidate", "student name"],
+	"roll_number": ["roll", "roll no", "roll number"],
+	"certificate_id": ["certificate id", "certificate no", "cert id"],
+	"course": ["course", "program", "degree"],
+}
+_FIELD_KEYS = tuple(_FIELD_LABELS)
+
+
+def _parse_fields(text: str) -> Dict[str, str]:
+	"""Naive label/regex parsing of full-page OCR text."""
 	fields: Dict[str, str] = {}
 
 	def find_after(label: str) -> str | None:
@@ -58,14 +348,7 @@ async def extract_text_fields(file: UploadFile) -> Dict[str, str]:
 					return val[:128]
 		return None
 
-	fields_candidates = {
-		"candidate_name": ["name", "candidate", "student name"],
-		"roll_number": ["roll", "roll no", "roll number"],
-		"certificate_id": ["certificate id", "certificate no", "cert id"],
-		"course": ["course", "program", "degree"],
-	}
-
-	for key, labels in fields_candidates.items():
+	for key, labels in _FIELD_LABELS.items():
 		for label in labels:
 			val = find_after(label)
 			if val:
@@ -83,10 +366,74 @@ async def extract_text_fields(file: UploadFile) -> Dict[str, str]:
 			m = re.search(pat, text_flat, flags=re.IGNORECASE)
 			if m:
 				fields[k] = m.group(1)
+	return fields
+
+
+def _ocr_pdf(doc: DocumentContext, institution_id: str | None) -> Tuple[Dict[str, str], str, Dict[str, Any] | None]:
+	"""Fields of a PDF: text layer, then lazily rasterized pages for whatever is missing."""
+	text = ""
+	fields: Dict[str, str] = {}
+	for page_text in pdf.iter_page_text(doc.data):
+		text += page_text + "\n"
+		fields = _parse_fields(text)
+		if len(fields) == len(_FIELD_KEYS):
+			return fields, "pdf-text", None
+	mode = "pdf-text" if fields else "none"
+	plan: Dict[str, Any] | None = None
+	# Page 1 is already rasterized as the document image; later pages are rendered on demand
+	pages = itertools.chain([doc.gray] if doc.gray is not None else [], pdf.iter_page_images(doc.data, start=1))
+	for number, gray in enumerate(pages):
+		plan = plan_preprocessing(gray)
+		# Layout profiles describe page 1
+		found, complete = _extract_layout_fields(gray, institution_id, plan) if number == 0 else ({}, False)
+		if not complete:
+			found = {**_parse_fields(_extract_text_from_image(gray, plan)), **found}
+		# Text-layer values win over OCR
+		fields = {**found, **fields}
+		mode = "pdf-text+ocr" if mode.startswith("pdf-text") else "full"
+		if len(fields) == len(_FIELD_KEYS):
+			break
+	return fields, mode, plan
+
+
+def ocr_document(doc: DocumentContext, institution_id: str | None = None) -> Dict[str, Any]:
+	"""OCR for images/PDF with naive parsing of fields.
+
+	With a layout profile for the institution (see templates.py), only the
+	field boxes are OCR'd, each with its own page segmentation mode and
+	character whitelist; full-page OCR runs only when the page cannot be
+	aligned or a field is missing. Falls back to filename heuristics if OCR
+	fails. Blocking; runs on the worker pool.
+
+	PDFs are read from their text layer first; pages are rasterized and
+	OCR'd (one at a time, at most PDF_OCR_MAX_PAGES) only for fields the text
+	layer did not provide.
+
+	Returns {"fields": {...}, "mode": "layout" | "full" | "layout+full" | "pdf-text" | "pdf-text+ocr" |
+	"filename" | "none", "preprocess": plan with per-stage timings}.
+	"""
+	fields: Dict[str, str] = {}
+	mode = "none"
+	plan: Dict[str, Any] | None = None
+	try:
+		if doc.is_pdf:
+			if pdf.available():
+				fields, mode, plan = _ocr_pdf(doc, institution_id)
+		elif doc.gray is not None:
+			plan = plan_preprocessing(doc.gray)
+			fields, complete = _extract_layout_fields(doc.gray, institution_id, plan)
+			mode = "layout" if fields else "full"
+			if not complete:
+				# Region values win; the full page fills whatever they missed
+				mode = "layout+full" if fields else "full"
+				fields = {**_parse_fields(_extract_text_from_image(doc.gray, plan)), **fields}
+	except Exception:
+		pass
 
 	# Fallback to filename heuristics if still missing
 	if not fields:
-		name = (file.filename or "").rsplit("/", 1)[-1]
+		mode = "filename"
+		name = (doc.filename or "").rsplit("/", 1)[-1]
 		base = name.rsplit(".", 1)[0]
 		parts = [p for p in base.replace("-", " ").replace("_", " ").split(" ") if p]
 		if parts:
@@ -98,6 +445,4 @@ async def extract_text_fields(file: UploadFile) -> Dict[str, str]:
 		if len(parts) > 3:
 			fields["course"] = " ".join(parts[3:]).title()
 
-	return fields
-
-
+	return {"fields": fields, "mode": mode, "preprocess": plan}
@@ -0,0 +1,107 @@
+"""PDF access for verification: text layer first, pages rasterized lazily.
+
+Everything works from the raw upload bytes (documents are shipped to pool
+workers by pickling, so no open PyMuPDF handle is kept on them). Pages are
+rendered one at a time and dropped before the next, so memory is bounded by
+one page (or one QR crop) regardless of the page count.
+"""
+
+import os
+from typing import Iterator, List
+
+import numpy as np
+
+try:
+	import pymupdf
+except ImportError:  # optional: without PyMuPDF, PDFs fall back to filename heuristics
+	pymupdf = None
+
+
+# Resolution for OCR/anomaly rasterization and for QR crops (small codes need more pixels)
+PDF_RASTER_DPI = int(os.getenv("PDF_RASTER_DPI", "200"))
+PDF_QR_DPI = int(os.getenv("PDF_QR_DPI", "300"))
+# Pages read for the text layer, rasterized for OCR, and searched for QR codes
+PDF_MAX_PAGES = int(os.getenv("PDF_MAX_PAGES", "100"))
+PDF_OCR_MAX_PAGES = int(os.getenv("PDF_OCR_MAX_PAGES", "3"))
+PDF_QR_MAX_PAGES = int(os.getenv("PDF_QR_MAX_PAGES", "2"))
+# Rendering DPI is lowered for oversized pages so one page never exceeds this many pixels
+PDF_MAX_PAGE_PIXELS = int(os.getenv("PDF_MAX_PAGE_PIXELS", str(40_000_000)))
+# Embedded images this square (aspect ratio) and at least this many points wide are QR candidates
+_QR_ASPECT = (0.8, 1.25)
+_QR_MIN_POINTS = 36
+_QR_PAD_POINTS = 12
+
+
+def available() -> bool:
+	return pymupdf is not None
+
+
+def _open(data: bytes):
+	return pymupdf.open(stream=data, filetype="pdf")
+
+
+def _render(page, dpi: int, clip=None, color: bool = False) -> np.ndarray:
+	rect = clip if clip is not None else page.rect
+	# Never allocate more than PDF_MAX_PAGE_PIXELS for one render
+	pixels = (rect.width * dpi / 72) * (rect.height * dpi / 72)
+	if pixels > PDF_MAX_PAGE_PIXELS:
+		dpi = max(36, int(dpi * (PDF_MAX_PAGE_PIXELS / pixels) ** 0.5))
+	pix = page.get_pixmap(dpi=dpi, clip=clip, colorspace=pymupdf.csRGB if color else pymupdf.csGRAY, alpha=False)
+	arr = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.stride)[:, : pix.width * pix.n]
+	return arr.reshape(pix.height, pix.width, pix.n) if color else arr
+
+
+def page_count(data: bytes) -> int:
+	with _open(data) as pdf:
+		return pdf.page_count
+
+
+def first_page_rgb(data: bytes, dpi: int = PDF_RASTER_DPI) -> np.ndarray | None:
+	"""Page 1 as an RGB array (the document image used by anomaly/template checks)."""
+	if pymupdf is None:
+		return None
+	with _open(data) as pdf:
+		if pdf.page_count == 0:
+			return None
+		return _render(pdf[0], dpi, color=True)
+
+
+def iter_page_text(data: bytes, max_pages: int = PDF_MAX_PAGES) -> Iterator[str]:
+	"""Text layer of each page in order (empty strings for scanned pages)."""
+	with _open(data) as pdf:
+		for i in range(min(pdf.page_count, max_pages)):
+			yield pdf[i].get_text("text", sort=True)
+
+
+def iter_page_images(data: bytes, start: int = 0, max_pages: int = PDF_OCR_MAX_PAGES, dpi: int = PDF_RASTER_DPI) -> Iterator[np.ndarray]:
+	"""Grayscale rasters of pages [start, max_pages), rendered one at a time on demand."""
+	with _open(data) as pdf:
+		for i in range(start, min(pdf.page_count, max_pages)):
+			yield _render(pdf[i], dpi)
+
+
+def _qr_candidate_rects(page) -> List:
+	"""Rects of square-ish embedded images on the page, padded for the quiet zone."""
+	rects = []
+	for info in page.get_image_info():
+		rect = pymupdf.Rect(info["bbox"])
+		if rect.width < _QR_MIN_POINTS or rect.height < _QR_MIN_POINTS:
+			continue
+		if _QR_ASPECT[0] <= rect.width / rect.height <= _QR_ASPECT[1]:
+			rects.append((rect + (-_QR_PAD_POINTS, -_QR_PAD_POINTS, _QR_PAD_POINTS, _QR_PAD_POINTS)) & page.rect)
+	return rects
+
+
+def iter_qr_regions(data: bytes, max_pages: int = PDF_QR_MAX_PAGES) -> Iterator[np.ndarray]:
+	"""Grayscale crops where a QR code is likely, best guesses first.
+
+	Square embedded images are rendered at PDF_QR_DPI; the whole page (for
+	vector-drawn codes and scans) follows at PDF_RASTER_DPI only if the
+	caller is still looking.
+	"""
+	with _open(data) as pdf:
+		for i in range(min(pdf.page_count, max_pages)):
+			page = pdf[i]
+			for rect in _qr_candidate_rects(page):
+				yield _render(page, PDF_QR_DPI, clip=rect)
+			yield _render(page, PDF_RASTER_DPI)
@@ -0,0 +1,290 @@
+import os
+import threading
+import time
+from itertools import combinations
+from math import comb
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+from sqlmodel import Session, select
+
+from ..db.hashes import ImageHash
+from ..db.session import engine
+
+
+# Max differing bits (of 256) for two certificate images to count as near-duplicates.
+# Re-captures of one synthetic certificate (scan, fax, most phone photos) stay within
+# 20 bits; the same page with a template element (the seal) removed is 26+ bits away
+PHASH_MAX_DISTANCE = int(os.getenv("PHASH_MAX_DISTANCE", "20"))
+# A certificate's new hash is only stored when no stored hash of it is this close: re-scans
+# of one document land a few bits apart and would otherwise add a row each time
+PHASH_REMEMBER_DISTANCE = int(os.getenv("PHASH_REMEMBER_DISTANCE", "0")) or PHASH_MAX_DISTANCE // 2
+# How often a process picks up hashes inserted by other workers
+PHASH_REFRESH_SECONDS = float(os.getenv("PHASH_REFRESH_SECONDS", "30"))
+
+WORDS = 4  # 256 bits as 4 x uint64
+HASH_BITS = WORDS * 64
+# Unindexed inserts are scanned linearly until the tail reaches this size
+_TAIL_MIN = 4096
+_TAIL_MAX = 65536
+
+_POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def pack_bits(bits: np.ndarray) -> np.ndarray:
+	"""Pack a 16x16 (or 256) 0/1 hash into 4 uint64 words."""
+	return np.frombuffer(np.packbits(bits.astype(np.uint8).ravel()).tobytes(), dtype=">u8").astype(np.uint64)
+
+
+def hash_to_hex(words: np.ndarray) -> str:
+	return "".join(f"{int(w):016x}" for w in words)
+
+
+def hex_to_words(value: str) -> np.ndarray:
+	return np.array([int(value[i : i + 16], 16) for i in range(0, 64, 16)], dtype=np.uint64)
+
+
+def popcount(x: np.ndarray) -> np.ndarray:
+	"""Bit count per element of a uint64 array, summed over the last axis."""
+	if hasattr(np, "bitwise_count"):
+		return np.bitwise_count(x).sum(axis=-1, dtype=np.int64)
+	return _POPCOUNT8[x.view(np.uint8)].reshape(*x.shape[:-1], -1).sum(axis=-1, dtype=np.int64)
+
+
+def _substrings(words: np.ndarray, bits: int, m: int) -> np.ndarray:
+	"""(N, m) uint32 substrings of `bits` bits each, taken from the top of each 256-bit hash."""
+	out = np.empty((len(words), m), dtype=np.uint32)
+	weights = (np.uint32(1) << np.arange(bits - 1, -1, -1, dtype=np.uint32)).astype(np.uint32)
+	for start in range(0, len(words), 65536):
+		block = np.ascontiguousarray(words[start : start + 65536], dtype=">u8").view(np.uint8).reshape(-1, WORDS * 8)
+		bit_rows = np.unpackbits(block, axis=1)[:, : bits * m].reshape(-1, m, bits).astype(np.uint32)
+		out[start : start + len(block)] = bit_rows @ weights
+	return out
+
+
+def _choose_layout(n: int, max_distance: int) -> Tuple[int, int]:
+	"""Pick (substring bits, substring count) minimizing probes + expected candidates.
+
+	With m substrings, a hash within distance r matches some substring within
+	floor(r / m) bits (bits not covered by any substring only lower the distance).
+	"""
+	best: Tuple[float, int, int] | None = None
+	for bits in range(12, 25):
+		m = HASH_BITS // bits
+		probes = m * sum(comb(bits, k) for k in range(max_distance // m + 1))
+		cost = probes * (1 + n / 2**bits)
+		if best is None or cost < best[0]:
+			best = (cost, bits, m)
+	return best[1], best[2]
+
+
+_FLIP_CACHE: Dict[Tuple[int, int], np.ndarray] = {}
+
+
+def _flip_masks(bits: int, radius: int) -> np.ndarray:
+	"""All `bits`-wide XOR masks with at most `radius` bits set (the probes around a substring)."""
+	masks = _FLIP_CACHE.get((bits, radius))
+	if masks is None:
+		values = [0]
+		for r in range(1, radius + 1):
+			values.extend(sum(1 << b for b in chosen) for chosen in combinations(range(bits), r))
+		masks = _FLIP_CACHE[(bits, radius)] = np.array(values, dtype=np.uint32)
+	return masks
+
+
+class PHashIndex:
+	"""Multi-index hashing over 256-bit perceptual hashes packed as 4 x uint64.
+
+	Each hash is split into m substrings of b bits (b ~ log2 of the index size).
+	Two hashes within Hamming distance r agree within floor(r / m) bits on at
+	least one substring, so a query probes one sorted key table for the few
+	substring values within that radius and verifies the candidates with a
+	popcount. Recent inserts sit in a small linearly-scanned tail until the
+	table is rebuilt.
+	"""
+
+	def __init__(self, max_distance: int = PHASH_MAX_DISTANCE) -> None:
+		self.max_distance = max_distance
+		self._lock = threading.Lock()
+		self.words = np.zeros((0, WORDS), dtype=np.uint64)
+		self.meta: List[Tuple[str | None, str, str]] = []  # (institution_id, certificate_id, source)
+		self._indexed = 0
+		self._bits, self._m = 16, 16
+		# All substring tables in one array, sorted by key = (substring number << bits) | value
+		self._keys = np.zeros(0, dtype=np.uint32)
+		self._ids = np.zeros(0, dtype=np.int32)
+		self._pending: List[np.ndarray] = []
+
+	def __len__(self) -> int:
+		return len(self.meta)
+
+	def add_many(self, words: np.ndarray, meta: List[Tuple[str | None, str, str]], defer: bool = False) -> None:
+		"""Append hashes; `defer` skips re-indexing (call compact() after a bulk load)."""
+		with self._lock:
+			self._pending.append(np.asarray(words, dtype=np.uint64).reshape(-1, WORDS))
+			self.meta.extend(meta)
+			if not defer:
+				self._compact()
+
+	def add(self, words: np.ndarray, institution_id: str | None, certificate_id: str, source: str) -> None:
+		self.add_many(words, [(institution_id, certificate_id, source)])
+
+	def compact(self) -> None:
+		with self._lock:
+			self._compact()
+
+	def _compact(self) -> None:
+		if len(self.meta) - self._indexed >= min(_TAIL_MAX, max(_TAIL_MIN, self._indexed // 10)):
+			self._rebuild()
+
+	def _flush_pending(self) -> None:
+		if self._pending:
+			self.words = np.concatenate([self.words, *self._pending])
+			self._pending = []
+
+	def _rebuild(self) -> None:
+		self._flush_pending()
+		n = len(self.words)
+		bits, m = _choose_layout(n, self.max_distance)
+		keys = _substrings(self.words, bits, m)
+		keys |= np.arange(m, dtype=np.uint32) << np.uint32(bits)
+		keys = keys.T.ravel()
+		order = np.argsort(keys, kind="stable")
+		self._keys = keys[order]
+		self._ids = (order % n).astype(np.int32) if n else np.zeros(0, dtype=np.int32)
+		self._bits, self._m = bits, m
+		self._indexed = n
+
+	def query(self, words: np.ndarray, max_distance: int | None = None) -> List[Tuple[int, int]]:
+		"""Return [(row, distance)] for stored hashes within `max_distance` bits, nearest first."""
+		if max_distance is None:
+			max_distance = self.max_distance
+		words = np.asarray(words, dtype=np.uint64).reshape(1, WORDS)
+		with self._lock:
+			self._flush_pending()
+			candidates: List[np.ndarray] = []
+			if self._indexed:
+				bits, m = self._bits, self._m
+				q = _substrings(words, bits, m)[0] | (np.arange(m, dtype=np.uint32) << np.uint32(bits))
+				probes = (q[:, None] ^ _flip_masks(bits, max_distance // m)[None, :]).ravel()
+				lo = np.searchsorted(self._keys, probes, side="left")
+				lens = np.searchsorted(self._keys, probes, side="right") - lo
+				hit = lens > 0
+				lo, lens = lo[hit], lens[hit]
+				if len(lens):
+					# Expand the [lo, lo + len) ranges into one index array without a Python loop
+					starts = np.repeat(lo - np.cumsum(lens) + lens, lens)
+					candidates.append(self._ids[starts + np.arange(int(lens.sum()))].astype(np.int64))
+			# Tail not yet in the substring tables
+			candidates.append(np.arange(self._indexed, len(self.words), dtype=np.int64))
+			rows = np.unique(np.concatenate(candidates))
+			if not len(rows):
+				return []
+			dist = popcount(self.words[rows] ^ words)
+		keep = dist <= max_distance
+		order = np.argsort(dist[keep], kind="stable")
+		return [(int(r), int(d)) for r, d in zip(rows[keep][order], dist[keep][order])]
+
+	def linear_query(self, words: np.ndarray, max_distance: int | None = None) -> List[Tuple[int, int]]:
+		"""Brute-force reference (benchmarks): popcount against every stored hash."""
+		if max_distance is None:
+			max_distance = self.max_distance
+		with self._lock:
+			self._flush_pending()
+			dist = popcount(self.words ^ np.asarray(words, dtype=np.uint64).reshape(1, WORDS))
+		rows = np.nonzero(dist <= max_distance)[0]
+		order = np.argsort(dist[rows], kind="stable")
+		return [(int(r), int(dist[r])) for r in rows[order]]
+
+
+class PHashRegistry:
+	"""Process-local PHashIndex kept in sync with the ImageHash table."""
+
+	def __init__(self) -> None:
+		self.index = PHashIndex()
+		self._last_id = 0
+		self._last_refresh = 0.0
+		self._refresh_lock = threading.Lock()
+
+	def refresh(self, force: bool = False) -> None:
+		if not force and time.monotonic() - self._last_refresh < PHASH_REFRESH_SECONDS:
+			return
+		with self._refresh_lock:
+			loaded = False
+			with Session(engine) as session:
+				while True:
+					rows = session.exec(
+						select(ImageHash).where(ImageHash.id > self._last_id).order_by(ImageHash.id).limit(50_000)
+					).all()
+					if not rows:
+						break
+					self.index.add_many(
+						np.stack([hex_to_words(r.phash) for r in rows]),
+						[(r.institution_id, r.certificate_id, r.source) for r in rows],
+						defer=True,
+					)
+					loaded = True
+					self._last_id = rows[-1].id
+			if loaded:
+				self.index.compact()
+			self._last_refresh = time.monotonic()
+
+	def find_near_duplicates(self, phash_hex: str, max_distance: int = PHASH_MAX_DISTANCE) -> List[Dict[str, Any]]:
+		self.refresh()
+		out = []
+		for row, distance in self.index.query(hex_to_words(phash_hex), max_distance):
+			institution_id, certificate_id, source = self.index.meta[row]
+			out.append({"institution_id": institution_id, "certificate_id": certificate_id, "source": source, "distance": distance})
+		return out
+
+	def remember(self, phash_hex: str, institution_id: str | None, certificate_id: str, source: str) -> bool:
+		"""Store a hash for a certificate unless one within PHASH_REMEMBER_DISTANCE is already registered for it."""
+		for match in self.find_near_duplicates(phash_hex, max_distance=PHASH_REMEMBER_DISTANCE):
+			if match["certificate_id"] == certificate_id and match["institution_id"] == institution_id:
+				return False
+		with Session(engine) as session:
+			row = ImageHash(
+				phash=phash_hex,
+				institution_id=institution_id,
+				certificate_id=certificate_id,
+				source=source,
+				created_ms=int(time.time() * 1000),
+			)
+			session.add(row)
+			session.commit()
+			session.refresh(row)
+		with self._refresh_lock:
+			# Index directly when no other worker inserted in between; otherwise reload the gap
+			direct = row.id == self._last_id + 1
+			if direct:
+				self.index.add(hex_to_words(phash_hex), institution_id, certificate_id, source)
+				self._last_id = row.id
+		if not direct:
+			self.refresh(force=True)
+		return True
+
+
+phash_registry = PHashRegistry()
+
+
+def duplicate_warnings(phash_hex: str | None, certificate_id: Any, institution_id: str | None) -> List[str]:
+	"""Warn when the image nearly matches a certificate registered by a different institution.
+
+	A whole-page hash captures the layout, not the printed fields: certificates of
+	one institution share a template and are often only a few bits apart, so
+	matches within the same institution (or when it is unknown) say nothing.
+	"""
+	if not phash_hex or not institution_id:
+		return []
+	warnings = []
+	seen = set()
+	for match in phash_registry.find_near_duplicates(phash_hex):
+		key = (match["institution_id"], match["certificate_id"])
+		if not match["institution_id"] or match["institution_id"] == institution_id or key in seen:
+			continue
+		seen.add(key)
+		warnings.append(
+			f"Image nearly identical (pHash distance {match['distance']}) to certificate "
+			f"{match['certificate_id']} of institution {match['institution_id']}; possible duplicate or forgery"
+		)
+	return warnings
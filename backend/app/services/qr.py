@@ -1,37 +1,174 @@
-from typing import Dict
-from fastapi import UploadFile
+from typing import Any, Dict, Iterator, List, Tuple
 import cv2
 import json
+import os
+import threading
+import time
 import numpy as np
 
+from . import pdf
+from .document import DocumentContext, shrink
+from .ttl_cache import TTLCache
 
-def _decode_qr_from_image_bytes(data: bytes) -> Dict:
-	img_array = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
-	if img_array is None:
-		return {}
-	detector = cv2.QRCodeDetector()
-	val, points, straight_qrcode = detector.detectAndDecode(img_array)
-	if not val:
-		return {}
+
+# The first pass locates codes on the page shrunk to this longest side
+QR_FAST_SIDE = int(os.getenv("QR_FAST_SIDE", "1600"))
+# Corner regions are searched at up to this longest side (small codes need ~3 px per module)
+QR_REGION_MAX_SIDE = int(os.getenv("QR_REGION_MAX_SIDE", "2400"))
+QR_CACHE_SIZE = int(os.getenv("QR_CACHE_SIZE", "4096"))
+QR_CACHE_TTL_SECONDS = float(os.getenv("QR_CACHE_TTL_SECONDS", "3600"))
+
+# Where certificates usually place codes (page fractions x0, y0, x1, y1), most likely first;
+# the quadrants overlap so a code on a boundary is whole in at least one of them
+_REGIONS: List[Tuple[str, Tuple[float, float, float, float]]] = [
+	("bottom-right", (0.45, 0.45, 1.0, 1.0)),
+	("bottom-left", (0.0, 0.45, 0.55, 1.0)),
+	("top-right", (0.45, 0.0, 1.0, 0.55)),
+	("top-left", (0.0, 0.0, 0.55, 0.55)),
+]
+# Padding around a located code when re-decoding it at full resolution (fraction of its size)
+_QUAD_PAD = 0.25
+
+# Decoded QR results by document content hash (checked before dispatching to the pool)
+qr_cache = TTLCache(maxsize=QR_CACHE_SIZE, ttl=QR_CACHE_TTL_SECONDS, name="qr")
+_local = threading.local()
+
+
+def _detectors() -> Tuple[Any, cv2.QRCodeDetector]:
+	"""(locating detector, classic detector), one pair per worker thread/process, reused across calls.
+
+	The ArUco-based detector finds codes the classic one misses on busy
+	certificate pages; the classic one is kept as a second decoder.
+	"""
+	pair = getattr(_local, "detectors", None)
+	if pair is None:
+		classic = cv2.QRCodeDetector()
+		locating = cv2.QRCodeDetectorAruco() if hasattr(cv2, "QRCodeDetectorAruco") else classic
+		pair = _local.detectors = (locating, classic)
+	return pair
+
+
+def _parse(val: str) -> Dict:
 	try:
-		return json.loads(val)
+		parsed = json.loads(val)
 	except Exception:
 		return {"raw": val}
+	return parsed if isinstance(parsed, dict) else {"raw": val}
+
+
+def _decode_qr_from_image(img_array: np.ndarray) -> Dict:
+	val, points, straight_qrcode = _detectors()[1].detectAndDecode(img_array)
+	if not val:
+		return {}
+	return _parse(val)
+
+
+def _decode_qr_from_image_bytes(data: bytes) -> Dict:
+	img_array = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+	if img_array is None:
+		return {}
+	return _decode_qr_from_image(img_array)
+
+
+def _fit(img: np.ndarray, max_side: int) -> Tuple[np.ndarray, float]:
+	"""`img` shrunk to at most `max_side` pixels on its longest side, and the factor applied."""
+	h, w = img.shape[:2]
+	scale = max_side / float(max(h, w))
+	if scale >= 1:
+		return img, 1.0
+	return shrink(img, (max(1, int(w * scale)), max(1, int(h * scale)))), scale
+
+
+def _quad_crop(gray: np.ndarray, quad: np.ndarray, scale: float) -> np.ndarray:
+	"""Full-resolution crop around a quad found on a copy shrunk by `scale`."""
+	h, w = gray.shape
+	pts = quad.reshape(-1, 2) / scale
+	(x0, y0), (x1, y1) = pts.min(axis=0), pts.max(axis=0)
+	pad = _QUAD_PAD * max(x1 - x0, y1 - y0)
+	return gray[int(max(0, y0 - pad)) : int(min(h, y1 + pad)), int(max(0, x0 - pad)) : int(min(w, x1 + pad))]
+
+
+def _search(gray: np.ndarray, max_side: int) -> List[str]:
+	"""Decode all codes in `gray`, located on a copy of at most `max_side` pixels.
+
+	Codes located there but too small to read are decoded again from a
+	full-resolution crop of just that code.
+	"""
+	locating, classic = _detectors()
+	small, scale = _fit(gray, max_side)
+	ok, values, points, _ = locating.detectAndDecodeMulti(small)
+	if not ok:
+		return []
+	decoded = [v for v in values if v]
+	for val, quad in zip(values, points):
+		if val:
+			continue
+		crop = _quad_crop(gray, quad, scale)
+		if not crop.size:
+			continue
+		for detector in (locating, classic):
+			val = detector.detectAndDecode(crop)[0]
+			if val:
+				decoded.append(val)
+				break
+	return decoded
+
+
+def decode_qr_codes(gray: np.ndarray) -> Dict[str, Any]:
+	"""All QR payloads on a grayscale page, trying cheap passes first.
+
+	1. the whole page, located at up to QR_FAST_SIDE;
+	2. the corner quadrants (where certificates put codes), at up to QR_REGION_MAX_SIDE.
+	Stops at the first pass that decodes anything. Returns {"codes": [...], "stage"}.
+	"""
+	decoded = _search(gray, QR_FAST_SIDE)
+	if decoded:
+		return {"codes": decoded, "stage": "page"}
+	h, w = gray.shape
+	if max(h, w) > QR_FAST_SIDE:
+		for name, (fx0, fy0, fx1, fy1) in _REGIONS:
+			decoded = _search(gray[int(fy0 * h) : int(fy1 * h), int(fx0 * w) : int(fx1 * w)], QR_REGION_MAX_SIDE)
+			if decoded:
+				return {"codes": decoded, "stage": name}
+	return {"codes": [], "stage": None}
 
 
-async def decode_qr_from_file(file: UploadFile) -> Dict:
-	"""Decode QR/Barcode from image or first page of PDF if image-like.
-	Returns dict with parsed data or empty if none.
+def _pages(doc: DocumentContext) -> Iterator[np.ndarray]:
+	if doc.is_pdf:
+		# Square embedded images first, whole pages only if those fail (see pdf.iter_qr_regions)
+		if pdf.available():
+			yield from pdf.iter_qr_regions(doc.data)
+	elif doc.gray is not None:
+		yield doc.gray
+
+
+def scan_document_qr(doc: DocumentContext) -> Dict[str, Any]:
+	"""Decode every QR code of an image, or of the likely QR regions of a PDF.
+
+	Returns {"primary": payload dict or {}, "codes": [payload, ...], "stage", "elapsed_ms"}.
+	The primary payload is the first one carrying a certificate_id, else the first.
 	"""
-	bytes_data = await file.read()
-	await file.seek(0)
-	# Try direct image
+	started = time.perf_counter()
+	result: Dict[str, Any] = {"primary": {}, "codes": [], "stage": None, "elapsed_ms": 0.0}
 	try:
-		res = _decode_qr_from_image_bytes(bytes_data)
-		if res:
-			return res
+		for page in _pages(doc):
+			found = decode_qr_codes(page)
+			if found["codes"]:
+				codes = [_parse(v) for v in dict.fromkeys(found["codes"])]
+				result.update(codes=codes, stage=found["stage"])
+				result["primary"] = next((c for c in codes if c.get("certificate_id")), codes[0])
+				break
 	except Exception:
 		pass
-	return {}
+	result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 3)
+	return result
+
+
+def cached_scan(doc: DocumentContext) -> Dict[str, Any] | None:
+	"""The scan_qr result already cached for this upload, if any."""
+	return qr_cache.get(doc.content_hash)
 
 
+def remember_scan(doc: DocumentContext, result: Dict[str, Any]) -> None:
+	# The same file is often verified repeatedly (and under several institutions); decode it once
+	qr_cache.set(doc.content_hash, result)
@@ -0,0 +1,180 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from io import BytesIO
+from typing import Any, Dict, Tuple
+
+import numpy as np
+import qrcode
+from PIL import Image
+
+from .metrics import cache_counters
+
+
+# Verification page printed into every certificate QR code
+QR_VERIFY_BASE_URL = os.getenv("QR_VERIFY_BASE_URL", "http://localhost:8000/v").rstrip("/")
+QR_IMAGE_CACHE_SIZE = int(os.getenv("QR_IMAGE_CACHE_SIZE", "10000"))
+# Optional directory the rendered PNGs are also written to (survives restarts, shared by workers)
+QR_IMAGE_CACHE_DIR = os.getenv("QR_IMAGE_CACHE_DIR", "")
+QR_IMAGE_MAX_AGE_SECONDS = int(os.getenv("QR_IMAGE_MAX_AGE_SECONDS", "86400"))
+# Pixels per QR module, as qrcode.make draws them
+_BOX_SIZE = 10
+# Bumped whenever rendering changes, so ETags of differently drawn PNGs never collide
+_RENDER_VERSION = "2"
+
+_hit, _miss = cache_counters("qr_image")
+
+
+def certificate_payload(institution_id: str, certificate_id: str) -> Dict[str, Any]:
+	return {
+		"certificate_id": certificate_id,
+		"institution_id": institution_id,
+		"url": f"{QR_VERIFY_BASE_URL}/{certificate_id}",
+	}
+
+
+def payload_text(payload: Dict[str, Any]) -> str:
+	# Canonical JSON: what services/qr.py parses back, and stable input for the ETag
+	return json.dumps(payload, sort_keys=True, separators=(",", ":"))
+
+
+def payload_etag(text: str) -> str:
+	# The PNG is fully determined by the payload text, so the ETag is known without rendering
+	return '"' + hashlib.sha256(f"{_RENDER_VERSION}:{text}".encode()).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+	if not if_none_match:
+		return False
+	for tag in if_none_match.split(","):
+		tag = tag.strip()
+		if tag == "*" or tag.removeprefix("W/") == etag:
+			return True
+	return False
+
+
+def render_png(text: str) -> bytes:
+	"""1-bit PNG of `text` (same size and quiet zone as qrcode.make).
+
+	Uses a fixed mask pattern: scoring all eight masks is ~75% of qrcode's
+	encoding time, and any mask is valid (it only tunes module balance).
+	"""
+	code = qrcode.QRCode(mask_pattern=0)
+	code.add_data(text)
+	code.make(fit=True)
+	light = ~np.array(code.get_matrix(), dtype=bool)
+	buf = BytesIO()
+	Image.fromarray(light.repeat(_BOX_SIZE, axis=0).repeat(_BOX_SIZE, axis=1)).save(buf, format="PNG")
+	return buf.getvalue()
+
+
+class QRImageCache:
+	"""LRU of rendered QR PNGs keyed by ETag, optionally written through to a directory."""
+
+	def __init__(self, maxsize: int, directory: str = ""):
+		self.maxsize = maxsize
+		self.directory = directory
+		self._lock = threading.Lock()
+		self._data: "OrderedDict[str, bytes]" = OrderedDict()
+		self.hits = 0
+		self.disk_hits = 0
+		self.renders = 0
+		if directory:
+			os.makedirs(directory, exist_ok=True)
+
+	def _path(self, etag: str) -> str:
+		name = etag.strip('"')
+		return os.path.join(self.directory, name[:2], f"{name}.png")
+
+	def _read_disk(self, etag: str) -> bytes | None:
+		try:
+			with open(self._path(etag), "rb") as f:
+				return f.read()
+		except OSError:
+			return None
+
+	def _write_disk(self, etag: str, png: bytes) -> None:
+		path = self._path(etag)
+		os.makedirs(os.path.dirname(path), exist_ok=True)
+		tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+		with open(tmp, "wb") as f:
+			f.write(png)
+		os.replace(tmp, path)
+
+	def _remember(self, etag: str, png: bytes) -> None:
+		with self._lock:
+			self._data[etag] = png
+			self._data.move_to_end(etag)
+			while len(self._data) > self.maxsize:
+				self._data.popitem(last=False)
+
+	def get(self, text: str, etag: str | None = None, keep: bool = True) -> bytes:
+		"""PNG for `text`, rendered at most once; `keep=False` skips the in-memory LRU (bulk exports)."""
+		png, source = self.lookup(text, etag, keep)
+		self.count(source)
+		return png
+
+	def lookup(self, text: str, etag: str | None = None, keep: bool = True) -> Tuple[bytes, str]:
+		"""(PNG, "memory" | "disk" | "render") without counting; pool workers report sources to the parent."""
+		etag = etag or payload_etag(text)
+		with self._lock:
+			png = self._data.get(etag)
+			if png is not None:
+				self._data.move_to_end(etag)
+				return png, "memory"
+		png = self._read_disk(etag) if self.directory else None
+		source = "disk"
+		if png is None:
+			png = render_png(text)
+			source = "render"
+			if self.directory:
+				self._write_disk(etag, png)
+		if keep:
+			self._remember(etag, png)
+		return png, source
+
+	def count(self, source: str, n: int = 1) -> None:
+		with self._lock:
+			if source == "memory":
+				self.hits += n
+			elif source == "disk":
+				self.disk_hits += n
+			else:
+				self.renders += n
+		(_miss if source == "render" else _hit).inc(n)
+
+	def clear(self) -> None:
+		with self._lock:
+			self._data.clear()
+
+	def stats(self) -> Dict[str, Any]:
+		with self._lock:
+			return {
+				"entries": len(self._data),
+				"maxsize": self.maxsize,
+				"bytes": sum(len(v) for v in self._data.values()),
+				"hits": self.hits,
+				"disk_hits": self.disk_hits,
+				"renders": self.renders,
+				"directory": self.directory or None,
+			}
+
+
+qr_image_cache = QRImageCache(QR_IMAGE_CACHE_SIZE, QR_IMAGE_CACHE_DIR)
+
+
+def certificate_qr(institution_id: str, certificate_id: str, keep: bool = True) -> Tuple[str, bytes]:
+	"""(ETag, PNG) of the QR code printed on a certificate."""
+	text = payload_text(certificate_payload(institution_id, certificate_id))
+	etag = payload_etag(text)
+	return etag, qr_image_cache.get(text, etag, keep=keep)
+
+
+def archive_name(certificate_id: str) -> str:
+	"""Zip member name; ids changed by sanitizing get a hash suffix so "A/1" and "A_1" stay distinct."""
+	safe = "".join(c if c.isalnum() or c in "._-" else "_" for c in certificate_id)
+	if safe != certificate_id:
+		safe += "-" + hashlib.sha256(certificate_id.encode()).hexdigest()[:8]
+	return safe + ".png"
@@ -0,0 +1,608 @@
+"""Read-optimized in-memory snapshot of the certificate registry (optional).
+
+With REGISTRY_SNAPSHOT=1 validation looks records up here instead of in the
+database. The snapshot keeps:
+
+- array-backed columns (strings in one byte blob plus offsets, institutions
+  and courses as integer codes), a few dozen bytes per record;
+- hash indexes on certificate_id and roll_number (sorted 64-bit hashes, so a
+  lookup is one binary search);
+- distinct normalized names ("ALICE  SHARMA." and "Alice Sharma" both
+  normalize to "alice sharma") and, for approximate matching, an index from
+  their words to names plus a trigram index over the word vocabulary. A word
+  within k edits of a query word shares at least one of its 3k+1 rarest
+  trigrams, so only those postings are read; names containing a variant of
+  every query word are then checked with a banded edit distance.
+
+Records upserted through the API or imported in bulk go to a small delta
+(dict-indexed) that shadows the arrays; once it exceeds REGISTRY_DELTA_MAX
+the snapshot is rebuilt from the database. A background thread picks up new
+rows written by other processes every REGISTRY_REFRESH_SECONDS (by id) and
+rebuilds the snapshot every REGISTRY_REBUILD_SECONDS, which is when updates
+and deletes made elsewhere to existing rows are seen.
+"""
+
+import logging
+import os
+import threading
+import time
+import unicodedata
+from array import array
+from collections import defaultdict
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Set, Tuple
+
+import numpy as np
+from sqlmodel import Session, select
+
+from ..db.models import CertificateRecord
+from ..db.session import engine
+
+
+REGISTRY_SNAPSHOT = os.getenv("REGISTRY_SNAPSHOT", "0").lower() in ("1", "true", "yes")
+# Largest edit distance accepted between a read name and a registered one (further capped by length)
+REGISTRY_NAME_MAX_EDITS = int(os.getenv("REGISTRY_NAME_MAX_EDITS", "2"))
+REGISTRY_REFRESH_SECONDS = float(os.getenv("REGISTRY_REFRESH_SECONDS", "30"))
+REGISTRY_DELTA_MAX = int(os.getenv("REGISTRY_DELTA_MAX", "50000"))
+# Full rebuilds bound how stale rows updated by other processes can be (0 disables)
+REGISTRY_REBUILD_SECONDS = float(os.getenv("REGISTRY_REBUILD_SECONDS", "600"))
+_PAGE_SIZE = 50_000
+_PAD = "$"
+
+logger = logging.getLogger(__name__)
+
+
+class RegistryRecord(NamedTuple):
+	"""Registry row with the attributes validation reads from a CertificateRecord."""
+
+	id: int | None
+	institution_id: str
+	certificate_id: str
+	candidate_name: str
+	roll_number: str
+	course: str
+	year: int
+
+
+def normalize_name(name: Any) -> str:
+	"""Lowercase, accents and punctuation stripped, whitespace collapsed."""
+	text = unicodedata.normalize("NFKD", str(name or ""))
+	text = "".join(c if c.isalnum() else " " for c in text if not unicodedata.combining(c))
+	return " ".join(text.lower().split())
+
+
+def name_edit_budget(norm: str) -> int:
+	# One edit per five characters, so short names are not matched to unrelated short names
+	return min(REGISTRY_NAME_MAX_EDITS, len(norm) // 5)
+
+
+def _trigrams(norm: str) -> Set[str]:
+	padded = f"{_PAD}{_PAD}{norm}{_PAD}{_PAD}"
+	return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a: str, b: str, limit: int) -> int | None:
+	"""Levenshtein distance if it is at most `limit`, else None.
+
+	Bit-parallel (Hyyro 2003): one pass over `b` with integer operations on
+	bit vectors indexed by the characters of `a`.
+	"""
+	if a == b:
+		return 0
+	if abs(len(a) - len(b)) > limit:
+		return None
+	if not a:
+		return len(b)
+	peq: Dict[str, int] = {}
+	bit = 1
+	for c in a:
+		peq[c] = peq.get(c, 0) | bit
+		bit <<= 1
+	last = 1 << (len(a) - 1)
+	vp, vn, dist = (1 << len(a)) - 1, 0, len(a)
+	for c in b:
+		x = peq.get(c, 0)
+		d0 = (((x & vp) + vp) ^ vp) | x | vn
+		hp = vn | ~(d0 | vp)
+		hn = d0 & vp
+		if hp & last:
+			dist += 1
+		elif hn & last:
+			dist -= 1
+		hp = (hp << 1) | 1
+		vp = (hn << 1) | ~(d0 | hp)
+		vn = hp & d0
+	return dist if dist <= limit else None
+
+
+def _as_record(obj: Any) -> RegistryRecord:
+	get = obj.get if isinstance(obj, dict) else (lambda k: getattr(obj, k, None))
+	return RegistryRecord(
+		get("id"),
+		str(get("institution_id")),
+		str(get("certificate_id")),
+		str(get("candidate_name") or ""),
+		str(get("roll_number") or ""),
+		str(get("course") or ""),
+		int(get("year") or 0),
+	)
+
+
+class _Strings:
+	"""Immutable string column: UTF-8 in one blob plus an offsets array."""
+
+	def __init__(self, values: List[str]):
+		encoded = [v.encode() for v in values]
+		self.offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+		np.cumsum([len(e) for e in encoded], out=self.offsets[1:])
+		self.blob = b"".join(encoded)
+
+	def __getitem__(self, i: int) -> str:
+		return self.blob[self.offsets[i] : self.offsets[i + 1]].decode()
+
+	def nbytes(self) -> int:
+		return len(self.blob) + self.offsets.nbytes
+
+
+class _Codes:
+	"""Interned values (institutions, courses) stored as int32 codes."""
+
+	def __init__(self) -> None:
+		self.values: List[str] = []
+		self.index: Dict[str, int] = {}
+
+	def code(self, value: str) -> int:
+		c = self.index.get(value)
+		if c is None:
+			c = self.index[value] = len(self.values)
+			self.values.append(value)
+		return c
+
+
+def _hash_index(values: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+	hashes = np.fromiter((hash(v) for v in values), dtype=np.int64, count=len(values))
+	order = np.argsort(hashes, kind="stable").astype(np.int32)
+	return hashes[order], order
+
+
+def _csr(keys: np.ndarray, values: np.ndarray, n_keys: int) -> Tuple[np.ndarray, np.ndarray]:
+	"""Postings of `values` grouped by `keys`: (offsets, values sorted by key, ascending within a key)."""
+	order = np.lexsort((values, keys))
+	offsets = np.zeros(n_keys + 1, dtype=np.int64)
+	np.cumsum(np.bincount(keys, minlength=n_keys), out=offsets[1:])
+	return offsets, values[order].astype(np.int32)
+
+
+class _Vocabulary:
+	"""Distinct strings with exact (hash) and, optionally, approximate (trigram) lookup."""
+
+	def __init__(self, values: List[str], approximate: bool = True):
+		self.strings = _Strings(values)
+		self.lengths = np.fromiter((len(v) for v in values), dtype=np.int16, count=len(values))
+		self.hash, self.order = _hash_index(values)
+		self.trigrams: Dict[str, int] = {}
+		keys, ids = array("i"), array("i")
+		for i, value in enumerate(values if approximate else ()):
+			for tri in _trigrams(value):
+				tid = self.trigrams.get(tri)
+				if tid is None:
+					tid = self.trigrams[tri] = len(self.trigrams)
+				keys.append(tid)
+				ids.append(i)
+		self.tri_offsets, self.tri_ids = _csr(np.frombuffer(keys, dtype=np.int32), np.frombuffer(ids, dtype=np.int32), len(self.trigrams))
+
+	def __len__(self) -> int:
+		return len(self.lengths)
+
+	def find(self, value: str) -> int | None:
+		h = hash(value)
+		lo, hi = np.searchsorted(self.hash, h, "left"), np.searchsorted(self.hash, h, "right")
+		for i in self.order[lo:hi].tolist():
+			if self.strings[i] == value:
+				return i
+		return None
+
+	def _postings(self, tid: int) -> np.ndarray:
+		return self.tri_ids[self.tri_offsets[tid] : self.tri_offsets[tid + 1]]
+
+	def within(self, value: str, limit: int) -> List[Tuple[int, int]]:
+		"""(id, edits) of the strings within `limit` edits of `value`."""
+		exact = self.find(value)
+		found = {exact: 0} if exact is not None else {}
+		grams = _trigrams(value)
+		limit = min(limit, (len(grams) - 1) // 3)
+		if limit <= 0:
+			return list(found.items())
+		sized = sorted(
+			(int(self.tri_offsets[tid + 1] - self.tri_offsets[tid]), tid)
+			for tid in (self.trigrams.get(tri, -1) for tri in grams)
+			if tid >= 0
+		)
+		# Any string within k edits shares one of the query's 3k+1 rarest trigrams...
+		probes = [tid for _, tid in sized[: 3 * limit + 1 - (len(grams) - len(sized))]]
+		if not probes:
+			return list(found.items())
+		candidates = np.unique(np.concatenate([self._postings(t) for t in probes]))
+		candidates = candidates[np.abs(self.lengths[candidates].astype(np.int32) - len(value)) <= limit]
+		# ...and all but at most 3k of them
+		shared = np.zeros(len(candidates), dtype=np.int32)
+		for _, tid in sized:
+			postings = self._postings(tid)
+			pos = np.minimum(np.searchsorted(postings, candidates), len(postings) - 1)
+			shared += postings[pos] == candidates
+		for i in candidates[shared >= len(grams) - 3 * limit].tolist():
+			if i not in found:
+				d = edit_distance(value, self.strings[i], limit)
+				if d is not None:
+					found[i] = d
+		return list(found.items())
+
+	def nbytes(self) -> int:
+		return self.strings.nbytes() + self.lengths.nbytes + self.hash.nbytes + self.order.nbytes + self.tri_offsets.nbytes + self.tri_ids.nbytes
+
+
+class _Segment:
+	"""Immutable columnar registry built in one pass over the rows."""
+
+	def __init__(self, rows: Iterable[RegistryRecord], institutions: _Codes, courses: _Codes):
+		ids, inst, course, year, name_key = array("q"), array("i"), array("i"), array("i"), array("i")
+		certs: List[str] = []
+		rolls: List[str] = []
+		names: List[str] = []
+		norms: Dict[str, int] = {}
+		for r in rows:
+			ids.append(r.id or 0)
+			inst.append(institutions.code(r.institution_id))
+			course.append(courses.code(r.course))
+			year.append(r.year)
+			certs.append(r.certificate_id)
+			rolls.append(r.roll_number)
+			names.append(r.candidate_name)
+			norm = normalize_name(r.candidate_name)
+			nid = norms.get(norm)
+			if nid is None:
+				nid = norms[norm] = len(norms)
+			name_key.append(nid)
+		self.size = len(certs)
+		self.ids = np.frombuffer(ids, dtype=np.int64).copy()
+		self.inst = np.frombuffer(inst, dtype=np.int32).copy()
+		self.course = np.frombuffer(course, dtype=np.int32).copy()
+		self.year = np.frombuffer(year, dtype=np.int32).copy()
+		self.alive = np.ones(self.size, dtype=bool)
+		self.certs, self.rolls, self.names = _Strings(certs), _Strings(rolls), _Strings(names)
+		self.cert_hash, self.cert_order = _hash_index(certs)
+		self.roll_hash, self.roll_order = _hash_index(rolls)
+		del certs, rolls, names
+
+		# Distinct normalized names -> rows; their words -> names; approximate search runs over the
+		# word vocabulary, which stays small (given names and surnames repeat) as the registry grows
+		norm_list = list(norms)
+		del norms
+		self.norms = _Vocabulary(norm_list, approximate=False)
+		# Names with the spaces removed: OCR often drops the space between words
+		self.joined_hash, self.joined_order = _hash_index([n.replace(" ", "") for n in norm_list])
+		self.name_offsets, self.name_rows = _csr(np.frombuffer(name_key, dtype=np.int32), np.arange(self.size, dtype=np.int32), len(norm_list))
+		words: Dict[str, int] = {}
+		word_keys, word_names = array("i"), array("i")
+		for nid, norm in enumerate(norm_list):
+			for word in set(norm.split()):
+				wid = words.get(word)
+				if wid is None:
+					wid = words[word] = len(words)
+				word_keys.append(wid)
+				word_names.append(nid)
+		self.words = _Vocabulary(list(words))
+		self.word_offsets, self.word_names = _csr(
+			np.frombuffer(word_keys, dtype=np.int32), np.frombuffer(word_names, dtype=np.int32), len(words)
+		)
+		self.distinct_names = len(norm_list)
+		self.institutions, self.courses = institutions, courses
+
+	def record(self, row: int) -> RegistryRecord:
+		return RegistryRecord(
+			int(self.ids[row]) or None,
+			self.institutions.values[self.inst[row]],
+			self.certs[row],
+			self.names[row],
+			self.rolls[row],
+			self.courses.values[self.course[row]],
+			int(self.year[row]),
+		)
+
+	def _rows_for(self, hashes: np.ndarray, order: np.ndarray, column: _Strings, value: str) -> List[int]:
+		h = hash(value)
+		lo, hi = np.searchsorted(hashes, h, "left"), np.searchsorted(hashes, h, "right")
+		return [int(r) for r in order[lo:hi] if column[int(r)] == value]
+
+	def by_certificate(self, value: str) -> List[int]:
+		return self._rows_for(self.cert_hash, self.cert_order, self.certs, value)
+
+	def by_roll(self, value: str) -> List[int]:
+		return self._rows_for(self.roll_hash, self.roll_order, self.rolls, value)
+
+	def _match_words(self, norm: str, limit: int, word_limit: Any) -> Dict[int, int]:
+		"""Names within `limit` edits containing, for every query word, a variant within word_limit(word) edits."""
+		per_word = []
+		for word in dict.fromkeys(norm.split()):
+			variants = self.words.within(word, word_limit(word))
+			if not variants:
+				return {}
+			per_word.append(np.unique(np.concatenate([self.word_names[self.word_offsets[w] : self.word_offsets[w + 1]] for w, _ in variants])))
+		per_word.sort(key=len)
+		candidates = per_word[0]
+		for postings in per_word[1:]:
+			candidates = np.intersect1d(candidates, postings, assume_unique=True)
+		candidates = candidates[np.abs(self.norms.lengths[candidates].astype(np.int32) - len(norm)) <= limit]
+		found = {}
+		for nid in candidates.tolist():
+			d = edit_distance(norm, self.norms.strings[nid], limit)
+			if d is not None:
+				found[nid] = d
+		return found
+
+	def _match_joined(self, norm: str, limit: int) -> Dict[int, int]:
+		joined = norm.replace(" ", "")
+		h = hash(joined)
+		lo, hi = np.searchsorted(self.joined_hash, h, "left"), np.searchsorted(self.joined_hash, h, "right")
+		found = {}
+		for nid in self.joined_order[lo:hi].tolist():
+			name = self.norms.strings[nid]
+			if name.replace(" ", "") == joined:
+				d = edit_distance(norm, name, limit)
+				if d is not None:
+					found[nid] = d
+		return found
+
+	def names_within(self, norm: str, limit: int) -> List[Tuple[int, int]]:
+		"""(row, edits) for rows whose normalized name is within `limit` edits of `norm`.
+
+		Edits are found word by word: candidates must contain a near variant
+		of every query word and are then checked against the whole name.
+		Words run together are matched only when nothing else is changed.
+		"""
+		exact = self.norms.find(norm)
+		nids: Dict[int, int] = {exact: 0} if exact is not None else {}
+		if not nids and limit > 0:
+			# Short words first get at most one edit (with more, nearly every short word is a
+			# variant); only if that finds nothing may all edits fall in one word
+			nids = self._match_words(norm, limit, lambda word: min(limit, max(1, len(word) // 5)))
+			if not nids:
+				nids = self._match_words(norm, limit, lambda word: limit)
+			if not nids:
+				nids = self._match_joined(norm, limit)
+		out = []
+		for nid, d in nids.items():
+			out.extend((int(r), d) for r in self.name_rows[self.name_offsets[nid] : self.name_offsets[nid + 1]])
+		return out
+
+	def nbytes(self) -> int:
+		arrays = [
+			self.ids, self.inst, self.course, self.year, self.alive, self.cert_hash, self.cert_order,
+			self.roll_hash, self.roll_order, self.joined_hash, self.joined_order, self.name_offsets, self.name_rows, self.word_offsets, self.word_names,
+		]
+		return sum(a.nbytes for a in arrays) + self.certs.nbytes() + self.rolls.nbytes() + self.names.nbytes() + self.norms.nbytes() + self.words.nbytes()
+
+
+class _Delta:
+	"""Records changed since the segment was built, indexed with plain dicts."""
+
+	def __init__(self) -> None:
+		self.records: Dict[Tuple[str, str], RegistryRecord] = {}
+		self.by_certificate: Dict[str, Set[Tuple[str, str]]] = defaultdict(set)
+		self.by_roll: Dict[str, Set[Tuple[str, str]]] = defaultdict(set)
+		self.by_norm: Dict[str, Set[Tuple[str, str]]] = defaultdict(set)
+		self.by_trigram: Dict[str, Set[str]] = defaultdict(set)
+
+	def __len__(self) -> int:
+		return len(self.records)
+
+	def put(self, r: RegistryRecord) -> None:
+		key = (r.institution_id, r.certificate_id)
+		old = self.records.get(key)
+		if old is not None:
+			self.by_roll[old.roll_number].discard(key)
+			self.by_norm[normalize_name(old.candidate_name)].discard(key)
+		self.records[key] = r
+		self.by_certificate[r.certificate_id].add(key)
+		self.by_roll[r.roll_number].add(key)
+		norm = normalize_name(r.candidate_name)
+		self.by_norm[norm].add(key)
+		for tri in _trigrams(norm):
+			self.by_trigram[tri].add(norm)
+
+	def names_within(self, norm: str, limit: int) -> List[Tuple[RegistryRecord, int]]:
+		matches = {norm: 0} if self.by_norm.get(norm) else {}
+		if matches:
+			limit = 0
+		if limit > 0:
+			grams = _trigrams(norm)
+			limit = min(limit, (len(grams) - 1) // 3)
+		if limit > 0:
+			probes = sorted(grams, key=lambda t: len(self.by_trigram.get(t, ())))[: 3 * limit + 1]
+			for other in set().union(*(self.by_trigram.get(t, set()) for t in probes)):
+				if other not in matches:
+					d = edit_distance(norm, other, limit)
+					if d is not None:
+						matches[other] = d
+		return [(self.records[key], d) for other, d in matches.items() for key in self.by_norm.get(other, ())]
+
+
+class RegistrySnapshot:
+	def __init__(self) -> None:
+		self._segment: _Segment | None = None
+		self._delta = _Delta()
+		self._lock = threading.RLock()
+		self._build_lock = threading.Lock()
+		self._last_id = 0
+		self._built_at = 0.0
+		self._stop = threading.Event()
+		# Records applied while a rebuild reads the database, replayed onto the new segment
+		self._replay: List[RegistryRecord] | None = None
+		# Snapshots built from other rows (benchmarks) are not refreshed from the database
+		self._from_db = False
+		self.loaded_at_ms: int | None = None
+		self.build_seconds = 0.0
+		self.lookups = 0
+
+	@property
+	def ready(self) -> bool:
+		return self._segment is not None
+
+	def build(self, rows: Iterable[Any]) -> None:
+		"""Replace the snapshot with `rows` (CertificateRecord, dict or RegistryRecord)."""
+		started = time.perf_counter()
+		records = (_as_record(r) for r in rows)
+		segment = _Segment(records, _Codes(), _Codes())
+		with self._lock:
+			self._segment = segment
+			self._delta = _Delta()
+			self._last_id = int(segment.ids.max()) if segment.size else 0
+			self._built_at = time.monotonic()
+			self.loaded_at_ms = int(time.time() * 1000)
+			self.build_seconds = round(time.perf_counter() - started, 3)
+
+	def load(self) -> None:
+		"""(Re)build from the database; lookups keep using the old snapshot meanwhile."""
+		with self._build_lock:
+			with self._lock:
+				self._replay = []
+			try:
+				self.build(_iter_db_records())
+				self._from_db = True
+			finally:
+				with self._lock:
+					replay, self._replay = self._replay, None
+			self.apply(replay)
+
+	def refresh(self) -> None:
+		"""Pick up rows inserted (by any process) since the last load or refresh."""
+		if not self._from_db:
+			return
+		new = list(_iter_db_records(after_id=self._last_id))
+		if new:
+			self.apply(new)
+			with self._lock:
+				self._last_id = max(self._last_id, max(r.id or 0 for r in new))
+
+	def start(self) -> None:
+		"""Load in a background thread, which then keeps the snapshot current until stop()."""
+		self._stop.clear()
+		threading.Thread(target=self._run, name="registry-refresh", daemon=True).start()
+
+	def stop(self) -> None:
+		self._stop.set()
+
+	def _run(self) -> None:
+		# Database reads stay off the event loop: lookups only ever read the in-memory snapshot
+		try:
+			self.load()
+		except Exception:
+			logger.exception("Could not load the registry snapshot; validation keeps using the database")
+		while not self._stop.wait(REGISTRY_REFRESH_SECONDS):
+			try:
+				if not self.ready or (REGISTRY_REBUILD_SECONDS and time.monotonic() - self._built_at >= REGISTRY_REBUILD_SECONDS):
+					self.load()
+				else:
+					self.refresh()
+			except Exception:
+				logger.exception("Registry snapshot refresh failed")
+
+	def apply(self, rows: Iterable[Any]) -> None:
+		"""Upsert records (keyed on institution_id + certificate_id) into the snapshot."""
+		if not self.ready:
+			return
+		with self._lock:
+			segment = self._segment
+			for row in rows:
+				r = _as_record(row)
+				if self._replay is not None:
+					self._replay.append(r)
+				# Shadow the segment's copy of the record, if any
+				for i in segment.by_certificate(r.certificate_id):
+					if segment.institutions.values[segment.inst[i]] == r.institution_id:
+						segment.alive[i] = False
+				self._delta.put(r)
+			rebuild = len(self._delta) > REGISTRY_DELTA_MAX
+		if rebuild and not self._build_lock.locked():
+			threading.Thread(target=self.load, name="registry-rebuild", daemon=True).start()
+
+	def candidates(self, fields: Dict[str, Any], institution_id: str | None, limit: int) -> List[RegistryRecord]:
+		"""Records sharing the certificate_id, the roll_number or a near-identical name with `fields`."""
+		self.lookups += 1
+		institution_id = str(institution_id) if institution_id else None
+		with self._lock:
+			segment, delta = self._segment, self._delta
+			found: Dict[Tuple[str, str], RegistryRecord] = {}
+
+			def add(r: RegistryRecord) -> None:
+				if institution_id is None or r.institution_id == institution_id:
+					found.setdefault((r.institution_id, r.certificate_id), r)
+
+			def add_rows(rows: Iterable[int]) -> None:
+				taken = 0
+				for i in rows:
+					if taken >= limit:
+						break
+					if segment.alive[i] and (institution_id is None or segment.institutions.values[segment.inst[i]] == institution_id):
+						add(segment.record(i))
+						taken += 1
+
+			certificate_id, roll_number = fields.get("certificate_id"), fields.get("roll_number")
+			if certificate_id:
+				add_rows(segment.by_certificate(str(certificate_id)))
+				for key in delta.by_certificate.get(str(certificate_id), ()):
+					add(delta.records[key])
+			if roll_number:
+				add_rows(segment.by_roll(str(roll_number)))
+				for key in delta.by_roll.get(str(roll_number), ()):
+					add(delta.records[key])
+			norm = normalize_name(fields.get("candidate_name"))
+			if norm:
+				budget = name_edit_budget(norm)
+				matches = sorted(segment.names_within(norm, budget), key=lambda m: m[1])
+				add_rows(row for row, _ in matches)
+				for r, _ in delta.names_within(norm, budget)[:limit]:
+					add(r)
+			return list(found.values())
+
+	def stats(self) -> Dict[str, Any]:
+		with self._lock:
+			segment = self._segment
+			return {
+				"enabled": REGISTRY_SNAPSHOT,
+				"ready": segment is not None,
+				"records": int(segment.alive.sum()) + len(self._delta) if segment else 0,
+				"distinct_names": segment.distinct_names if segment else 0,
+				"delta": len(self._delta),
+				"memory_mb": round(segment.nbytes() / 1e6, 1) if segment else 0.0,
+				"build_seconds": self.build_seconds,
+				"loaded_at_ms": self.loaded_at_ms,
+				"lookups": self.lookups,
+			}
+
+
+def _iter_db_records(after_id: int = 0) -> Iterator[RegistryRecord]:
+	last_id = after_id
+	while True:
+		with Session(engine) as session:
+			rows = session.exec(
+				select(
+					CertificateRecord.id,
+					CertificateRecord.institution_id,
+					CertificateRecord.certificate_id,
+					CertificateRecord.candidate_name,
+					CertificateRecord.roll_number,
+					CertificateRecord.course,
+					CertificateRecord.year,
+				)
+				.where(CertificateRecord.id > last_id)
+				.order_by(CertificateRecord.id)
+				.limit(_PAGE_SIZE)
+			).all()
+		if not rows:
+			return
+		for row in rows:
+			yield RegistryRecord(*row)
+		last_id = rows[-1][0]
+
+
+registry = RegistrySnapshot()
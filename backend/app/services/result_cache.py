@@ -0,0 +1,147 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Set, Tuple
+
+from .metrics import cache_counters
+
+
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "2048"))
+RESULT_CACHE_TTL_SECONDS = int(os.getenv("RESULT_CACHE_TTL_SECONDS", "86400"))
+# Optional SQLite file backing the in-memory LRU (survives restarts, shared by workers)
+RESULT_CACHE_PATH = os.getenv("RESULT_CACHE_PATH", "")
+
+_hit, _miss = cache_counters("result")
+
+
+class ResultCache:
+	"""Cache of pipeline outputs (OCR fields, QR payload, anomaly warnings) per upload.
+
+	Keys are the SHA-256 of the upload bytes plus the institution_id. Entries
+	expire after `ttl` seconds, the in-memory layer is LRU-bounded to `maxsize`,
+	and entries are indexed by the certificate_id they extracted so registry
+	changes can invalidate them.
+	"""
+
+	def __init__(self, maxsize: int, ttl: int, path: str = ""):
+		self.maxsize = maxsize
+		self.ttl = ttl
+		self._lock = threading.Lock()
+		self._entries: "OrderedDict[str, Tuple[float, str | None, str | None, Dict[str, Any]]]" = OrderedDict()
+		self._by_certificate: Dict[str, Set[str]] = {}
+		self._db: sqlite3.Connection | None = None
+		self.hits = 0
+		self.misses = 0
+		self.invalidations = 0
+		self.seconds_saved = 0.0
+		if path:
+			self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+			self._db.execute("PRAGMA journal_mode=WAL")
+			self._db.execute(
+				"CREATE TABLE IF NOT EXISTS result_cache ("
+				"key TEXT PRIMARY KEY, expires_at REAL, institution_id TEXT, certificate_id TEXT, value TEXT)"
+			)
+			self._db.execute("CREATE INDEX IF NOT EXISTS ix_result_cache_certificate ON result_cache (certificate_id)")
+
+	@staticmethod
+	def key(content_hash: str, institution_id: str | None) -> str:
+		return f"{content_hash}:{institution_id or ''}"
+
+	def get(self, key: str) -> Dict[str, Any] | None:
+		now = time.time()
+		with self._lock:
+			entry = self._entries.get(key)
+			if entry is None and self._db is not None:
+				row = self._db.execute(
+					"SELECT expires_at, institution_id, certificate_id, value FROM result_cache WHERE key = ?", (key,)
+				).fetchone()
+				if row:
+					entry = (row[0], row[1], row[2], json.loads(row[3]))
+					self._store(key, entry)
+			if entry is None or entry[0] < now:
+				if entry is not None:
+					self._drop(key)
+				self.misses += 1
+				_miss.inc()
+				return None
+			self._entries.move_to_end(key)
+			self.hits += 1
+			_hit.inc()
+			value = entry[3]
+			self.seconds_saved += float(value.get("elapsed_seconds", 0.0))
+			return value
+
+	def put(self, key: str, value: Dict[str, Any], institution_id: str | None, certificate_id: str | None) -> None:
+		entry = (time.time() + self.ttl, institution_id, certificate_id, value)
+		with self._lock:
+			self._store(key, entry)
+			if self._db is not None:
+				self._db.execute(
+					"INSERT OR REPLACE INTO result_cache VALUES (?, ?, ?, ?, ?)",
+					(key, entry[0], institution_id, certificate_id, json.dumps(value)),
+				)
+
+	def invalidate_records(self, records: Iterable[Tuple[str, str]]) -> int:
+		"""Drop entries that extracted any of the given (institution_id, certificate_id) pairs."""
+		removed = 0
+		with self._lock:
+			for institution_id, certificate_id in records:
+				for key in list(self._by_certificate.get(certificate_id, ())):
+					if self._entries[key][1] in (None, "", institution_id):
+						self._drop(key)
+						removed += 1
+				if self._db is not None:
+					cur = self._db.execute(
+						"DELETE FROM result_cache WHERE certificate_id = ? AND (institution_id IS NULL OR institution_id IN ('', ?))",
+						(certificate_id, institution_id),
+					)
+					removed += max(cur.rowcount, 0)
+			self.invalidations += removed
+		return removed
+
+	def stats(self) -> Dict[str, Any]:
+		with self._lock:
+			lookups = self.hits + self.misses
+			return {
+				"entries": len(self._entries),
+				"maxsize": self.maxsize,
+				"hits": self.hits,
+				"misses": self.misses,
+				"hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+				"invalidations": self.invalidations,
+				"seconds_saved": round(self.seconds_saved, 3),
+				"persistent": self._db is not None,
+			}
+
+	def _store(self, key: str, entry: Tuple[float, str | None, str | None, Dict[str, Any]]) -> None:
+		if key in self._entries:
+			self._unindex(key)
+		self._entries[key] = entry
+		self._entries.move_to_end(key)
+		if entry[2]:
+			self._by_certificate.setdefault(entry[2], set()).add(key)
+		while len(self._entries) > self.maxsize:
+			old_key = next(iter(self._entries))
+			self._unindex(old_key)
+			del self._entries[old_key]
+
+	def _drop(self, key: str) -> None:
+		if key in self._entries:
+			self._unindex(key)
+			del self._entries[key]
+		if self._db is not None:
+			self._db.execute("DELETE FROM result_cache WHERE key = ?", (key,))
+
+	def _unindex(self, key: str) -> None:
+		certificate_id = self._entries[key][2]
+		keys = self._by_certificate.get(certificate_id or "")
+		if keys is not None:
+			keys.discard(key)
+			if not keys:
+				del self._by_certificate[certificate_id]
+
+
+result_cache = ResultCache(RESULT_CACHE_SIZE, RESULT_CACHE_TTL_SECONDS, RESULT_CACHE_PATH)
@@ -1,23 +1,74 @@
-from typing import Dict, Any
+import hashlib
+import os
+import time
+from typing import Dict, Any, Optional
 from jose import jwt, JWTError
+from jose.exceptions import JWTClaimsError
 
+from .keystore import KeyEntry, keystore
+from .ttl_cache import TTLCache
 
-def verify_jwt_signature(token: str, secret_or_public_key: str) -> Dict[str, Any]:
+
+# Verification results by (key version, token hash); a signed certificate is re-scanned many times
+QR_SIG_CACHE_SIZE = int(os.getenv("QR_SIG_CACHE_SIZE", "50000"))
+QR_SIG_CACHE_TTL_SECONDS = float(os.getenv("QR_SIG_CACHE_TTL_SECONDS", "3600"))
+
+sig_cache = TTLCache(maxsize=QR_SIG_CACHE_SIZE, ttl=QR_SIG_CACHE_TTL_SECONDS, name="qr_sig")
+
+
+def token_digest(token: str) -> bytes:
+	return hashlib.sha256(token.encode()).digest()
+
+
+def cache_ttl(payload: Dict[str, Any], ttl: float) -> float:
+	"""Entry lifetime for a verified token: never past its 'exp' claim."""
+	exp = payload.get("exp")
+	if isinstance(exp, (int, float)):
+		return min(ttl, exp - time.time())
+	return ttl
+
+
+def sign_payload(claims: Dict[str, Any], institution_id: Optional[str] = None) -> str:
+	"""JWT over the certificate claims, embedded as the QR payload's 'sig' field.
+
+	Signed with the institution's keystore key, or the default one.
+	"""
+	entry = keystore.signing_key(institution_id)
+	return jwt.encode(claims, entry.signer, algorithm=entry.algorithm)
+
+
+def verify_jwt_signature(token: str, entry: KeyEntry) -> Dict[str, Any]:
+	cache_key = (entry.version, token_digest(token))
+	cached = sig_cache.get(cache_key)
+	if cached is not None:
+		return cached
 	try:
-		payload = jwt.decode(token, secret_or_public_key, algorithms=["HS256", "RS256"])
-		return {"valid": True, "payload": payload}
-	except JWTError as e:
+		payload = jwt.decode(token, entry.verifier, algorithms=[entry.algorithm])
+		res = {"valid": True, "payload": payload}
+		ttl = cache_ttl(payload, sig_cache.ttl)
+		if ttl > 0:
+			sig_cache.set(cache_key, res, ttl)
+		return res
+	except JWTClaimsError as e:
+		# e.g. not valid yet (nbf): may pass later, so not cached
 		return {"valid": False, "error": str(e)}
+	except JWTError as e:
+		# A bad signature (or an expired token) stays bad for this key
+		res = {"valid": False, "error": str(e)}
+		sig_cache.set(cache_key, res)
+		return res
 
 
-def verify_embedded_signature(data: Dict[str, Any], secret_or_public_key: str) -> Dict[str, Any]:
+def verify_embedded_signature(data: Dict[str, Any], institution_id: Optional[str] = None) -> Dict[str, Any]:
 	"""If QR data includes a field 'sig' (JWT), verify it against the rest of fields.
 	Expected that the JWT contains claims matching critical fields.
+	The key is the keystore's for the payload's institution (or the default).
 	"""
 	sig = data.get("sig")
 	if not sig:
 		return {"checked": False}
-	res = verify_jwt_signature(sig, secret_or_public_key)
+	entry = keystore.verification_key(institution_id or data.get("institution_id"))
+	if entry is None:
+		return {"checked": True, "valid": False, "error": "no verification key"}
+	res = verify_jwt_signature(sig, entry)
 	return {"checked": True, **res}
-
-
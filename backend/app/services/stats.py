@@ -0,0 +1,134 @@
+import logging
+import threading
+from collections import Counter
+from datetime import date, datetime, timezone
+from typing import Any, Dict, Iterable, Tuple
+
+from sqlalchemy import func, text
+from sqlmodel import Session, select
+
+from ..db.logs import VerificationLog
+from ..db.models import CertificateRecord
+from ..db.rollups import VerificationRollup
+from ..db.session import engine
+
+
+logger = logging.getLogger(__name__)
+
+# Held around every rollup write (log batches and rebuilds), so a rebuild never deletes
+# counts a batch is adding or counts a batch's logs twice
+rollup_lock = threading.Lock()
+
+RollupKey = Tuple[str, str, bool, int]
+
+
+def _rollup_key(log: VerificationLog) -> RollupKey:
+	day = datetime.fromtimestamp(log.timestamp_ms / 1000, tz=timezone.utc).strftime("%Y-%m-%d")
+	bucket = min(9, max(0, int(float(log.score) * 10)))
+	return day, log.institution_id or "", bool(log.success), bucket
+
+
+def _upsert_rollups(session: Session, counts: Counter) -> None:
+	if not counts:
+		return
+	if session.get_bind().dialect.name == "postgresql":
+		from sqlalchemy.dialects.postgresql import insert
+	else:
+		from sqlalchemy.dialects.sqlite import insert
+	stmt = insert(VerificationRollup.__table__)
+	stmt = stmt.on_conflict_do_update(
+		index_elements=["day", "institution_id", "success", "score_bucket"],
+		set_={"count": VerificationRollup.__table__.c["count"] + stmt.excluded["count"]},
+	)
+	session.execute(
+		stmt,
+		[
+			{"day": d, "institution_id": inst, "success": ok, "score_bucket": b, "count": n}
+			# Sorted so concurrent writers lock rollup rows in the same order
+			for (d, inst, ok, b), n in sorted(counts.items())
+		],
+	)
+
+
+def record_verifications(session: Session, logs: Iterable[VerificationLog]) -> None:
+	"""Add logs to the rollup table in the caller's transaction (commit with the logs, holding rollup_lock)."""
+	_upsert_rollups(session, Counter(_rollup_key(log) for log in logs))
+
+
+def rebuild_rollups(session: Session, chunk_size: int = 10_000) -> int:
+	"""Recompute all rollups from VerificationLog (backfill after upgrades)."""
+	with rollup_lock:
+		if session.get_bind().dialect.name == "postgresql":
+			# Other processes' log writers wait for the rebuild to commit (SQLite locks the whole database)
+			session.execute(text(f"LOCK TABLE {VerificationRollup.__tablename__} IN SHARE ROW EXCLUSIVE MODE"))
+		session.execute(VerificationRollup.__table__.delete())
+		counts: Counter = Counter()
+		total = 0
+		stmt = select(VerificationLog.timestamp_ms, VerificationLog.institution_id, VerificationLog.success, VerificationLog.score)
+		for rows in session.execute(stmt.execution_options(yield_per=chunk_size)).partitions():
+			for ts, inst, ok, score in rows:
+				counts[_rollup_key(VerificationLog(timestamp_ms=ts, institution_id=inst, success=ok, score=score))] += 1
+			total += len(rows)
+		_upsert_rollups(session, counts)
+		session.commit()
+	return total
+
+
+def backfill_rollups() -> None:
+	"""Build the rollups from existing logs when the table is empty (first start after the upgrade)."""
+	with Session(engine) as session:
+		if session.exec(select(VerificationRollup.day).limit(1)).first() is not None:
+			return
+		if session.exec(select(VerificationLog.id).limit(1)).first() is None:
+			return
+		total = rebuild_rollups(session)
+	logger.info("Backfilled verification rollups from %d logged verifications", total)
+
+
+def verification_stats(
+	session: Session,
+	from_date: date | None = None,
+	to_date: date | None = None,
+	institution_id: str | None = None,
+) -> Dict[str, Any]:
+	"""Dashboard numbers from SQL aggregates over the rollup table and COUNT on the registry."""
+	R = VerificationRollup
+	conds = []
+	if from_date:
+		conds.append(R.day >= from_date.isoformat())
+	if to_date:
+		conds.append(R.day <= to_date.isoformat())
+	if institution_id is not None:
+		conds.append(R.institution_id == institution_id)
+
+	def grouped(col):
+		return session.exec(select(col, R.success, func.sum(R.count)).where(*conds).group_by(col, R.success)).all()
+
+	def split(rows) -> Dict[Any, Dict[str, int]]:
+		out: Dict[Any, Dict[str, int]] = {}
+		for key, ok, n in rows:
+			entry = out.setdefault(key, {"total": 0, "success": 0, "failure": 0})
+			entry["total"] += int(n)
+			entry["success" if ok else "failure"] += int(n)
+		return out
+
+	totals = {"total": 0, "success": 0, "failure": 0}
+	for ok, n in session.exec(select(R.success, func.sum(R.count)).where(*conds).group_by(R.success)).all():
+		totals["total"] += int(n)
+		totals["success" if ok else "failure"] += int(n)
+
+	histogram = [0] * 10
+	for bucket, n in session.exec(select(R.score_bucket, func.sum(R.count)).where(*conds).group_by(R.score_bucket)).all():
+		histogram[bucket] = int(n)
+
+	cert_stmt = select(func.count()).select_from(CertificateRecord)
+	if institution_id is not None:
+		cert_stmt = cert_stmt.where(CertificateRecord.institution_id == institution_id)
+
+	return {
+		"certificates": session.exec(cert_stmt).one(),
+		"verifications": totals,
+		"by_institution": split(grouped(R.institution_id)),
+		"by_day": split(grouped(R.day)),
+		"score_histogram": [{"min": i / 10, "max": (i + 1) / 10, "count": n} for i, n in enumerate(histogram)],
+	}
@@ -0,0 +1,273 @@
+"""Per-institution templates (seals, logos, layout anchors) and layout profiles.
+
+Each institution may have a directory TEMPLATE_DIR/<institution_id>/ holding a
+``layout.json`` and the template images it references::
+
+	{
+		"reference_width": 2480,
+		"templates": [
+			{"name": "seal", "file": "seal.png", "kind": "seal", "region": [0.70, 0.72, 0.97, 0.97], "min_score": 0.6},
+			{"name": "logo", "file": "logo.png", "kind": "anchor", "region": [0.40, 0.02, 0.60, 0.15], "box": [0.44, 0.03, 0.57, 0.10]}
+		],
+		"fields": {
+			"candidate_name": {"box": [0.20, 0.38, 0.80, 0.43]},
+			"roll_number": {"box": [0.20, 0.45, 0.50, 0.49], "psm": 7, "whitelist": "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789-/"}
+		}
+	}
+
+Regions are fractions (x0, y0, x1, y1) of the page; ``reference_width`` is the
+pixel width of the page the template crops were cut from. An anchor's ``box``
+is where its crop sits on the reference page; found anchors give the offset
+applied to the ``fields`` boxes used for region OCR (see ocr.py). Templates are
+converted to grayscale, rescaled to the matching resolution and turned into
+image pyramids once per process, then kept in memory; a changed layout.json is
+picked up on the next lookup.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, List, Tuple
+
+import cv2
+import numpy as np
+
+from .document import DocumentContext, shrink
+
+
+TEMPLATE_DIR = os.getenv("TEMPLATE_DIR", "templates")
+# Pages are matched at this width (pixels); template crops are rescaled to the same scale
+TEMPLATE_MATCH_WIDTH = int(os.getenv("TEMPLATE_MATCH_WIDTH", "1200"))
+# Pyramid levels below the matching resolution; the coarsest level is searched exhaustively
+TEMPLATE_PYRAMID_LEVELS = int(os.getenv("TEMPLATE_PYRAMID_LEVELS", "2"))
+# Relative template sizes tried at the coarse level (scans are rarely exactly to scale)
+TEMPLATE_SCALES = tuple(float(s) for s in os.getenv("TEMPLATE_SCALES", "0.9,1.0,1.1").split(",") if s.strip())
+# Expected regions are widened by this fraction of the page on each side
+TEMPLATE_REGION_MARGIN = float(os.getenv("TEMPLATE_REGION_MARGIN", "0.05"))
+DEFAULT_MIN_SCORE = 0.6
+# Pixels searched around the upsampled coarse hit at each finer level
+_REFINE_RADIUS = 4
+_MIN_TEMPLATE_SIDE = 8
+_INSTITUTION_ID = re.compile(r"^[A-Za-z0-9_.-]+$")
+
+
+class PreparedTemplate:
+	"""A template image preprocessed for coarse-to-fine matching.
+
+	``pyramids[i][level]`` is the grayscale template at TEMPLATE_SCALES[i],
+	downsampled ``level`` times from the matching resolution.
+	"""
+
+	def __init__(self, spec: Dict[str, Any], gray: np.ndarray, reference_width: int) -> None:
+		self.name = str(spec.get("name") or spec["file"])
+		self.kind = str(spec.get("kind", "seal"))
+		self.region = tuple(float(v) for v in spec.get("region", (0.0, 0.0, 1.0, 1.0)))
+		self.min_score = float(spec.get("min_score", DEFAULT_MIN_SCORE))
+		self.required = bool(spec.get("required", True))
+		self.box = tuple(float(v) for v in spec["box"]) if spec.get("box") else None
+		base = TEMPLATE_MATCH_WIDTH / float(reference_width)
+		self.scales: List[float] = []
+		self.pyramids: List[List[np.ndarray]] = []
+		for scale in TEMPLATE_SCALES:
+			w = int(round(gray.shape[1] * base * scale))
+			h = int(round(gray.shape[0] * base * scale))
+			if min(w, h) < _MIN_TEMPLATE_SIDE:
+				continue
+			interp = cv2.INTER_AREA if base * scale < 1 else cv2.INTER_LINEAR
+			levels = [cv2.resize(gray, (w, h), interpolation=interp)]
+			for _ in range(TEMPLATE_PYRAMID_LEVELS):
+				if min(levels[-1].shape) // 2 < _MIN_TEMPLATE_SIDE:
+					break
+				levels.append(cv2.pyrDown(levels[-1]))
+			self.scales.append(scale)
+			self.pyramids.append(levels)
+
+
+class InstitutionTemplates:
+	"""Layout profile and prepared templates of one institution."""
+
+	def __init__(self, institution_id: str, layout: Dict[str, Any], templates: List[PreparedTemplate], mtime: float) -> None:
+		self.institution_id = institution_id
+		self.layout = layout
+		self.templates = templates
+		self.mtime = mtime
+
+
+class TemplateStore:
+	"""Lazily loaded, in-memory cache of institution templates (one per process)."""
+
+	def __init__(self, root: str = TEMPLATE_DIR) -> None:
+		self.root = root
+		self._lock = threading.Lock()
+		self._cache: Dict[str, InstitutionTemplates] = {}
+
+	def _layout_path(self, institution_id: str | None) -> str | None:
+		if not institution_id or not _INSTITUTION_ID.match(institution_id) or institution_id.strip(".") == "":
+			return None
+		return os.path.join(self.root, institution_id, "layout.json")
+
+	def has(self, institution_id: str | None) -> bool:
+		path = self._layout_path(institution_id)
+		return path is not None and os.path.isfile(path)
+
+	def get(self, institution_id: str | None) -> InstitutionTemplates | None:
+		path = self._layout_path(institution_id)
+		if path is None:
+			return None
+		try:
+			mtime = os.stat(path).st_mtime
+		except OSError:
+			self._cache.pop(institution_id, None)
+			return None
+		entry = self._cache.get(institution_id)
+		if entry is not None and entry.mtime == mtime:
+			return entry
+		with self._lock:
+			entry = self._cache.get(institution_id)
+			if entry is None or entry.mtime != mtime:
+				entry = self._cache[institution_id] = self._load(institution_id, path, mtime)
+		return entry
+
+	def _load(self, institution_id: str, path: str, mtime: float) -> InstitutionTemplates:
+		with open(path, "r", encoding="utf-8") as fh:
+			layout = json.load(fh)
+		reference_width = int(layout.get("reference_width") or TEMPLATE_MATCH_WIDTH)
+		templates: List[PreparedTemplate] = []
+		for spec in layout.get("templates", []):
+			gray = cv2.imread(os.path.join(os.path.dirname(path), spec["file"]), cv2.IMREAD_GRAYSCALE)
+			if gray is None:
+				raise ValueError(f"Template image not readable: {institution_id}/{spec['file']}")
+			templates.append(PreparedTemplate(spec, gray, reference_width))
+		return InstitutionTemplates(institution_id, layout, templates, mtime)
+
+	def preload(self) -> int:
+		"""Prepare every institution under the template directory; returns how many loaded."""
+		loaded = 0
+		if not os.path.isdir(self.root):
+			return loaded
+		for name in sorted(os.listdir(self.root)):
+			try:
+				if self.get(name) is not None:
+					loaded += 1
+			except Exception:
+				# A broken profile only disables matching for that institution
+				continue
+		return loaded
+
+	def stats(self) -> Dict[str, Any]:
+		return {
+			"root": self.root,
+			"institutions": len(self._cache),
+			"templates": sum(len(entry.templates) for entry in self._cache.values()),
+		}
+
+
+template_store = TemplateStore()
+
+
+def _page_pyramid(gray: np.ndarray) -> List[np.ndarray]:
+	h, w = gray.shape
+	page = gray
+	if w != TEMPLATE_MATCH_WIDTH:
+		size = (TEMPLATE_MATCH_WIDTH, max(1, int(round(h * TEMPLATE_MATCH_WIDTH / w))))
+		page = shrink(gray, size) if w > TEMPLATE_MATCH_WIDTH else cv2.resize(gray, size, interpolation=cv2.INTER_LINEAR)
+	levels = [page]
+	for _ in range(TEMPLATE_PYRAMID_LEVELS):
+		levels.append(cv2.pyrDown(levels[-1]))
+	return levels
+
+
+def _best_in(image: np.ndarray, template: np.ndarray, x0: int, y0: int, x1: int, y1: int) -> Tuple[float, int, int]:
+	"""Best TM_CCOEFF_NORMED score of `template` with its top-left corner in [x0, x1) x [y0, y1)."""
+	th, tw = template.shape
+	x0, y0 = max(x0, 0), max(y0, 0)
+	x1, y1 = min(x1, image.shape[1] - tw + 1), min(y1, image.shape[0] - th + 1)
+	if x1 <= x0 or y1 <= y0:
+		return -1.0, x0, y0
+	res = cv2.matchTemplate(image[y0 : y1 + th - 1, x0 : x1 + tw - 1], template, cv2.TM_CCOEFF_NORMED)
+	_, score, _, loc = cv2.minMaxLoc(res)
+	return float(score), x0 + loc[0], y0 + loc[1]
+
+
+def _match(pages: List[np.ndarray], template: PreparedTemplate) -> Dict[str, Any]:
+	"""Coarse-to-fine search for one template inside its expected (widened) region."""
+	page_h, page_w = pages[0].shape
+	rx0, ry0, rx1, ry1 = template.region
+	m = TEMPLATE_REGION_MARGIN
+	best: Tuple[float, int, int, int, int] | None = None  # (score, scale index, x, y, level)
+	for i, levels in enumerate(template.pyramids):
+		level = min(len(levels), len(pages)) - 1
+		image, tmpl = pages[level], levels[level]
+		ih, iw = image.shape
+		score, x, y = _best_in(
+			image, tmpl, int((rx0 - m) * iw), int((ry0 - m) * ih), int((rx1 + m) * iw) - tmpl.shape[1] + 1, int((ry1 + m) * ih) - tmpl.shape[0] + 1
+		)
+		if best is None or score > best[0]:
+			best = (score, i, x, y, level)
+	if best is None:
+		return {"name": template.name, "kind": template.kind, "score": 0.0, "found": False, "box": None, "scale": None}
+	score, i, x, y, level = best
+	levels = template.pyramids[i]
+	# Refine: upsample the hit and search a small window at each finer level
+	while level > 0:
+		level -= 1
+		x, y = x * 2, y * 2
+		score, x, y = _best_in(pages[level], levels[level], x - _REFINE_RADIUS, y - _REFINE_RADIUS, x + _REFINE_RADIUS + 1, y + _REFINE_RADIUS + 1)
+	th, tw = levels[0].shape
+	return {
+		"name": template.name,
+		"kind": template.kind,
+		"score": round(score, 4),
+		"found": score >= template.min_score,
+		"box": [round(x / page_w, 4), round(y / page_h, 4), round((x + tw) / page_w, 4), round((y + th) / page_h, 4)],
+		"scale": template.scales[i],
+	}
+
+
+def match_document_templates(doc: DocumentContext, institution_id: str | None) -> Dict[str, Any]:
+	"""Match an institution's templates against the document; runs on the worker pool.
+
+	Returns {"institution_id", "matches": [...], "warnings": [...], "elapsed_ms"}.
+	Documents without an image or institutions without a layout yield no matches.
+	"""
+	started = time.perf_counter()
+	result: Dict[str, Any] = {"institution_id": institution_id, "matches": [], "warnings": [], "elapsed_ms": 0.0}
+	entry = template_store.get(institution_id)
+	gray = doc.gray
+	if entry is None or not entry.templates or gray is None:
+		return result
+	pages = _page_pyramid(gray)
+	for template in entry.templates:
+		if not template.pyramids:
+			continue
+		match = _match(pages, template)
+		result["matches"].append(match)
+		if template.required and not match["found"]:
+			result["warnings"].append(
+				f"Expected {template.kind} '{template.name}' not found in its usual position (score {match['score']:.2f}); possible forgery"
+			)
+	result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 3)
+	return result
+
+
+def layout_offset(gray: np.ndarray, entry: InstitutionTemplates) -> Tuple[float, float] | None:
+	"""Offset (dx, dy), in page fractions, of this page against the institution's reference layout.
+
+	Averaged over the anchors (templates with a ``box``) that were found.
+	Layouts without anchors are trusted as-is (0, 0); None means no anchor
+	was found, i.e. the page could not be aligned.
+	"""
+	anchors = [t for t in entry.templates if t.box is not None and t.pyramids]
+	if not anchors:
+		return 0.0, 0.0
+	pages = _page_pyramid(gray)
+	offsets = []
+	for template in anchors:
+		match = _match(pages, template)
+		if match["found"]:
+			offsets.append((match["box"][0] - template.box[0], match["box"][1] - template.box[1]))
+	if not offsets:
+		return None
+	return sum(dx for dx, _ in offsets) / len(offsets), sum(dy for _, dy in offsets) / len(offsets)
@@ -0,0 +1,64 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Tuple
+
+from .metrics import cache_counters
+
+
+class TTLCache:
+	"""Small thread-safe LRU cache whose entries expire after a per-entry TTL."""
+
+	def __init__(self, maxsize: int, ttl: float, name: str = ""):
+		self.maxsize = maxsize
+		self.ttl = ttl
+		self._lock = threading.Lock()
+		self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+		self.hits = 0
+		self.misses = 0
+		# Prometheus cache_lookups_total children for named caches
+		self._counters = cache_counters(name) if name else None
+
+	def get(self, key: Hashable, default: Any = None) -> Any:
+		with self._lock:
+			entry = self._data.get(key)
+			if entry is None or entry[0] < time.monotonic():
+				if entry is not None:
+					del self._data[key]
+				self.misses += 1
+				if self._counters:
+					self._counters[1].inc()
+				return default
+			self._data.move_to_end(key)
+			self.hits += 1
+			if self._counters:
+				self._counters[0].inc()
+			return entry[1]
+
+	def set(self, key: Hashable, value: Any, ttl: float | None = None) -> None:
+		expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+		with self._lock:
+			self._data[key] = (expires, value)
+			self._data.move_to_end(key)
+			while len(self._data) > self.maxsize:
+				self._data.popitem(last=False)
+
+	def pop(self, key: Hashable) -> Any:
+		with self._lock:
+			entry = self._data.pop(key, None)
+			return None if entry is None else entry[1]
+
+	def clear(self) -> None:
+		with self._lock:
+			self._data.clear()
+
+	def stats(self) -> Dict[str, Any]:
+		with self._lock:
+			lookups = self.hits + self.misses
+			return {
+				"entries": len(self._data),
+				"maxsize": self.maxsize,
+				"hits": self.hits,
+				"misses": self.misses,
+				"hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+			}
@@ -1,30 +1,104 @@
+import asyncio
 import os
-from typing import Tuple, Dict
-from urllib.parse import urlparse, parse_qs
+from typing import Any, Dict, Tuple
+from urllib.parse import urlparse
 import httpx
 
+from .ttl_cache import TTLCache
 
-async def validate_qr_url(url: str) -> Tuple[bool, Dict]:
+
+# Allowlist via env var QR_ALLOWED_DOMAINS (comma-separated), parsed once at startup
+QR_ALLOWED_DOMAINS = frozenset(
+	d.strip().lower()
+	for d in os.getenv("QR_ALLOWED_DOMAINS", "verify.jh.gov.in,example.edu,university.example").split(",")
+	if d.strip()
+)
+QR_URL_TIMEOUT_SECONDS = float(os.getenv("QR_URL_TIMEOUT_SECONDS", "5"))
+QR_URL_CACHE_SIZE = int(os.getenv("QR_URL_CACHE_SIZE", "4096"))
+QR_URL_CACHE_TTL_SECONDS = float(os.getenv("QR_URL_CACHE_TTL_SECONDS", "300"))
+# Failures (HTTP errors, timeouts) are retried sooner than successes
+QR_URL_NEGATIVE_TTL_SECONDS = float(os.getenv("QR_URL_NEGATIVE_TTL_SECONDS", "60"))
+QR_URL_MAX_CONNECTIONS = int(os.getenv("QR_URL_MAX_CONNECTIONS", "100"))
+
+url_cache = TTLCache(QR_URL_CACHE_SIZE, QR_URL_CACHE_TTL_SECONDS, name="qr_url")
+
+_client: httpx.AsyncClient | None = None
+_inflight: Dict[str, "asyncio.Future[Tuple[bool, Dict]]"] = {}
+
+
+def get_client() -> httpx.AsyncClient:
+	"""Application-lifetime client: pooled keep-alive connections reused across verifications."""
+	global _client
+	if _client is None:
+		_client = httpx.AsyncClient(
+			timeout=QR_URL_TIMEOUT_SECONDS,
+			limits=httpx.Limits(max_connections=QR_URL_MAX_CONNECTIONS, max_keepalive_connections=QR_URL_MAX_CONNECTIONS // 2),
+		)
+	return _client
+
+
+async def close_client() -> None:
+	global _client
+	if _client is not None:
+		await _client.aclose()
+		_client = None
+
+
+async def _fetch(url: str) -> Tuple[bool, Dict]:
+	try:
+		resp = await get_client().get(url)
+		if resp.status_code >= 400:
+			return False, {"reason": "http_error", "status": resp.status_code}
+		return True, {"status": "ok"}
+	except Exception as e:
+		return False, {"reason": "exception", "error": str(e)}
+
+
+async def _fetch_and_cache(url: str) -> Tuple[bool, Dict]:
+	result: Tuple[bool, Any] = await _fetch(url)
+	url_cache.set(url, result, ttl=None if result[0] else QR_URL_NEGATIVE_TTL_SECONDS)
+	return result
+
+
+async def validate_qr_url(url: str, fetch: bool = True) -> Tuple[bool, Dict]:
 	"""Validate QR URL by checking domain and optional fetch.
 
-	Returns (ok, details)
+	Returns (ok, details). Fetch outcomes are cached per URL and concurrent
+	checks of the same URL share one request. fetch=False checks the scheme
+	and domain only (offline verification).
 	"""
 	try:
 		o = urlparse(url)
 		if o.scheme not in {"http", "https"}:
 			return False, {"reason": "invalid_scheme"}
-		# Allowlist via env var QR_ALLOWED_DOMAINS (comma-separated)
-		allowed_env = os.getenv("QR_ALLOWED_DOMAINS", "verify.jh.gov.in,example.edu,university.example")
-		allowed = {d.strip() for d in allowed_env.split(",") if d.strip()}
-		if o.hostname and o.hostname not in allowed:
+		if o.hostname and o.hostname.lower() not in QR_ALLOWED_DOMAINS:
 			return False, {"reason": "untrusted_domain", "host": o.hostname}
-		# Optional: fetch URL head
-		async with httpx.AsyncClient(timeout=5) as client:
-			resp = await client.get(url)
-			if resp.status_code >= 400:
-				return False, {"reason": "http_error", "status": resp.status_code}
-		return True, {"status": "ok"}
 	except Exception as e:
 		return False, {"reason": "exception", "error": str(e)}
+	if not fetch:
+		return True, {"status": "not_fetched"}
 
+	cached = url_cache.get(url)
+	if cached is not None:
+		return cached
 
+	fut = _inflight.get(url)
+	if fut is not None:
+		try:
+			return await asyncio.shield(fut)
+		except asyncio.CancelledError:
+			task = asyncio.current_task()
+			if task is not None and task.cancelling():
+				raise
+			# The request that started the fetch was cancelled, not this one: fetch it ourselves
+			return await _fetch_and_cache(url)
+	fut = asyncio.get_running_loop().create_future()
+	_inflight[url] = fut
+	try:
+		result = await _fetch_and_cache(url)
+		fut.set_result(result)
+		return result
+	finally:
+		_inflight.pop(url, None)
+		if not fut.done():
+			fut.cancel()
@@ -1,7 +1,94 @@
+import os
 from typing import Dict, Any, List
+from sqlalchemy import func
 from sqlmodel import Session, select
 from ..db.models import CertificateRecord
 from ..db.session import engine
+from .registry import edit_distance, name_edit_budget, normalize_name, registry
+
+
+# Upper bound on rows fetched per lookup key; only rows sharing a key can score above zero
+CANDIDATE_LIMIT = int(os.getenv("VALIDATION_CANDIDATE_LIMIT", "50"))
+
+
+def name_edits(provided: Any, expected: Any) -> int | None:
+	"""Edits between two names after normalization (case, punctuation, spacing), None if too far apart."""
+	norm = normalize_name(provided)
+	if not norm:
+		return None
+	return edit_distance(norm, normalize_name(expected), name_edit_budget(norm))
+
+
+def score_match(r: CertificateRecord, fields: Dict[str, Any]) -> int:
+	s = 0
+	if fields.get("certificate_id") and r.certificate_id == fields.get("certificate_id"):
+		s += 3
+	if fields.get("roll_number") and r.roll_number == fields.get("roll_number"):
+		s += 2
+	if fields.get("candidate_name") and name_edits(fields["candidate_name"], r.candidate_name) is not None:
+		s += 1
+	return s
+
+
+def _candidate_records(session: Session, fields: Dict[str, Any], institution_id: str | None) -> List[CertificateRecord]:
+	"""Fetch the rows that can score above zero using indexed point lookups.
+
+	One query per available key (certificate_id, roll_number, lower(candidate_name)),
+	each bounded by CANDIDATE_LIMIT, so cost does not grow with the registry size.
+	"""
+	lookups = []
+	if fields.get("certificate_id"):
+		lookups.append(CertificateRecord.certificate_id == fields["certificate_id"])
+	if fields.get("roll_number"):
+		lookups.append(CertificateRecord.roll_number == fields["roll_number"])
+	if fields.get("candidate_name"):
+		lookups.append(func.lower(CertificateRecord.candidate_name) == str(fields["candidate_name"]).lower())
+
+	found: Dict[int, CertificateRecord] = {}
+	for cond in lookups:
+		stmt = select(CertificateRecord).where(cond)
+		if institution_id:
+			stmt = stmt.where(CertificateRecord.institution_id == institution_id)
+		stmt = stmt.order_by(CertificateRecord.id).limit(CANDIDATE_LIMIT)
+		for r in session.exec(stmt).all():
+			found.setdefault(r.id, r)
+	return [r for r in found.values() if score_match(r, fields) > 0]
+
+
+def _batch_candidate_records(
+	session: Session, fields_list: List[Dict[str, Any]], institution_id: str | None
+) -> List[CertificateRecord]:
+	"""Indexed IN queries covering every key extracted from a group of documents.
+
+	One query per key kind, each with its own bound (CANDIDATE_LIMIT per distinct
+	key), so rows sharing a common name cannot crowd out certificate_id or
+	roll_number matches.
+	"""
+	cert_ids = {f["certificate_id"] for f in fields_list if f.get("certificate_id")}
+	rolls = {f["roll_number"] for f in fields_list if f.get("roll_number")}
+	names = {str(f["candidate_name"]).lower() for f in fields_list if f.get("candidate_name")}
+	lookups = []
+	if cert_ids:
+		lookups.append((CertificateRecord.certificate_id.in_(cert_ids), len(cert_ids)))
+	if rolls:
+		lookups.append((CertificateRecord.roll_number.in_(rolls), len(rolls)))
+	if names:
+		lookups.append((func.lower(CertificateRecord.candidate_name).in_(names), len(names)))
+
+	found: Dict[int, CertificateRecord] = {}
+	for cond, keys in lookups:
+		stmt = select(CertificateRecord).where(cond)
+		if institution_id:
+			stmt = stmt.where(CertificateRecord.institution_id == institution_id)
+		stmt = stmt.order_by(CertificateRecord.id).limit(CANDIDATE_LIMIT * keys)
+		for r in session.exec(stmt).all():
+			found.setdefault(r.id, r)
+	return list(found.values())
+
+
+def _best_match(records: List[CertificateRecord], fields: Dict[str, Any]) -> CertificateRecord | None:
+	scored = [r for r in records if score_match(r, fields) > 0]
+	return max(scored, key=lambda r: (score_match(r, fields), -(r.id or 0))) if scored else None
 
 
 async def validate_certificate_data(fields: Dict[str, Any], institution_id: str | None) -> Dict[str, Any]:
@@ -10,28 +97,27 @@ async def validate_certificate_data(fields: Dict[str, Any], institution_id: str
 	Placeholder for DB/ledger checks, signature validation, format checks,
 	and anomaly detection.
 	"""
-	matched_fields: Dict[str, Any] = {}
-	mismatched_fields: Dict[str, Any] = {}
-	warnings: List[str] = []
-
+	if registry.ready:
+		return _evaluate(fields, _best_match(registry.candidates(fields, institution_id, CANDIDATE_LIMIT), fields))
 	with Session(engine) as session:
-		stmt = select(CertificateRecord)
-		if institution_id:
-			stmt = stmt.where(CertificateRecord.institution_id == institution_id)
+		best = _best_match(_candidate_records(session, fields, institution_id), fields)
+	return _evaluate(fields, best)
 
-		records = session.exec(stmt).all()
 
-		def score_match(r: CertificateRecord) -> int:
-			s = 0
-			if fields.get("certificate_id") and r.certificate_id == fields.get("certificate_id"):
-				s += 3
-			if fields.get("roll_number") and r.roll_number == fields.get("roll_number"):
-				s += 2
-			if fields.get("candidate_name") and r.candidate_name.lower() == fields.get("candidate_name", "").lower():
-				s += 1
-			return s
+async def validate_many(fields_list: List[Dict[str, Any]], institution_id: str | None) -> List[Dict[str, Any]]:
+	"""Validate several documents' fields with a single registry query (batch verification)."""
+	if registry.ready:
+		return [_evaluate(f, _best_match(registry.candidates(f, institution_id, CANDIDATE_LIMIT), f)) for f in fields_list]
+	with Session(engine) as session:
+		records = _batch_candidate_records(session, fields_list, institution_id)
+	return [_evaluate(fields, _best_match(records, fields)) for fields in fields_list]
+
 
-		best = max(records, key=score_match) if records else None
+def _evaluate(fields: Dict[str, Any], best: CertificateRecord | None) -> Dict[str, Any]:
+	matched_fields: Dict[str, Any] = {}
+	mismatched_fields: Dict[str, Any] = {}
+	warnings: List[str] = []
+	approximate_name = False
 
 	if not best:
 		return {
@@ -48,13 +134,23 @@ async def validate_certificate_data(fields: Dict[str, Any], institution_id: str
 			expected = getattr(best, key, None)
 			if expected is not None and str(fields[key]).lower() == str(expected).lower():
 				matched_fields[key] = fields[key]
+			elif key == "candidate_name" and expected is not None and name_edits(fields[key], expected) is not None:
+				# OCR'd names differ in case, spacing, punctuation or a misread character or two
+				matched_fields[key] = fields[key]
+				edits = name_edits(fields[key], expected)
+				approximate_name = bool(edits)
+				if edits:
+					warnings.append(f"candidate_name matched '{expected}' approximately ({edits} edit{'s' if edits > 1 else ''})")
 			else:
 				mismatched_fields[key] = {"provided": fields[key], "expected": expected}
 
 	confidence = 0.45 + 0.15 * len(matched_fields) - 0.1 * len(mismatched_fields)
 	confidence = max(0.0, min(0.99, confidence))
 
-	is_valid = bool(matched_fields) and not ("certificate_id" in mismatched_fields)
+	# An approximate name only supports a record already identified by its certificate_id or roll_number
+	identified = "certificate_id" in matched_fields or "roll_number" in matched_fields
+	supporting = [k for k in matched_fields if not (k == "candidate_name" and approximate_name and not identified)]
+	is_valid = bool(supporting) and not ("certificate_id" in mismatched_fields)
 	message = "Certificate appears valid" if is_valid else "Potential forgery or data mismatch"
 
 	return {
@@ -0,0 +1,178 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Iterable, Iterator, TypeVar
+
+from fastapi import HTTPException
+
+from .metrics import POOL_QUEUE_DEPTH, POOL_REJECTIONS
+
+
+# "process" (default) isolates CPU-bound OCR/CV work from the event loop and the GIL;
+# "thread" keeps everything in-process (useful for debugging or single-core hosts).
+WORKER_POOL_KIND = os.getenv("WORKER_POOL_KIND", "process")
+WORKER_POOL_SIZE = int(os.getenv("WORKER_POOL_SIZE", "0")) or (os.cpu_count() or 1)
+# Max tasks submitted but not finished (running + queued) before new work is rejected
+WORKER_QUEUE_LIMIT = int(os.getenv("WORKER_QUEUE_LIMIT", "0")) or WORKER_POOL_SIZE * 4
+WORKER_RETRY_AFTER_SECONDS = os.getenv("WORKER_RETRY_AFTER_SECONDS", "2")
+# Background jobs (iter_in_pool) wait instead of failing, and only take slots while fewer
+# than this many tasks are pending, leaving the rest of the queue to verification requests
+WORKER_BACKGROUND_LIMIT = int(os.getenv("WORKER_BACKGROUND_LIMIT", "0")) or max(1, WORKER_QUEUE_LIMIT // 2)
+
+T = TypeVar("T")
+
+_executor: Executor | None = None
+_inflight = 0
+_rejected = 0
+# Guards _inflight: request tasks are admitted on the event loop, background tasks from a worker thread
+_admission = threading.Condition()
+
+
+def _init_worker() -> None:
+	# One pool process per core; keep OpenCV from spawning its own thread pool in each
+	try:
+		import cv2
+
+		cv2.setNumThreads(1)
+	except Exception:
+		pass
+	# Prepare institution templates and load the OCR engine once per worker instead of on the first request
+	try:
+		from .templates import template_store
+
+		template_store.preload()
+	except Exception:
+		pass
+	try:
+		from .ocr import get_backend
+
+		get_backend()
+	except Exception:
+		pass
+
+
+def get_executor() -> Executor:
+	global _executor
+	if _executor is None:
+		if WORKER_POOL_KIND == "thread":
+			_executor = ThreadPoolExecutor(max_workers=WORKER_POOL_SIZE, thread_name_prefix="verify-worker")
+		else:
+			_executor = ProcessPoolExecutor(
+				max_workers=WORKER_POOL_SIZE,
+				mp_context=multiprocessing.get_context("spawn"),
+				initializer=_init_worker,
+			)
+	return _executor
+
+
+def shutdown_pool() -> None:
+	global _executor
+	if _executor is not None:
+		_executor.shutdown(wait=True, cancel_futures=True)
+		_executor = None
+
+
+def pool_stats() -> Dict[str, Any]:
+	return {
+		"kind": WORKER_POOL_KIND,
+		"size": WORKER_POOL_SIZE,
+		"queue_limit": WORKER_QUEUE_LIMIT,
+		"background_limit": WORKER_BACKGROUND_LIMIT,
+		"inflight": _inflight,
+		"rejected": _rejected,
+	}
+
+
+async def run_in_pool(fn: Callable[..., T], *args: Any) -> T:
+	"""Run a blocking function on the worker pool without blocking the event loop.
+
+	Raises 503 with Retry-After when WORKER_QUEUE_LIMIT tasks are already pending.
+	`fn` and its arguments must be picklable when the pool kind is "process".
+	"""
+	global _inflight, _rejected
+	with _admission:
+		if _inflight >= WORKER_QUEUE_LIMIT:
+			_rejected += 1
+			POOL_REJECTIONS.inc()
+			raise HTTPException(
+				status_code=503,
+				detail="Verification workers are busy, retry later",
+				headers={"Retry-After": WORKER_RETRY_AFTER_SECONDS},
+			)
+		_inflight += 1
+	POOL_QUEUE_DEPTH.inc()
+	executor = get_executor()
+	try:
+		try:
+			future = executor.submit(fn, *args)
+		except BaseException:
+			_release()
+			raise
+		# Free the slot when the task finishes, not when the caller stops waiting: a cancelled
+		# request leaves an already running task occupying its worker
+		future.add_done_callback(_release)
+		return await asyncio.wrap_future(future)
+	except BrokenProcessPool:
+		# A worker died (e.g. OOM on a huge scan); start a fresh pool for later requests
+		_discard_broken(executor)
+		raise HTTPException(status_code=503, detail="Verification worker crashed, retry later")
+
+
+def _discard_broken(executor: Executor) -> None:
+	"""Shut down a pool whose worker died; the next get_executor() starts a fresh one."""
+	global _executor
+	# Reap the remaining processes and fail queued tasks instead of leaving them to the old pool
+	executor.shutdown(wait=False, cancel_futures=True)
+	if _executor is executor:
+		_executor = None
+
+
+def _release(_future: Any = None) -> None:
+	global _inflight
+	with _admission:
+		_inflight -= 1
+		_admission.notify_all()
+	POOL_QUEUE_DEPTH.dec()
+
+
+def iter_in_pool(fn: Callable[..., T], arg_tuples: Iterable[tuple], window: int = 0) -> Iterator[T]:
+	"""Run `fn(*args)` for each args tuple on the worker pool, yielding results in order.
+
+	For long streaming jobs driven from a sync generator (e.g. bulk QR issuance).
+	Tasks count toward WORKER_QUEUE_LIMIT like run_in_pool's, but instead of a
+	503 each submission waits until fewer than WORKER_BACKGROUND_LIMIT tasks
+	are pending, so verification requests keep the rest of the queue. At most
+	`window` tasks (default WORKER_POOL_SIZE * 2) are outstanding, which keeps
+	memory bounded. Unfinished tasks are cancelled when the consumer stops early.
+	"""
+	global _inflight
+	window = min(window or WORKER_POOL_SIZE * 2, WORKER_BACKGROUND_LIMIT)
+	executor = get_executor()
+	pending: deque = deque()
+	try:
+		for args in arg_tuples:
+			with _admission:
+				_admission.wait_for(lambda: _inflight < WORKER_BACKGROUND_LIMIT)
+				_inflight += 1
+			POOL_QUEUE_DEPTH.inc()
+			try:
+				future = executor.submit(fn, *args)
+			except BaseException:
+				_release()
+				raise
+			future.add_done_callback(_release)
+			pending.append(future)
+			if len(pending) >= window:
+				yield pending.popleft().result()
+		while pending:
+			yield pending.popleft().result()
+	except BrokenProcessPool:
+		_discard_broken(executor)
+		raise
+	finally:
+		for future in pending:
+			future.cancel()
@@ -0,0 +1,41 @@
+import zipfile
+from typing import Iterable, Iterator, List, Tuple
+
+
+class _Sink:
+	"""Write-only, non-seekable file object whose output is drained chunk by chunk."""
+
+	def __init__(self) -> None:
+		self._chunks: List[bytes] = []
+
+	def write(self, data: bytes) -> int:
+		self._chunks.append(bytes(data))
+		return len(data)
+
+	def flush(self) -> None:
+		pass
+
+	def drain(self) -> bytes:
+		out = b"".join(self._chunks)
+		self._chunks.clear()
+		return out
+
+
+def iter_zip(members: Iterable[Tuple[str, bytes]], compression: int = zipfile.ZIP_STORED) -> Iterator[bytes]:
+	"""Stream a zip archive of (name, data) members as it is built.
+
+	Memory holds one member at a time, so archives of any size can be sent
+	as a StreamingResponse body. ZIP_STORED suits already-compressed data
+	such as PNGs.
+	"""
+	sink = _Sink()
+	# The sink has no tell(), so zipfile writes data descriptors instead of seeking back
+	with zipfile.ZipFile(sink, "w", compression=compression) as archive:
+		for name, data in members:
+			archive.writestr(name, data)
+			chunk = sink.drain()
+			if chunk:
+				yield chunk
+	tail = sink.drain()
+	if tail:
+		yield tail
@@ -0,0 +1,79 @@
+"""Per-call cost of admin token checks and QR signature verification.
+
+Usage (from backend/):
+	python -m benchmarks.bench_auth --calls 2000
+
+Compares, for the admin access token (HS256) and for QR 'sig' tokens signed
+with an HS256 secret and an RS256 key from a temporary keystore:
+- legacy: jwt.decode with the key as text (RSA PEM parsed on every call,
+  both algorithms allowed, as before)
+- parsed: jwt.decode with the keystore's pre-parsed key object
+- cached: the service path, repeated calls on the same token
+Prints one JSON line per case with microseconds per call.
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from datetime import timedelta
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jose import jwt
+
+from app.security.auth import ALGORITHM, SECRET_KEY, create_access_token, get_current_user, token_cache
+from app.services.keystore import Keystore
+from app.services.signature import sig_cache, verify_jwt_signature
+
+
+def _per_call(fn, calls: int) -> float:
+	t0 = time.perf_counter()
+	for _ in range(calls):
+		fn()
+	return round((time.perf_counter() - t0) / calls * 1e6, 1)
+
+
+def _report(case: str, calls: int, **variants) -> None:
+	print(json.dumps({"case": case, **{f"{name}_us": _per_call(fn, calls) for name, fn in variants.items()}}))
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--calls", type=int, default=2000)
+	args = parser.parse_args()
+
+	token = create_access_token({"sub": "admin", "role": "admin"}, timedelta(hours=1))
+	_report(
+		"admin-token",
+		args.calls,
+		legacy=lambda: jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]),
+		cached=lambda: get_current_user(token),
+	)
+	token_cache.clear()
+
+	with tempfile.TemporaryDirectory() as keys:
+		private = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+		pem = private.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()).decode()
+		public_pem = private.public_key().public_bytes(serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo).decode()
+		with open(os.path.join(keys, "RSA-INST.pem"), "w") as f:
+			f.write(pem)
+		with open(os.path.join(keys, "HS-INST.key"), "w") as f:
+			f.write("bench-secret")
+		store = Keystore(keys, fallback_secret=None)
+		claims = {"certificate_id": "CERT-1", "institution_id": "X", "candidate_name": "A B", "roll_number": "R1", "course": "B.Sc", "year": 2024}
+		for name, legacy_key in (("HS-INST", "bench-secret"), ("RSA-INST", public_pem)):
+			entry = store.verification_key(name)
+			sig = jwt.encode(claims, entry.signer, algorithm=entry.algorithm)
+			_report(
+				f"qr-sig-{entry.algorithm}",
+				args.calls,
+				legacy=lambda: jwt.decode(sig, legacy_key, algorithms=["HS256", "RS256"]),
+				parsed=lambda: jwt.decode(sig, entry.verifier, algorithms=[entry.algorithm]),
+				cached=lambda: verify_jwt_signature(sig, entry),
+			)
+			sig_cache.clear()
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,65 @@
+"""Throughput of bulk QR issuance (signed payloads rendered to PNG).
+
+Usage (from backend/):
+	python -m benchmarks.bench_issuance --certificates 2000 --processes 1,4
+
+Renders synthetic cohort rows with issuance.render_chunk on a process pool
+of each size (ISSUANCE_CHUNK_SIZE rows per task), after a sequential baseline
+of the previous per-request path (qrcode.make, unsigned) on a sample. Prints
+one JSON line per run with certificates/sec and the projected time for 50k.
+No database is needed; QR_IMAGE_CACHE_DIR should be unset so every code is
+rendered.
+"""
+import argparse
+import json
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+import qrcode
+
+from app.services.issuance import ISSUANCE_CHUNK_SIZE, render_chunk
+from benchmarks.synthetic import certificate_fields
+
+
+def make_rows(count: int) -> list:
+	rows = []
+	for i in range(count):
+		f = certificate_fields(i)
+		rows.append((i + 1, f["certificate_id"], f["candidate_name"], f["roll_number"], f["course"], 2024))
+	return rows
+
+
+def report(name: str, count: int, elapsed: float, **extra) -> None:
+	rate = count / elapsed
+	print(json.dumps({"run": name, "certificates": count, "seconds": round(elapsed, 2), "per_second": round(rate, 1), "projected_50k_minutes": round(50_000 / rate / 60, 1), **extra}))
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--certificates", type=int, default=2000)
+	parser.add_argument("--processes", default="1,4")
+	parser.add_argument("--baseline-sample", type=int, default=200)
+	args = parser.parse_args()
+
+	rows = make_rows(args.certificates)
+	sample = rows[: args.baseline_sample]
+	t0 = time.perf_counter()
+	for _, certificate_id, *_ in sample:
+		buf = BytesIO()
+		qrcode.make({"certificate_id": certificate_id, "institution_id": "BENCH", "url": f"http://localhost:8000/v/{certificate_id}"}).save(buf, format="PNG")
+	report("legacy-sequential-unsigned", len(sample), time.perf_counter() - t0)
+
+	chunks = [rows[i : i + ISSUANCE_CHUNK_SIZE] for i in range(0, len(rows), ISSUANCE_CHUNK_SIZE)]
+	for processes in (int(p) for p in args.processes.split(",")):
+		with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn")) as pool:
+			# Start the workers (imports, first render) outside the timed region
+			list(pool.map(render_chunk, ["BENCH"] * processes, [rows[:1]] * processes, [True] * processes))
+			t0 = time.perf_counter()
+			total_bytes = sum(len(png) for chunk, _ in pool.map(render_chunk, ["BENCH"] * len(chunks), chunks, [True] * len(chunks)) for _, png in chunk)
+			report("issuance-signed", len(rows), time.perf_counter() - t0, processes=processes, mean_png_bytes=round(total_bytes / len(rows)))
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,71 @@
+"""Compare OCR throughput of the tesserocr engine pool with the pytesseract subprocess path.
+
+Usage (from backend/):
+	python -m benchmarks.bench_ocr --pages 20 --threads 1,4
+
+Synthetic certificate pages (benchmarks/synthetic.py) are preprocessed once;
+each backend then OCRs the same pages (full page, --psm 6) from N threads.
+Prints one JSON object per backend and thread count with pages/sec and
+per-page latency. Backends that cannot start (no tesserocr, no tessdata, no
+tesseract binary) are reported with their error instead.
+"""
+import argparse
+import json
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.services import ocr
+from benchmarks.synthetic import certificate_fields, render_certificate
+
+
+def make_pages(count: int, width: int) -> list:
+	return [ocr._preprocess_image_for_ocr(render_certificate(certificate_fields(i), width)) for i in range(count)]
+
+
+def run(backend, pages: list, threads: int) -> dict:
+	lat = []
+
+	def one(page):
+		t0 = time.perf_counter()
+		text = backend.image_to_string(page)
+		lat.append(time.perf_counter() - t0)
+		return text
+
+	# Warm up (first engine/model load is a one-off cost for the pool)
+	one(pages[0])
+	lat.clear()
+	t0 = time.perf_counter()
+	with ThreadPoolExecutor(max_workers=threads) as pool:
+		texts = list(pool.map(one, pages))
+	elapsed = time.perf_counter() - t0
+	return {
+		"pages": len(pages),
+		"threads": threads,
+		"pages_per_second": round(len(pages) / elapsed, 2),
+		"p50_ms": round(statistics.median(lat) * 1000, 1),
+		"found_ids": sum("CERT" in t.upper() for t in texts),
+	}
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--pages", type=int, default=20)
+	parser.add_argument("--width", type=int, default=1240, help="page width in pixels (1240 ~ A4 at 150 dpi)")
+	parser.add_argument("--threads", default="1")
+	parser.add_argument("--backends", default="tesserocr,pytesseract")
+	args = parser.parse_args()
+
+	pages = make_pages(args.pages, args.width)
+	for kind in args.backends.split(","):
+		for threads in (int(t) for t in args.threads.split(",")):
+			try:
+				backend = ocr.create_backend(kind, size=threads)
+				result = {"backend": kind, **run(backend, pages, threads)}
+			except Exception as exc:
+				result = {"backend": kind, "threads": threads, "error": str(exc)}
+			print(json.dumps(result))
+
+
+if __name__ == "__main__":
+	main()
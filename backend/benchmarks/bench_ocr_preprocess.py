@@ -0,0 +1,80 @@
+"""Time and check OCR preprocessing on the synthetic certificate fixtures.
+
+Usage (from backend/):
+	python -m benchmarks.bench_ocr_preprocess --count 2
+
+For each fixture (150/300 dpi scans, a 4000 px phone photo, a binary fax)
+compares the previous pipeline (full-resolution bilateral filter + adaptive
+threshold) with the adaptive one: plan (estimated text height, DPI, noise,
+chosen filter), per-stage timings and, when an OCR backend can run, how many
+of the four fields each pipeline reads back exactly.
+"""
+import argparse
+import json
+import time
+
+import cv2
+
+from app.services import ocr
+from benchmarks.synthetic import fixture_set
+
+
+def legacy_preprocess(gray):
+	den = cv2.bilateralFilter(gray, 9, 75, 75)
+	return cv2.adaptiveThreshold(den, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 31, 10, dst=den)
+
+
+def field_hits(image, expected: dict, backend) -> int | None:
+	if backend is None:
+		return None
+	fields = ocr._parse_fields(backend.image_to_string(image))
+	return sum(fields.get(k, "").strip().lower() == v.lower() for k, v in expected.items())
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--count", type=int, default=2, help="certificates per fixture kind")
+	parser.add_argument("--no-ocr", action="store_true", help="only time preprocessing")
+	args = parser.parse_args()
+
+	backend = None
+	if not args.no_ocr:
+		try:
+			backend = ocr.get_backend()
+			backend.image_to_string(legacy_preprocess(fixture_set(1)[0]["gray"]))
+		except Exception as exc:
+			print(json.dumps({"ocr": "unavailable", "error": str(exc)}))
+			backend = None
+
+	totals = {"legacy_ms": 0.0, "adaptive_ms": 0.0, "legacy_hits": 0, "adaptive_hits": 0, "fields": 0}
+	for item in fixture_set(args.count):
+		gray = item["gray"]
+		t0 = time.perf_counter()
+		old = legacy_preprocess(gray)
+		legacy_ms = (time.perf_counter() - t0) * 1000
+		t0 = time.perf_counter()
+		plan = ocr.plan_preprocessing(gray)
+		new = ocr._preprocess_image_for_ocr(gray, plan)
+		adaptive_ms = (time.perf_counter() - t0) * 1000
+		result = {
+			"fixture": item["name"],
+			"size": plan["input"],
+			"legacy_ms": round(legacy_ms, 1),
+			"adaptive_ms": round(adaptive_ms, 1),
+			"plan": {k: plan[k] for k in ("text_height", "effective_dpi", "scale", "noise_sigma", "denoise", "binary")},
+			"stages_ms": plan["timings_ms"],
+		}
+		if backend is not None:
+			result["legacy_fields"] = field_hits(old, item["fields"], backend)
+			result["adaptive_fields"] = field_hits(new, item["fields"], backend)
+			totals["legacy_hits"] += result["legacy_fields"]
+			totals["adaptive_hits"] += result["adaptive_fields"]
+			totals["fields"] += len(item["fields"])
+		totals["legacy_ms"] += legacy_ms
+		totals["adaptive_ms"] += adaptive_ms
+		print(json.dumps(result))
+	print(json.dumps({"total": {k: round(v, 1) if isinstance(v, float) else v for k, v in totals.items()}}))
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,71 @@
+"""Compare the multi-index pHash lookup with a linear popcount scan.
+
+Usage (from backend/):
+	python -m benchmarks.bench_phash --sizes 100000,1000000,5000000 --output phash.json
+
+Random 256-bit hashes are indexed in memory; queries are stored hashes with a
+few bits flipped (near-duplicates) plus unrelated random hashes. Prints one
+JSON line per size (phash-<size>) with build time and per-query latency for
+both methods; --output also writes the whole run as one document that
+benchmarks/compare.py can diff against a baseline.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.services.phash_index import PHASH_MAX_DISTANCE, PHashIndex
+from benchmarks.results import emit, latency_summary, write
+
+
+def _timed(fn, queries) -> dict:
+	lat = []
+	found = 0
+	for q in queries:
+		t0 = time.perf_counter()
+		found += len(fn(q))
+		lat.append((time.perf_counter() - t0) * 1000)
+	return {**latency_summary(lat), "matches": found}
+
+
+def run(size: int, queries: int, flips: int, seed: int = 0) -> dict:
+	rnd = np.random.default_rng(seed)
+	words = rnd.integers(0, 2**63, size=(size, 4), dtype=np.uint64) | (rnd.integers(0, 2, size=(size, 4), dtype=np.uint64) << np.uint64(63))
+	index = PHashIndex()
+	t0 = time.perf_counter()
+	index.add_many(words, [(None, str(i), "bench") for i in range(size)], defer=True)
+	index.compact()
+	build_s = time.perf_counter() - t0
+
+	near = []
+	for i in rnd.integers(0, size, size=queries):
+		q = words[i].copy()
+		for bit in rnd.choice(256, size=flips, replace=False):
+			q[bit // 64] ^= np.uint64(1) << np.uint64(bit % 64)
+		near.append(q)
+	unrelated = list(rnd.integers(0, 2**63, size=(queries, 4), dtype=np.uint64))
+
+	return {
+		"hashes": size,
+		"build_seconds": round(build_s, 2),
+		"max_distance": PHASH_MAX_DISTANCE,
+		"near_duplicate": {"index": _timed(index.query, near), "linear": _timed(index.linear_query, near)},
+		"unrelated": {"index": _timed(index.query, unrelated), "linear": _timed(index.linear_query, unrelated)},
+	}
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--sizes", default="100000,1000000")
+	parser.add_argument("--queries", type=int, default=200)
+	parser.add_argument("--flips", type=int, default=8)
+	parser.add_argument("--output", help="write the run as one JSON document")
+	args = parser.parse_args()
+	results = []
+	for size in [int(s) for s in args.sizes.split(",") if s]:
+		results.append(emit({"name": f"phash-{size}", **run(size, args.queries, args.flips)}))
+	write("phash", vars(args), results, args.output)
+
+
+if __name__ == "__main__":
+	main()
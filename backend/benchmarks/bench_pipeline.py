@@ -0,0 +1,129 @@
+"""Microbenchmarks of the verification pipeline stages on synthetic certificates.
+
+Usage (from backend/):
+	python -m benchmarks.bench_pipeline --count 3 --sizes 10000,100000 --output pipeline.json
+
+Stages, each on synthetic documents from benchmarks/synthetic.py:
+- preprocess-<fixture>: ocr._preprocess_image_for_ocr on the OCR fixtures
+  (150/300 dpi scans, a phone photo, a fax)
+- qr-bytes-<kind>: qr._decode_qr_from_image_bytes (single-pass decoder) and
+  qr-engine-<kind>: qr.scan_document_qr (multi-pass engine) on encoded
+  uploads (DOCUMENT_KINDS: with a plain or signed QR code, or none)
+- anomaly-<kind>: anomaly.analyze_document_anomalies (the anomaly stage
+  of extraction.extract_document) on decoded uploads
+- validate-<size>: validate_certificate_data against SQLite registries of
+  each size (benchmarks/bench_validation.py, files under --workdir)
+
+Prints one JSON line per result; --output also writes the whole run as one
+document that benchmarks/compare.py can diff against a baseline.
+"""
+import argparse
+import os
+
+# Signed QR payloads need a key; never let the benchmark create ./keys/default.key
+os.environ.setdefault("QR_SIGNING_KEY", "benchmark-only-secret")
+
+from app.services import ocr
+from app.services.anomaly import analyze_document_anomalies
+from app.services.document import DocumentContext, decode_document
+from app.services.issuance import signed_payload
+from app.services.qr import _decode_qr_from_image_bytes, scan_document_qr
+from app.services.qr_images import certificate_payload
+from benchmarks import bench_validation
+from benchmarks.results import emit, time_calls, write
+from benchmarks.synthetic import DOCUMENT_KINDS, certificate_document, fixture_set, registry_rows
+
+
+def make_documents(count: int) -> list:
+	"""[{"kind", "row", "payload", "data"}]: `count` encoded uploads per DOCUMENT_KINDS entry."""
+	rows = registry_rows(len(DOCUMENT_KINDS) * count)
+	docs = []
+	for k, (kind, width, degradation, qr) in enumerate(DOCUMENT_KINDS):
+		for i in range(count):
+			row = rows[k * count + i]
+			payload = None
+			if qr == "plain":
+				payload = certificate_payload(row["institution_id"], row["certificate_id"])
+			elif qr == "signed":
+				payload = signed_payload(row["institution_id"], (0, row["certificate_id"], row["candidate_name"], row["roll_number"], row["course"], row["year"]))
+			docs.append({"kind": kind, "row": row, "payload": payload, "data": certificate_document(row, width, degradation, payload, seed=i)})
+	return docs
+
+
+def _qr_success(decoded_ids: list, docs: list) -> float:
+	expected = [d["row"]["certificate_id"] if d["payload"] else None for d in docs]
+	return round(sum(got == want for got, want in zip(decoded_ids, expected)) / len(docs), 3)
+
+
+def bench_preprocess(count: int, repeat: int) -> list:
+	results = []
+	items = fixture_set(count)
+	for name in dict.fromkeys(item["name"] for item in items):
+		grays = [item["gray"] for item in items if item["name"] == name]
+		results.append(emit({"name": f"preprocess-{name}", **time_calls(ocr._preprocess_image_for_ocr, grays, repeat)}))
+	return results
+
+
+def bench_qr(docs: list, repeat: int) -> list:
+	results = []
+	for kind in dict.fromkeys(d["kind"] for d in docs):
+		group = [d for d in docs if d["kind"] == kind]
+		legacy = [_decode_qr_from_image_bytes(d["data"]).get("certificate_id") for d in group]
+		results.append(emit({
+			"name": f"qr-bytes-{kind}",
+			**time_calls(lambda d: _decode_qr_from_image_bytes(d["data"]), group, repeat),
+			"success_rate": _qr_success(legacy, group),
+		}))
+		engine = [(scan_document_qr(DocumentContext(d["data"]))["primary"] or {}).get("certificate_id") for d in group]
+		results.append(emit({
+			"name": f"qr-engine-{kind}",
+			**time_calls(lambda d: scan_document_qr(DocumentContext(d["data"])), group, repeat),
+			"success_rate": _qr_success(engine, group),
+		}))
+	return results
+
+
+def bench_anomaly(docs: list, repeat: int) -> list:
+	results = []
+	for kind in dict.fromkeys(d["kind"] for d in docs):
+		decoded = [decode_document(DocumentContext(d["data"])) for d in docs if d["kind"] == kind]
+		results.append(emit({"name": f"anomaly-{kind}", **time_calls(analyze_document_anomalies, decoded, repeat)}))
+	return results
+
+
+def bench_validation_sizes(sizes: list, workdir: str, lookups: int) -> list:
+	os.makedirs(workdir, exist_ok=True)
+	results = []
+	for size in sizes:
+		measured = bench_validation.run(size, workdir, lookups, legacy_max=0)
+		results.append(emit({"name": f"validate-{size}", **measured}))
+	return results
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--count", type=int, default=3, help="documents per kind")
+	parser.add_argument("--repeat", type=int, default=3, help="timed calls per document")
+	parser.add_argument("--sizes", default="10000,100000", help="registry sizes for validate-<size>")
+	parser.add_argument("--lookups", type=int, default=200)
+	parser.add_argument("--workdir", default=os.path.join(os.getcwd(), ".bench"))
+	parser.add_argument("--stages", default="preprocess,qr,anomaly,validate")
+	parser.add_argument("--output", help="write the run as one JSON document")
+	args = parser.parse_args()
+
+	stages = set(args.stages.split(","))
+	results = []
+	if "preprocess" in stages:
+		results += bench_preprocess(args.count, args.repeat)
+	docs = make_documents(args.count) if stages & {"qr", "anomaly"} else []
+	if "qr" in stages:
+		results += bench_qr(docs, args.repeat)
+	if "anomaly" in stages:
+		results += bench_anomaly(docs, args.repeat)
+	if "validate" in stages:
+		results += bench_validation_sizes([int(s) for s in args.sizes.split(",") if s], args.workdir, args.lookups)
+	write("pipeline", vars(args), results, args.output)
+
+
+if __name__ == "__main__":
+	main()
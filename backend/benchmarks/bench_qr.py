@@ -0,0 +1,78 @@
+"""QR decode success rate and latency on the synthetic QR corpus.
+
+Usage (from backend/):
+	python -m benchmarks.bench_qr --count 3 --output qr.json
+
+Compares the previous decoder (a new cv2.QRCodeDetector per call, one
+full-resolution detectAndDecode) with the multi-pass engine in
+services/qr.py on QR_FIXTURES from benchmarks/synthetic.py. A page counts
+as decoded when every code on it was read back (for "no-code" pages: when
+nothing was reported). Prints one JSON line per fixture (qr-<fixture>) and a
+total (qr-total); --output also writes the whole run as one document that
+benchmarks/compare.py can diff against a baseline.
+"""
+import argparse
+import statistics
+import time
+
+import cv2
+
+from app.services.qr import _parse, decode_qr_codes
+from benchmarks.results import emit, write
+from benchmarks.synthetic import QR_FIXTURES, qr_fixture_set
+
+
+def legacy_decode(gray) -> list:
+	val, _, _ = cv2.QRCodeDetector().detectAndDecode(gray)
+	return [val] if val else []
+
+
+def engine_decode(gray) -> list:
+	return decode_qr_codes(gray)["codes"]
+
+
+def run(decode, items) -> dict:
+	hits, lat = 0, []
+	for item in items:
+		t0 = time.perf_counter()
+		codes = decode(item["gray"])
+		lat.append((time.perf_counter() - t0) * 1000)
+		found = [_parse(c) for c in codes]
+		hits += all(p in found for p in item["payloads"]) and (bool(item["payloads"]) or not found)
+	return {
+		"decoded": hits,
+		"pages": len(items),
+		"success_rate": round(hits / len(items), 4),
+		"p50_ms": round(statistics.median(lat), 1),
+		"max_ms": round(max(lat), 1),
+	}
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--count", type=int, default=3, help="pages per fixture kind")
+	parser.add_argument("--output", help="write the run as one JSON document")
+	args = parser.parse_args()
+
+	items = qr_fixture_set(args.count)
+	totals = {"legacy": {"decoded": 0, "ms": 0.0}, "engine": {"decoded": 0, "ms": 0.0}}
+	results = []
+	for name, *_ in QR_FIXTURES:
+		group = [item for item in items if item["name"] == name]
+		result = emit({"name": f"qr-{name}", "legacy": run(legacy_decode, group), "engine": run(engine_decode, group)})
+		for kind in totals:
+			totals[kind]["decoded"] += result[kind]["decoded"]
+			totals[kind]["ms"] += len(group) * result[kind]["p50_ms"]
+		results.append(result)
+	results.append(emit({
+		"name": "qr-total",
+		**{
+			k: {"decoded": v["decoded"], "pages": len(items), "success_rate": round(v["decoded"] / len(items), 4), "approx_ms": round(v["ms"], 1)}
+			for k, v in totals.items()
+		},
+	}))
+	write("qr", vars(args), results, args.output)
+
+
+if __name__ == "__main__":
+	main()
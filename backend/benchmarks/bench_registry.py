@@ -0,0 +1,95 @@
+"""Build time, memory and lookup latency of the in-memory registry snapshot.
+
+Usage (from backend/):
+	python -m benchmarks.bench_registry --sizes 100000,1000000
+
+Builds services/registry.py snapshots from synthetic records (no database)
+with syllable-generated names (pools of given names and surnames). Then times exact lookups
+(certificate_id, roll_number) and fuzzy name lookups on OCR-like
+corruptions of registered names (case and punctuation noise plus 0-2
+character edits). Reports recall: the share of queries whose record is
+among the candidates. Prints one JSON line per size.
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+
+from app.services.registry import RegistryRecord, RegistrySnapshot
+
+_SYLLABLES = [
+	"a", "ka", "ri", "sha", "ma", "na", "vi", "ra", "ja", "an", "de", "lo", "mi", "ta", "su", "ven", "kar", "dev",
+	"pri", "ya", "lan", "bh", "gu", "pta", "il", "ro", "han", "es", "th", "er", "ol", "iv", "ia", "cha", "ndr", "ku",
+]
+
+
+def _words(rnd: random.Random, count: int) -> list:
+	return ["".join(rnd.choice(_SYLLABLES) for _ in range(rnd.randint(2, 4))).capitalize() for _ in range(count)]
+
+
+def make_records(n: int, seed: int = 7) -> list:
+	"""Names combine pools of 5000 given names and 3000 surnames, so popular names repeat as in real registries."""
+	rnd = random.Random(seed)
+	given, family = _words(rnd, 5000), _words(rnd, 3000)
+	_name = lambda rnd: f"{rnd.choice(given)} {rnd.choice(family)}"
+	return [
+		RegistryRecord(i + 1, f"INST-{i % 50:02d}", f"CERT-{i:09d}", _name(rnd), f"RJH{i:09d}", ["B.Sc", "M.A", "B.Tech"][i % 3], 2000 + i % 25)
+		for i in range(n)
+	]
+
+
+def corrupt(name: str, edits: int, rnd: random.Random) -> str:
+	chars = list(name)
+	for _ in range(edits):
+		i = rnd.randrange(1, len(chars) - 1)
+		op = rnd.choice("sdi")
+		if op == "s":
+			chars[i] = rnd.choice("abcdefghijklmnopqrstuvwxyz")
+		elif op == "d":
+			del chars[i]
+		else:
+			chars.insert(i, rnd.choice("abcdefghijklmnopqrstuvwxyz"))
+	noisy = "".join(chars).upper() if rnd.random() < 0.5 else "".join(chars)
+	return noisy.replace(" ", "  ") + ("." if rnd.random() < 0.5 else "")
+
+
+def _time(fn, queries) -> dict:
+	lat = []
+	for q in queries:
+		t0 = time.perf_counter()
+		fn(q)
+		lat.append((time.perf_counter() - t0) * 1e6)
+	lat.sort()
+	return {"p50_us": round(statistics.median(lat), 1), "p95_us": round(lat[int(len(lat) * 0.95) - 1], 1)}
+
+
+def run(size: int, lookups: int) -> dict:
+	records = make_records(size)
+	snap = RegistrySnapshot()
+	t0 = time.perf_counter()
+	snap.build(records)
+	build_s = time.perf_counter() - t0
+	rnd = random.Random(11)
+	sample = [records[rnd.randrange(size)] for _ in range(lookups)]
+	out = {"size": size, "build_seconds": round(build_s, 2), "memory_mb": snap.stats()["memory_mb"], "distinct_names": snap.stats()["distinct_names"]}
+	out["certificate_id"] = _time(lambda r: snap.candidates({"certificate_id": r.certificate_id}, r.institution_id, 50), sample)
+	out["roll_number"] = _time(lambda r: snap.candidates({"roll_number": r.roll_number}, None, 50), sample)
+	for edits in (0, 1, 2):
+		queries = [(r, corrupt(r.candidate_name, edits, rnd)) for r in sample]
+		found = sum(any(c.certificate_id == r.certificate_id for c in snap.candidates({"candidate_name": q}, r.institution_id, 50)) for r, q in queries)
+		out[f"name_{edits}_edits"] = {**_time(lambda rq: snap.candidates({"candidate_name": rq[1]}, rq[0].institution_id, 50), queries), "recall": round(found / len(queries), 3)}
+	return out
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--sizes", default="100000,1000000")
+	parser.add_argument("--lookups", type=int, default=500)
+	args = parser.parse_args()
+	for size in (int(s) for s in args.sizes.split(",")):
+		print(json.dumps(run(size, args.lookups)))
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,112 @@
+"""Benchmark validate_certificate_data against registries of increasing size.
+
+Usage (from backend/):
+	python -m benchmarks.bench_validation --sizes 10000,1000000,10000000 --output validation.json
+
+Each size gets its own SQLite file under --workdir (reused if already populated).
+Prints one JSON line per size (validate-<size>) with latency percentiles and
+peak Python memory per lookup; --output also writes the whole run as one
+document that benchmarks/compare.py can diff against a baseline. --legacy-max
+also times the previous full-table scan for small sizes.
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+import tracemalloc
+
+from sqlalchemy import insert, func
+from sqlmodel import SQLModel, Session, create_engine, select
+
+from app.db.models import CertificateRecord
+from app.services import validation
+from benchmarks.results import emit, latency_summary, write
+
+
+def _row(i: int) -> dict:
+	return {
+		"institution_id": f"INST-{i % 50:02d}",
+		"certificate_id": f"CERT-{i:09d}",
+		"candidate_name": f"Candidate {i}",
+		"roll_number": f"RJH{i:09d}",
+		"course": "B.Sc",
+		"year": 2000 + i % 25,
+	}
+
+
+def _populate(engine, n: int, chunk: int = 50_000) -> None:
+	SQLModel.metadata.create_all(engine, tables=[CertificateRecord.__table__])
+	with Session(engine) as session:
+		have = session.exec(select(func.count()).select_from(CertificateRecord)).one()
+	with engine.begin() as conn:
+		for start in range(have, n, chunk):
+			conn.execute(insert(CertificateRecord.__table__), [_row(i) for i in range(start, min(n, start + chunk))])
+
+
+def _legacy_full_scan(engine, fields: dict, institution_id: str | None):
+	with Session(engine) as session:
+		stmt = select(CertificateRecord)
+		if institution_id:
+			stmt = stmt.where(CertificateRecord.institution_id == institution_id)
+		records = session.exec(stmt).all()
+		return max(records, key=lambda r: validation.score_match(r, fields)) if records else None
+
+
+def _measure(fn, queries) -> dict:
+	lat = []
+	peak = 0
+	for q in queries:
+		tracemalloc.start()
+		t0 = time.perf_counter()
+		fn(q)
+		lat.append((time.perf_counter() - t0) * 1000)
+		peak = max(peak, tracemalloc.get_traced_memory()[1])
+		tracemalloc.stop()
+	return {**latency_summary(lat), "peak_kib": round(peak / 1024, 1)}
+
+
+def run(size: int, workdir: str, lookups: int, legacy_max: int) -> dict:
+	engine = create_engine(f"sqlite:///{os.path.join(workdir, f'registry_{size}.db')}")
+	t0 = time.perf_counter()
+	_populate(engine, size)
+	populate_s = time.perf_counter() - t0
+	validation.engine = engine
+
+	rnd = random.Random(size)
+	queries = []
+	for _ in range(lookups):
+		i = rnd.randrange(size)
+		r = _row(i)
+		queries.append({"certificate_id": r["certificate_id"], "roll_number": r["roll_number"], "candidate_name": r["candidate_name"]})
+	misses = [{"certificate_id": f"MISSING-{k}", "candidate_name": "Nobody"} for k in range(lookups)]
+
+	result = {
+		"rows": size,
+		"populate_seconds": round(populate_s, 2),
+		"hit": _measure(lambda q: asyncio.run(validation.validate_certificate_data(q, None)), queries),
+		"miss": _measure(lambda q: asyncio.run(validation.validate_certificate_data(q, None)), misses),
+	}
+	if size <= legacy_max:
+		result["legacy_full_scan"] = _measure(lambda q: _legacy_full_scan(engine, q, None), queries[: max(1, lookups // 10)])
+	engine.dispose()
+	return result
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--sizes", default="10000,1000000,10000000")
+	parser.add_argument("--workdir", default=os.path.join(os.getcwd(), ".bench"))
+	parser.add_argument("--lookups", type=int, default=200)
+	parser.add_argument("--legacy-max", type=int, default=100_000)
+	parser.add_argument("--output", help="write the run as one JSON document")
+	args = parser.parse_args()
+	os.makedirs(args.workdir, exist_ok=True)
+	results = []
+	for size in [int(s) for s in args.sizes.split(",") if s]:
+		results.append(emit({"name": f"validate-{size}", **run(size, args.workdir, args.lookups, args.legacy_max)}))
+	write("validation", vars(args), results, args.output)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,74 @@
+"""Compare two benchmark result files (see benchmarks/results.py).
+
+Usage (from backend/):
+	python -m benchmarks.compare baseline.json current.json --threshold 0.15
+
+Matches results by name and compares every numeric metric whose name says
+which direction is better (latencies vs. throughput/recall). Prints one JSON
+line per changed metric and exits with status 1 if any metric regressed by
+more than --threshold (a fraction of the baseline), so it can gate CI.
+"""
+import argparse
+import json
+import sys
+from typing import Any, Dict, Iterator, Tuple
+
+_LOWER = ("_ms", "_us", "_seconds")
+_HIGHER = ("per_second", "_rps", "recall", "success_rate")
+
+
+def _flatten(prefix: str, value: Any) -> Iterator[Tuple[str, float]]:
+	if isinstance(value, dict):
+		for k, v in value.items():
+			yield from _flatten(f"{prefix}.{k}" if prefix else k, v)
+	elif isinstance(value, (int, float)) and not isinstance(value, bool):
+		yield prefix, float(value)
+
+
+def _direction(metric: str) -> int:
+	"""+1 if higher is better, -1 if lower is better, 0 if not comparable."""
+	leaf = metric.rsplit(".", 1)[-1]
+	if leaf.endswith(_HIGHER):
+		return 1
+	if leaf.endswith(_LOWER):
+		return -1
+	return 0
+
+
+def _metrics(path: str) -> Dict[str, float]:
+	with open(path, encoding="utf-8") as f:
+		doc = json.load(f)
+	out: Dict[str, float] = {}
+	for result in doc["results"]:
+		name = result.get("name", "?")
+		for metric, value in _flatten("", {k: v for k, v in result.items() if k != "name"}):
+			if _direction(metric):
+				out[f"{name}:{metric}"] = value
+	return out
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("baseline")
+	parser.add_argument("current")
+	parser.add_argument("--threshold", type=float, default=0.15)
+	args = parser.parse_args()
+
+	base, cur = _metrics(args.baseline), _metrics(args.current)
+	regressions = 0
+	for key in sorted(base.keys() & cur.keys()):
+		before, after = base[key], cur[key]
+		if before == after:
+			continue
+		change = (after - before) / abs(before) if before else float("inf")
+		worse = change * -_direction(key.split(":", 1)[1]) > args.threshold
+		regressions += worse
+		print(json.dumps({"metric": key, "baseline": before, "current": after, "change": round(change, 4), "regression": worse}))
+	for key in sorted(base.keys() - cur.keys()):
+		print(json.dumps({"metric": key, "missing": "current"}))
+	print(json.dumps({"compared": len(base.keys() & cur.keys()), "regressions": regressions, "threshold": args.threshold}))
+	sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+	main()
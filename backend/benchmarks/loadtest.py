@@ -0,0 +1,248 @@
+"""End-to-end load test of POST /verify/upload against a locally started app.
+
+Usage (from backend/):
+	python -m benchmarks.loadtest --requests 200 --concurrency 8 --output load.json
+
+Starts, all on 127.0.0.1 and under a temporary directory:
+- a stub HTTP server answering every GET with 200, standing in for the
+  verification site the QR URLs point to (QR_VERIFY_BASE_URL and
+  QR_ALLOWED_DOMAINS are pointed at it, so URL validation never leaves the
+  machine);
+- the app under uvicorn (--workers processes) with a fresh SQLite registry
+  seeded with --records synthetic rows and a temporary QR keystore.
+
+Then uploads synthetic certificates of those rows (benchmarks/synthetic.py
+DOCUMENT_KINDS: plain and signed QR codes, no code; scans, photo, fax) with
+--concurrency requests in flight. --documents below --requests repeats
+uploads, exercising the result/QR caches. Reports throughput, latency
+percentiles, status codes, tiers and outcomes, stub fetches, and the mean
+time per pipeline stage scraped from /metrics; --full forces the full
+pipeline for signed codes too.
+"""
+import argparse
+import asyncio
+import os
+import re
+import secrets
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List
+
+import httpx
+
+from benchmarks.results import emit, latency_summary, write
+from benchmarks.synthetic import DOCUMENT_KINDS, certificate_document, registry_rows
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_STAGE_LINE = re.compile(r'^verify_stage_seconds_(sum|count)\{stage="(\w+)"\} ([0-9.e+-]+)$')
+
+
+class _Stub(BaseHTTPRequestHandler):
+	hits = 0
+
+	def do_GET(self) -> None:
+		_Stub.hits += 1
+		body = b"certificate verified"
+		self.send_response(200)
+		self.send_header("Content-Type", "text/plain")
+		self.send_header("Content-Length", str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+	def log_message(self, *args: Any) -> None:
+		pass
+
+
+def _free_port() -> int:
+	with socket.socket() as s:
+		s.bind(("127.0.0.1", 0))
+		return s.getsockname()[1]
+
+
+def _seed(rows: List[Dict[str, Any]]) -> None:
+	"""Create the whole schema and the registry rows (DATABASE_URL is set by then).
+
+	Creating every table here also keeps several app workers from racing on
+	create_all at startup.
+	"""
+	from sqlalchemy import insert
+
+	from app.db.models import CertificateRecord
+	from app.db.session import engine, init_db
+
+	init_db()
+	with engine.begin() as conn:
+		conn.execute(insert(CertificateRecord.__table__), rows)
+	engine.dispose()
+
+
+def _documents(rows: List[Dict[str, Any]], count: int) -> List[Dict[str, Any]]:
+	# Imported after the environment is set: payload URLs and signing keys come from it
+	from app.services.issuance import signed_payload
+	from app.services.qr_images import certificate_payload
+
+	docs = []
+	for i in range(count):
+		row = rows[i % len(rows)]
+		kind, width, degradation, qr = DOCUMENT_KINDS[i % len(DOCUMENT_KINDS)]
+		payload = None
+		if qr == "plain":
+			payload = certificate_payload(row["institution_id"], row["certificate_id"])
+		elif qr == "signed":
+			payload = signed_payload(row["institution_id"], (0, row["certificate_id"], row["candidate_name"], row["roll_number"], row["course"], row["year"]))
+		docs.append({"kind": kind, "name": f"{row['certificate_id']}.png", "data": certificate_document(row, width, degradation, payload, seed=i)})
+	return docs
+
+
+def _stage_totals(metrics_text: str) -> Dict[str, Dict[str, float]]:
+	totals: Dict[str, Dict[str, float]] = {}
+	for line in metrics_text.splitlines():
+		m = _STAGE_LINE.match(line)
+		if m:
+			totals.setdefault(m.group(2), {})[m.group(1)] = float(m.group(3))
+	return totals
+
+
+def _stage_means(before: str, after: str) -> Dict[str, float]:
+	"""Mean ms per stage observation between two /metrics scrapes."""
+	start, end = _stage_totals(before), _stage_totals(after)
+	means = {}
+	for stage, t in end.items():
+		s = start.get(stage, {})
+		n = t.get("count", 0.0) - s.get("count", 0.0)
+		if n:
+			means[f"{stage}_ms"] = round((t.get("sum", 0.0) - s.get("sum", 0.0)) / n * 1000, 3)
+	return means
+
+
+async def _drive(base_url: str, docs: List[Dict[str, Any]], requests: int, concurrency: int, full: bool) -> Dict[str, Any]:
+	lat: List[float] = []
+	status: Counter = Counter()
+	tiers: Counter = Counter()
+	outcomes: Counter = Counter()
+	next_index = 0
+
+	async def worker(client: httpx.AsyncClient) -> None:
+		nonlocal next_index
+		while next_index < requests:
+			doc = docs[next_index % len(docs)]
+			next_index += 1
+			t0 = time.perf_counter()
+			try:
+				resp = await client.post("/verify/upload", params={"full": "true"} if full else None, files={"file": (doc["name"], doc["data"], "image/png")})
+			except httpx.HTTPError as e:
+				status[type(e).__name__] += 1
+				continue
+			status[str(resp.status_code)] += 1
+			if resp.status_code == 200:
+				# Latency of answered verifications; 503s (worker pool full) show up in status/success_rate
+				lat.append((time.perf_counter() - t0) * 1000)
+				body = resp.json()
+				tiers[body.get("tier", "?")] += 1
+				outcomes["valid" if body["success"] else "invalid"] += 1
+
+	async with httpx.AsyncClient(base_url=base_url, timeout=300) as client:
+		metrics_before = (await client.get("/metrics")).text
+		started = time.perf_counter()
+		await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+		elapsed = time.perf_counter() - started
+		metrics_after = (await client.get("/metrics")).text
+	return {
+		"requests": requests,
+		"concurrency": concurrency,
+		"elapsed_seconds": round(elapsed, 3),
+		"throughput_rps": round(requests / elapsed, 2),
+		**(latency_summary(lat) if lat else {}),
+		"success_rate": round(status["200"] / requests, 4),
+		"status": dict(status),
+		"tiers": dict(tiers),
+		"outcomes": dict(outcomes),
+		# With several app processes the scrape aggregates all of them (PROMETHEUS_MULTIPROC_DIR)
+		"stage_means": _stage_means(metrics_before, metrics_after),
+	}
+
+
+def _wait_ready(base_url: str, server: subprocess.Popen, timeout: float = 60) -> None:
+	deadline = time.monotonic() + timeout
+	while time.monotonic() < deadline:
+		if server.poll() is not None:
+			raise RuntimeError(f"app exited with status {server.returncode}")
+		try:
+			if httpx.get(f"{base_url}/health", timeout=1).status_code == 200:
+				return
+		except httpx.HTTPError:
+			pass
+		time.sleep(0.2)
+	raise RuntimeError("app did not become ready")
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--requests", type=int, default=200)
+	parser.add_argument("--concurrency", type=int, default=8)
+	parser.add_argument("--records", type=int, default=2000, help="registry rows seeded")
+	parser.add_argument("--documents", type=int, default=0, help="distinct uploads (default: one per request)")
+	parser.add_argument("--warmup", type=int, default=5, help="untimed requests first (separate documents)")
+	parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+	parser.add_argument("--full", action="store_true", help="request the full pipeline (?full=true)")
+	parser.add_argument("--output", help="write the run as one JSON document")
+	args = parser.parse_args()
+
+	workdir = tempfile.mkdtemp(prefix="loadtest-")
+	stub = ThreadingHTTPServer(("127.0.0.1", _free_port()), _Stub)
+	threading.Thread(target=stub.serve_forever, daemon=True).start()
+	stub_host, stub_port = stub.server_address
+	port = _free_port()
+	env = {
+		**os.environ,
+		"DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'registry.db')}",
+		"QR_VERIFY_BASE_URL": f"http://{stub_host}:{stub_port}/v",
+		"QR_ALLOWED_DOMAINS": stub_host,
+		"QR_KEYSTORE_DIR": os.path.join(workdir, "keys"),
+		"QR_SIGNING_KEY": secrets.token_urlsafe(32),
+		"IMPORT_SPOOL_DIR": os.path.join(workdir, "spool"),
+	}
+	if args.workers > 1:
+		env["PROMETHEUS_MULTIPROC_DIR"] = os.path.join(workdir, "metrics")
+		os.makedirs(env["PROMETHEUS_MULTIPROC_DIR"])
+	# Seeding, signing and QR links happen in this process: same settings as the app
+	os.environ.update({k: env[k] for k in ("DATABASE_URL", "QR_VERIFY_BASE_URL", "QR_KEYSTORE_DIR", "QR_SIGNING_KEY")})
+
+	server = None
+	try:
+		rows = registry_rows(args.records)
+		_seed(rows)
+		documents = args.documents or args.requests
+		docs = _documents(rows, documents + args.warmup)
+		server = subprocess.Popen(
+			[sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port), "--workers", str(args.workers), "--log-level", "warning"],
+			cwd=BACKEND_DIR,
+			env=env,
+		)
+		base_url = f"http://127.0.0.1:{port}"
+		_wait_ready(base_url, server)
+		if args.warmup:
+			asyncio.run(_drive(base_url, docs[documents:], args.warmup, min(args.warmup, args.concurrency), args.full))
+		measured = asyncio.run(_drive(base_url, docs[:documents], args.requests, args.concurrency, args.full))
+		result = emit({"name": f"upload-c{args.concurrency}" + ("-full" if args.full else ""), **measured, "stub_fetches": _Stub.hits})
+		write("loadtest", vars(args), [result], args.output)
+	finally:
+		if server is not None:
+			server.terminate()
+			try:
+				server.wait(timeout=30)
+			except subprocess.TimeoutExpired:
+				server.kill()
+		stub.shutdown()
+		shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+	main()
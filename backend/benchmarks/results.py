@@ -0,0 +1,70 @@
+"""Machine-readable benchmark results.
+
+A result file is one JSON document:
+
+	{"benchmark": name, "environment": {...}, "params": {...}, "results": [{"name": ..., <metrics>}, ...]}
+
+Metric names carry their direction: `*_ms`, `*_us`, `*_seconds` are lower-is-
+better, `*per_second`, `*_rps`, `*recall`, `*success_rate` higher-is-better.
+benchmarks/compare.py matches results by name and flags regressions.
+"""
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List
+
+
+def environment() -> Dict[str, Any]:
+	try:
+		commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5).stdout.strip() or None
+	except Exception:
+		commit = None
+	return {
+		"git_commit": commit,
+		"python": platform.python_version(),
+		"platform": platform.platform(),
+		"cpu_count": os.cpu_count(),
+		"timestamp": int(time.time()),
+	}
+
+
+def latency_summary(lat_ms: List[float]) -> Dict[str, float]:
+	"""p50/p95/p99/mean of latencies in milliseconds."""
+	lat = sorted(lat_ms)
+	pick = lambda q: lat[min(len(lat) - 1, int(len(lat) * q))]
+	return {
+		"p50_ms": round(statistics.median(lat), 3),
+		"p95_ms": round(pick(0.95), 3),
+		"p99_ms": round(pick(0.99), 3),
+		"mean_ms": round(statistics.fmean(lat), 3),
+	}
+
+
+def time_calls(fn, items: List[Any], repeat: int = 1) -> Dict[str, float]:
+	"""Call fn(item) `repeat` times per item; latency summary of all calls."""
+	lat = []
+	for _ in range(repeat):
+		for item in items:
+			t0 = time.perf_counter()
+			fn(item)
+			lat.append((time.perf_counter() - t0) * 1000)
+	return latency_summary(lat)
+
+
+def emit(result: Dict[str, Any]) -> Dict[str, Any]:
+	"""Print one result as a JSON line as soon as it is measured."""
+	print(json.dumps(result), flush=True)
+	return result
+
+
+def write(benchmark: str, params: Dict[str, Any], results: List[Dict[str, Any]], output: str | None) -> Dict[str, Any]:
+	doc = {"benchmark": benchmark, "environment": environment(), "params": params, "results": results}
+	if output:
+		with open(output, "w", encoding="utf-8") as f:
+			json.dump(doc, f, indent=2)
+		print(f"results written to {output}", file=sys.stderr)
+	return doc
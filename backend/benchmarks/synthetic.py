@@ -0,0 +1,167 @@
+"""Deterministic synthetic certificate images for the benchmarks.
+
+`render_certificate` draws a certificate page with the labelled fields the
+OCR parser looks for; `degrade` turns it into a phone photo, noisy scan or
+fax-like black-and-white page. `FIXTURES` is the fixed set the OCR
+preprocessing benchmark measures accuracy on; `QR_FIXTURES` the QR corpus
+(code sizes, positions, resolutions, two codes on a page, no code).
+`registry_rows` and `certificate_document` build CertificateRecord-style
+rows and encoded uploads of them (`DOCUMENT_KINDS`) for the pipeline
+benchmarks and the load test.
+"""
+import json
+from typing import Any, Dict, List, Tuple
+
+import cv2
+import numpy as np
+import qrcode
+
+
+def certificate_fields(i: int) -> Dict[str, str]:
+	first = ["Asha", "Rahul", "Meera", "Vikram", "Priya", "Arjun", "Kavya", "Rohan"][i % 8]
+	last = ["Sharma", "Verma", "Iyer", "Singh", "Nair", "Gupta", "Rao", "Das"][(i // 8) % 8]
+	return {
+		"candidate_name": f"{first} {last}",
+		"roll_number": f"RJH{100000 + i * 37}",
+		"certificate_id": f"CERT-2024-{1000 + i:05d}",
+		"course": ["Bachelor of Science", "Master of Arts", "Diploma in Engineering"][i % 3],
+	}
+
+
+def render_certificate(fields: Dict[str, str], width: int = 2480, seal: bool = True) -> np.ndarray:
+	"""Grayscale A4 page (width px wide) with a title, labelled fields and an optional seal."""
+	height = int(width * 1.414)
+	s = width / 2480
+	img = np.full((height, width), 245, dtype=np.uint8)
+	thick = max(1, int(round(5 * s)))
+	cv2.rectangle(img, (int(80 * s), int(80 * s)), (width - int(80 * s), height - int(80 * s)), 60, max(1, int(round(8 * s))))
+	cv2.putText(img, "CERTIFICATE OF COMPLETION", (int(330 * s), int(420 * s)), cv2.FONT_HERSHEY_DUPLEX, 3.2 * s, 20, thick + 1)
+	lines = [
+		f"Name: {fields['candidate_name']}",
+		f"Roll No: {fields['roll_number']}",
+		f"Certificate ID: {fields['certificate_id']}",
+		f"Course: {fields['course']}",
+	]
+	for j, line in enumerate(lines):
+		cv2.putText(img, line, (int(260 * s), int((900 + j * 230) * s)), cv2.FONT_HERSHEY_SIMPLEX, 2.3 * s, 25, thick)
+	if seal:
+		centre = (int(1950 * s), int(3000 * s))
+		cv2.circle(img, centre, int(210 * s), 70, thick + 3)
+		cv2.circle(img, centre, int(160 * s), 70, thick)
+		cv2.putText(img, "SEAL", (centre[0] - int(115 * s), centre[1] + int(30 * s)), cv2.FONT_HERSHEY_DUPLEX, 2.6 * s, 70, thick)
+	return img
+
+
+def degrade(img: np.ndarray, kind: str, seed: int = 0) -> np.ndarray:
+	"""Simulate a capture: "scan" (light noise), "photo" (upscaled, shaded, noisy, JPEG), "fax" (binary)."""
+	rnd = np.random.default_rng(seed)
+	if kind == "clean":
+		return img
+	if kind == "scan":
+		noisy = img.astype(np.float32) + rnd.normal(0, 4, img.shape)
+		return np.clip(noisy, 0, 255).astype(np.uint8)
+	if kind == "photo":
+		h, w = img.shape
+		big = cv2.resize(img, (4000, int(4000 * h / w)), interpolation=cv2.INTER_CUBIC)
+		shade = np.linspace(0.8, 1.0, big.shape[1], dtype=np.float32)[None, :]
+		noisy = big.astype(np.float32) * shade + rnd.normal(0, 12, big.shape)
+		noisy = cv2.GaussianBlur(np.clip(noisy, 0, 255).astype(np.uint8), (5, 5), 0)
+		ok, buf = cv2.imencode(".jpg", noisy, [cv2.IMWRITE_JPEG_QUALITY, 80])
+		return cv2.imdecode(buf, cv2.IMREAD_GRAYSCALE)
+	if kind == "fax":
+		return cv2.threshold(img, 128, 255, cv2.THRESH_BINARY)[1]
+	raise ValueError(f"unknown degradation: {kind}")
+
+
+# (name, page width, degradation): 150/300 dpi scans, a 4000 px phone photo and a binary fax
+FIXTURES: List[Tuple[str, int, str]] = [
+	("scan-150dpi", 1240, "scan"),
+	("scan-300dpi", 2480, "scan"),
+	("clean-300dpi", 2480, "clean"),
+	("photo-4000px", 2480, "photo"),
+	("fax-200dpi", 1654, "fax"),
+]
+
+
+def fixture_set(count: int = 2) -> List[Dict[str, Any]]:
+	"""`count` certificates per fixture kind: [{"name", "fields", "gray"}]."""
+	items = []
+	for k, (name, width, kind) in enumerate(FIXTURES):
+		for i in range(count):
+			fields = certificate_fields(k * count + i)
+			items.append({"name": name, "fields": fields, "gray": degrade(render_certificate(fields, width), kind, seed=i)})
+	return items
+
+
+def qr_image(payload: Dict[str, Any], size: int) -> np.ndarray:
+	"""Grayscale QR code of `payload` (JSON) scaled to size x size pixels (quiet zone included)."""
+	code = np.array(qrcode.make(json.dumps(payload)).convert("L"))
+	return cv2.resize(code, (size, size), interpolation=cv2.INTER_AREA)
+
+
+# (name, page width, QR side in page-width fractions, position as fractions of the page, degradation)
+QR_FIXTURES: List[Tuple[str, int, float, Tuple[float, float], str]] = [
+	("a4-150dpi-footer", 1240, 0.12, (0.82, 0.86), "scan"),
+	("a4-300dpi-corner", 2480, 0.08, (0.88, 0.90), "scan"),
+	("a4-300dpi-small", 2480, 0.045, (0.90, 0.93), "clean"),
+	("a4-300dpi-top-left", 2480, 0.07, (0.05, 0.04), "scan"),
+	("a4-600dpi-small", 4960, 0.04, (0.90, 0.92), "clean"),
+	("photo-4000px", 2480, 0.10, (0.80, 0.84), "photo"),
+	("two-codes", 2480, 0.08, (0.85, 0.88), "two"),
+	("no-code", 2480, 0.0, (0.0, 0.0), "scan"),
+]
+
+
+def qr_fixture_set(count: int = 2) -> List[Dict[str, Any]]:
+	"""`count` pages per QR fixture kind: [{"name", "payloads", "gray"}]."""
+	items = []
+	for k, (name, width, side, (fx, fy), kind) in enumerate(QR_FIXTURES):
+		for i in range(count):
+			fields = certificate_fields(k * count + i)
+			page = render_certificate(fields, width, seal=False)
+			payloads = []
+			if side:
+				size = int(side * width)
+				spots = [(fx, fy)] + ([(0.06, fy)] if kind == "two" else [])
+				for n, (x, y) in enumerate(spots):
+					payload = {"certificate_id": fields["certificate_id"], "roll_number": fields["roll_number"], "n": n}
+					px, py = int(x * width), int(y * page.shape[0])
+					px, py = min(px, width - size), min(py, page.shape[0] - size)
+					page[py : py + size, px : px + size] = qr_image(payload, size)
+					payloads.append(payload)
+			items.append({"name": name, "payloads": payloads, "gray": degrade(page, "clean" if kind == "two" else kind, seed=i)})
+	return items
+
+
+def registry_rows(n: int, institutions: int = 5) -> List[Dict[str, Any]]:
+	"""CertificateRecord column values for `n` certificates (the same people as certificate_fields)."""
+	return [
+		{"institution_id": f"INST-{i % institutions:02d}", **certificate_fields(i), "year": 2015 + i % 10}
+		for i in range(n)
+	]
+
+
+# (name, page width, degradation, QR code on the page: None, "plain" or "signed")
+DOCUMENT_KINDS: List[Tuple[str, int, str, str | None]] = [
+	("scan-150dpi-qr", 1240, "scan", "plain"),
+	("scan-300dpi-signed", 2480, "scan", "signed"),
+	("photo-4000px-signed", 2480, "photo", "signed"),
+	("clean-300dpi-noqr", 2480, "clean", None),
+	("fax-200dpi-noqr", 1654, "fax", None),
+]
+
+
+def certificate_document(row: Dict[str, Any], width: int, kind: str, payload: Dict[str, Any] | None = None, seed: int = 0, ext: str = ".png") -> bytes:
+	"""Encoded upload of `row`: the certificate page with `payload` as a QR code near the bottom-left corner.
+
+	The code is drawn before degradation, so it gets the page's noise, blur and
+	resampling. Photos are encoded as JPEG regardless of `ext`.
+	"""
+	page = render_certificate(row, width)
+	if payload is not None:
+		size = int(0.14 * width)
+		y, x = int(0.84 * page.shape[0]), int(0.08 * width)
+		page[y : y + size, x : x + size] = qr_image(payload, size)
+	img = degrade(page, kind, seed=seed)
+	ok, buf = cv2.imencode(".jpg" if kind == "photo" else ext, img)
+	return buf.tobytes()
@@ -0,0 +1,5 @@
+import os
+import tempfile
+
+# Before any app import: app.db.session binds its engine to DATABASE_URL at import time
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='tests-'), 'test.db')}")
@@ -0,0 +1,84 @@
+import cv2
+import numpy as np
+import pytest
+
+from app.db.session import init_db
+from app.services.anomaly import document_phash
+from app.services.document import DocumentContext
+from app.services.phash_index import (
+	PHASH_MAX_DISTANCE,
+	PHASH_REMEMBER_DISTANCE,
+	PHashIndex,
+	duplicate_warnings,
+	hash_to_hex,
+	hex_to_words,
+	phash_registry,
+	popcount,
+)
+from benchmarks.synthetic import certificate_fields, degrade, render_certificate
+
+
+def _phash(gray: np.ndarray) -> str:
+	return document_phash(DocumentContext(cv2.imencode(".png", gray)[1].tobytes()))
+
+
+def _hash(gray: np.ndarray) -> np.ndarray:
+	return hex_to_words(_phash(gray))
+
+
+def _distance(a: np.ndarray, b: np.ndarray) -> int:
+	return int(popcount(_hash(a) ^ _hash(b)))
+
+
+@pytest.mark.parametrize("width", [1240, 2480])
+def test_recaptures_are_within_max_distance(width):
+	for i in range(4):
+		page = render_certificate(certificate_fields(i), width)
+		for kind in ("scan", "fax"):
+			assert _distance(page, degrade(page, kind, seed=i)) <= PHASH_MAX_DISTANCE
+
+
+@pytest.mark.parametrize("width", [1240, 2480])
+def test_other_template_is_beyond_max_distance(width):
+	for i in range(4):
+		fields = certificate_fields(i)
+		assert _distance(render_certificate(fields, width), render_certificate(fields, width, seal=False)) > PHASH_MAX_DISTANCE
+
+
+def test_index_matches_linear_scan():
+	rng = np.random.default_rng(0)
+	words = rng.integers(0, 2**63, size=(5000, 4), dtype=np.uint64)
+	index = PHashIndex()
+	index.add_many(words, [(None, str(i), "test") for i in range(len(words))])
+	for row in (0, 1234, 4999):
+		query = words[row].copy()
+		query[0] ^= np.uint64(0b1011)
+		assert index.query(query) == index.linear_query(query)
+		assert index.query(query)[0] == (row, 3)
+
+
+def test_duplicate_warnings_only_across_institutions():
+	init_db()
+	phash = _phash(render_certificate(certificate_fields(0), 1240))
+	phash_registry.remember(phash, "inst-a", "CERT-A", "registered")
+	# Another certificate of the same institution shares its template
+	assert duplicate_warnings(phash, "CERT-A2", "inst-a") == []
+	assert duplicate_warnings(phash, "CERT-B", None) == []
+	warnings = duplicate_warnings(phash, "CERT-B", "inst-b")
+	assert len(warnings) == 1 and "CERT-A of institution inst-a" in warnings[0]
+
+
+def test_remember_skips_rescans_of_the_same_certificate():
+	init_db()
+	words = hex_to_words(_phash(render_certificate(certificate_fields(1), 1240)))
+
+	def flipped(bits: int) -> str:
+		changed = words.copy()
+		changed[1] ^= np.uint64((1 << bits) - 1)
+		return hash_to_hex(changed)
+
+	assert phash_registry.remember(flipped(0), "inst-r", "CERT-R", "registered")
+	assert not phash_registry.remember(flipped(PHASH_REMEMBER_DISTANCE), "inst-r", "CERT-R", "verified")
+	assert phash_registry.remember(flipped(PHASH_REMEMBER_DISTANCE + 1), "inst-r", "CERT-R", "verified")
+	# The same image is still recorded for another certificate
+	assert phash_registry.remember(flipped(0), "inst-r", "CERT-R2", "registered")
@@ -0,0 +1,92 @@
+import time
+
+from sqlmodel import Session, select
+
+from app.db.models import CertificateRecord
+from app.db.session import engine, init_db
+from app.services import registry as registry_module
+from app.services.registry import RegistrySnapshot, edit_distance
+
+
+def _row(i: int, name: str, inst: str = "inst-a") -> dict:
+	return {
+		"id": i + 1,
+		"institution_id": inst,
+		"certificate_id": f"CERT-{i:04d}",
+		"candidate_name": name,
+		"roll_number": f"R{i:05d}",
+		"course": "B.Sc",
+		"year": 2023,
+	}
+
+
+def _certs(records) -> set:
+	return {r.certificate_id for r in records}
+
+
+def test_edit_distance():
+	assert edit_distance("alice sharma", "alice sharma", 2) == 0
+	assert edit_distance("alice sharma", "alise sharma", 2) == 1
+	assert edit_distance("alice sharma", "alice sarmah", 2) == 2
+	assert edit_distance("alice sharma", "bob", 2) is None
+
+
+def test_snapshot_matching():
+	snapshot = RegistrySnapshot()
+	snapshot.build([_row(0, "Alice Sharma"), _row(1, "Bob Kumar"), _row(2, "Alice Sharma", inst="inst-b")])
+	assert _certs(snapshot.candidates({"certificate_id": "CERT-0001"}, None, 10)) == {"CERT-0001"}
+	assert _certs(snapshot.candidates({"roll_number": "R00000"}, "inst-a", 10)) == {"CERT-0000"}
+	# Normalized, approximate and run-together names
+	assert _certs(snapshot.candidates({"candidate_name": "ALICE  SHARMA."}, "inst-a", 10)) == {"CERT-0000"}
+	assert _certs(snapshot.candidates({"candidate_name": "Alise Sharma"}, None, 10)) == {"CERT-0000", "CERT-0002"}
+	assert _certs(snapshot.candidates({"candidate_name": "AliceSharma"}, "inst-b", 10)) == {"CERT-0002"}
+	assert snapshot.candidates({"candidate_name": "Carol Jones"}, None, 10) == []
+
+
+def test_apply_shadows_segment_rows():
+	snapshot = RegistrySnapshot()
+	snapshot.build([_row(0, "Alice Sharma"), _row(1, "Bob Kumar")])
+	snapshot.apply([{**_row(1, "Robert Kumar"), "roll_number": "R99999"}])
+	[record] = snapshot.candidates({"certificate_id": "CERT-0001"}, None, 10)
+	assert (record.candidate_name, record.roll_number) == ("Robert Kumar", "R99999")
+	assert snapshot.candidates({"roll_number": "R00001"}, None, 10) == []
+	assert snapshot.stats()["records"] == 2
+
+
+def _add(session: Session, cert: str, name: str) -> None:
+	session.add(CertificateRecord(institution_id="reg-test", certificate_id=cert, candidate_name=name, roll_number=f"R-{cert}", course="B.Sc", year=2023))
+
+
+def test_refresh_and_rebuild_from_database(monkeypatch):
+	init_db()
+	with Session(engine) as session:
+		_add(session, "DB-1", "Meera Iyer")
+		session.commit()
+	snapshot = RegistrySnapshot()
+	snapshot.load()
+	assert _certs(snapshot.candidates({"candidate_name": "Meera Iyer"}, "reg-test", 10)) == {"DB-1"}
+
+	# Rows another process inserts are picked up by refresh...
+	with Session(engine) as session:
+		_add(session, "DB-2", "Arjun Rao")
+		row = session.exec(select(CertificateRecord).where(CertificateRecord.certificate_id == "DB-1")).one()
+		row.candidate_name = "Meera Nair"
+		session.add(row)
+		session.commit()
+	snapshot.refresh()
+	assert _certs(snapshot.candidates({"candidate_name": "Arjun Rao"}, "reg-test", 10)) == {"DB-2"}
+	# ...updates to existing rows only by a rebuild
+	assert _certs(snapshot.candidates({"candidate_name": "Meera Nair"}, "reg-test", 10)) == set()
+	snapshot.load()
+	assert _certs(snapshot.candidates({"candidate_name": "Meera Nair"}, "reg-test", 10)) == {"DB-1"}
+	assert snapshot.stats()["delta"] == 0
+
+	# A delta beyond REGISTRY_DELTA_MAX rebuilds in the background
+	monkeypatch.setattr(registry_module, "REGISTRY_DELTA_MAX", 1)
+	built = snapshot.loaded_at_ms
+	time.sleep(0.01)
+	snapshot.apply([_row(0, "Local One", inst="reg-local"), _row(1, "Local Two", inst="reg-local")])
+	deadline = time.monotonic() + 5
+	while snapshot.loaded_at_ms == built and time.monotonic() < deadline:
+		time.sleep(0.01)
+	assert snapshot.loaded_at_ms != built
@@ -0,0 +1,105 @@
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.services import url_validate
+
+
+class _Stub(BaseHTTPRequestHandler):
+	"""200 for /ok*, 500 for /fail*; /slow* answers after 0.2 s. Counts requests per path."""
+
+	hits: dict = {}
+
+	def do_GET(self) -> None:
+		_Stub.hits[self.path] = _Stub.hits.get(self.path, 0) + 1
+		if self.path.startswith("/slow"):
+			time.sleep(0.2)
+		status = 500 if self.path.startswith("/fail") else 200
+		self.send_response(status)
+		self.send_header("Content-Length", "0")
+		self.end_headers()
+
+	def log_message(self, *args) -> None:
+		pass
+
+
+@pytest.fixture
+def stub(monkeypatch):
+	server = ThreadingHTTPServer(("127.0.0.1", 0), _Stub)
+	threading.Thread(target=server.serve_forever, daemon=True).start()
+	_Stub.hits = {}
+	monkeypatch.setattr(url_validate, "QR_ALLOWED_DOMAINS", frozenset({"127.0.0.1"}))
+	monkeypatch.setattr(url_validate, "QR_URL_NEGATIVE_TTL_SECONDS", 0.3)
+	url_validate.url_cache.clear()
+	yield f"http://127.0.0.1:{server.server_address[1]}"
+	server.shutdown()
+	server.server_close()
+
+
+def _run(coro):
+	async def main():
+		try:
+			return await coro
+		finally:
+			# The pooled client is bound to this test's event loop
+			await url_validate.close_client()
+
+	return asyncio.run(main())
+
+
+def test_second_call_is_cached(stub):
+	async def check():
+		first = await url_validate.validate_qr_url(f"{stub}/ok")
+		second = await url_validate.validate_qr_url(f"{stub}/ok")
+		return first, second
+
+	first, second = _run(check())
+	assert first == second == (True, {"status": "ok"})
+	assert _Stub.hits == {"/ok": 1}
+
+
+def test_failures_use_negative_ttl(stub):
+	async def check():
+		ok, info = await url_validate.validate_qr_url(f"{stub}/fail")
+		assert not ok and info == {"reason": "http_error", "status": 500}
+		await url_validate.validate_qr_url(f"{stub}/fail")
+		await url_validate.validate_qr_url(f"{stub}/ok")
+		assert _Stub.hits == {"/fail": 1, "/ok": 1}
+		await asyncio.sleep(0.4)
+		# The failure expired, the success (QR_URL_CACHE_TTL_SECONDS) did not
+		await url_validate.validate_qr_url(f"{stub}/fail")
+		await url_validate.validate_qr_url(f"{stub}/ok")
+
+	_run(check())
+	assert _Stub.hits == {"/fail": 2, "/ok": 1}
+
+
+def test_concurrent_calls_share_one_fetch(stub):
+	async def check():
+		return await asyncio.gather(*(url_validate.validate_qr_url(f"{stub}/slow") for _ in range(10)))
+
+	results = _run(check())
+	assert results == [(True, {"status": "ok"})] * 10
+	assert _Stub.hits == {"/slow": 1}
+
+
+def test_waiters_survive_cancelled_fetcher(stub):
+	async def check():
+		first = asyncio.ensure_future(url_validate.validate_qr_url(f"{stub}/slow"))
+		await asyncio.sleep(0.05)
+		waiter = asyncio.ensure_future(url_validate.validate_qr_url(f"{stub}/slow"))
+		await asyncio.sleep(0.05)
+		first.cancel()
+		return await waiter
+
+	assert _run(check()) == (True, {"status": "ok"})
+	assert _Stub.hits == {"/slow": 2}
+
+
+def test_offline_check_does_not_fetch(stub):
+	assert _run(url_validate.validate_qr_url(f"{stub}/ok", fetch=False)) == (True, {"status": "not_fetched"})
+	assert _run(url_validate.validate_qr_url("http://elsewhere.test/x"))[1]["reason"] == "untrusted_domain"
+	assert _Stub.hits == {}